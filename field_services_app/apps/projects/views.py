@@ -1,5 +1,7 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from .models import Project, ProjectTask, ProjectMilestone
 # If serializers.py is created, uncomment this line
 # from .serializers import ProjectSerializer, ProjectTaskSerializer, ProjectMilestoneSerializer
@@ -14,6 +16,31 @@ class ProjectViewSet(viewsets.ModelViewSet):
     # When serializer is created, uncomment this line
     # serializer_class = ProjectSerializer
     permission_classes = [IsAuthenticated]
+    
+    @action(detail=True, methods=['get'])
+    def costs(self, request, pk=None):
+        """
+        Get the project's cost rollup (items, stock issued and approved
+        expenses of its work orders, plus direct expenses) against its budget.
+        """
+        from apps.work_orders.models import ProjectCost
+        
+        project = self.get_object()
+        rollup = ProjectCost.objects.filter(project=project).first()
+        if rollup is None:
+            rollup = ProjectCost.refresh([project.pk])[0]
+        
+        return Response({
+            'project_id': project.pk,
+            'budget': project.budget,
+            'work_order_count': rollup.work_order_count,
+            'items_cost': rollup.items_cost,
+            'stock_cost': rollup.stock_cost,
+            'expenses_cost': rollup.expenses_cost,
+            'total_cost': rollup.total_cost,
+            'remaining_budget': project.budget - rollup.total_cost,
+            'updated_at': rollup.updated_at,
+        })
 
 class ProjectTaskViewSet(viewsets.ModelViewSet):
     """
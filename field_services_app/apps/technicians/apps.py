@@ -0,0 +1,20 @@
+"""
+Application configuration for the technicians app.
+"""
+
+from django.apps import AppConfig
+
+
+class TechniciansConfig(AppConfig):
+    """
+    Configuration for the technicians app.
+    """
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.technicians'
+    verbose_name = 'Technician Management'
+
+    def ready(self):
+        """
+        Import signal handlers when app is ready.
+        """
+        import apps.technicians.signals  # noqa
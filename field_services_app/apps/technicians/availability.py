@@ -0,0 +1,122 @@
+"""
+Fleet-wide availability matrix.
+
+The date range is divided into fixed-length slots and each technician's
+busy time is kept as integer bitsets, one bit per slot, built from one bulk
+query per source (scheduled work and check-ins). Leave is taken from the
+technician's availability status.
+"""
+
+import math
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+# Occupancy codes, in order of precedence
+LEAVE = 'L'
+SCHEDULED = 'S'
+CHECKED_IN = 'C'
+FREE = '.'
+
+# Technician availability statuses that make every slot unavailable
+LEAVE_STATUSES = ['on_leave', 'inactive']
+
+# Assignment statuses that occupy a technician's schedule
+SCHEDULED_ASSIGNMENT_STATUSES = ['pending', 'accepted', 'in_progress', 'completed']
+
+
+def _slot_mask(range_start, slot, slot_count, start, end):
+    """Return the bitset of the slots overlapped by the [start, end) interval."""
+    first = max(0, math.floor((start - range_start) / slot))
+    last = min(slot_count, math.ceil((end - range_start) / slot))
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def _occupancy(slot_count, leave, scheduled, checked_in):
+    """Render the bitsets of one technician as a string of occupancy codes."""
+    if leave:
+        return LEAVE * slot_count
+    codes = []
+    for index in range(slot_count):
+        bit = 1 << index
+        if scheduled & bit:
+            codes.append(SCHEDULED)
+        elif checked_in & bit:
+            codes.append(CHECKED_IN)
+        else:
+            codes.append(FREE)
+    return ''.join(codes)
+
+
+def availability_matrix(technicians, start_date, end_date, slot_minutes=60):
+    """
+    Build the occupancy matrix of the given technicians between two dates
+    (inclusive).
+    
+    Returns the range start, the number of slots and one row per technician
+    with an `occupancy` string holding one code per slot: LEAVE, SCHEDULED,
+    CHECKED_IN or FREE.
+    """
+    from apps.work_orders.models import WorkOrderAssignment
+    from .models import TechnicianCheckIn
+    
+    range_start = timezone.make_aware(datetime.combine(start_date, time.min))
+    range_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    slot = timedelta(minutes=slot_minutes)
+    slot_count = math.ceil((range_end - range_start) / slot)
+    
+    technicians = list(technicians.values_list('id', 'full_name', 'availability_status'))
+    technician_ids = [technician[0] for technician in technicians]
+    scheduled = dict.fromkeys(technician_ids, 0)
+    checked_in = dict.fromkeys(technician_ids, 0)
+    
+    # Scheduled work, unscheduled end times fall back to the estimated duration
+    assignments = WorkOrderAssignment.objects.filter(
+        technician_id__in=technician_ids,
+        status__in=SCHEDULED_ASSIGNMENT_STATUSES,
+        work_order__scheduled_start__lt=range_end
+    ).filter(
+        Q(work_order__scheduled_end__gt=range_start) |
+        Q(work_order__scheduled_end__isnull=True, work_order__scheduled_start__gte=range_start - timedelta(days=1))
+    ).values_list(
+        'technician_id', 'work_order__scheduled_start', 'work_order__scheduled_end',
+        'work_order__estimated_duration'
+    )
+    for technician_id, start, end, duration in assignments:
+        end = end or start + max(timedelta(minutes=duration), slot)
+        scheduled[technician_id] |= _slot_mask(range_start, slot, slot_count, start, end)
+    
+    # Time on site, open check-ins last until now
+    now = timezone.now()
+    check_ins = TechnicianCheckIn.objects.filter(
+        technician_id__in=technician_ids,
+        check_in_time__lt=range_end
+    ).filter(
+        Q(check_out_time__gt=range_start) | Q(check_out_time__isnull=True)
+    ).values_list('technician_id', 'check_in_time', 'check_out_time')
+    for technician_id, start, end in check_ins:
+        checked_in[technician_id] |= _slot_mask(range_start, slot, slot_count, start, end or now)
+    
+    rows = []
+    for technician_id, full_name, availability_status in technicians:
+        rows.append({
+            'technician_id': technician_id,
+            'technician_name': full_name,
+            'availability_status': availability_status,
+            'occupancy': _occupancy(
+                slot_count,
+                availability_status in LEAVE_STATUSES,
+                scheduled[technician_id],
+                checked_in[technician_id]
+            ),
+        })
+    
+    return {
+        'start': range_start,
+        'slot_minutes': slot_minutes,
+        'slot_count': slot_count,
+        'technicians': rows,
+    }
@@ -0,0 +1,27 @@
+"""
+Caching of team-wide technician metrics.
+
+Cached results are keyed on a generation number that is replaced whenever
+the underlying metrics change, so stale entries are never read again and
+simply expire.
+"""
+
+import time
+
+from django.core.cache import cache
+
+TEAM_PERFORMANCE_GENERATION_KEY = 'technicians:team_performance:generation'
+
+# Safety net only, entries are invalidated as soon as the metrics change
+TEAM_PERFORMANCE_TIMEOUT = 15 * 60
+
+
+def team_performance_key(period_type, start_date, end_date):
+    """Return the cache key of a team performance result for a period."""
+    generation = cache.get_or_set(TEAM_PERFORMANCE_GENERATION_KEY, time.time_ns, None)
+    return f"technicians:team_performance:{generation}:{period_type}:{start_date}:{end_date}"
+
+
+def invalidate_team_performance():
+    """Invalidate every cached team performance result."""
+    cache.set(TEAM_PERFORMANCE_GENERATION_KEY, time.time_ns(), None)
@@ -0,0 +1,124 @@
+"""
+Certification compliance: the nightly sweep that refreshes technicians'
+certification validity spans and warns about upcoming expiries.
+"""
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+# Days before expiry at which warnings are sent
+EXPIRY_WARNING_DAYS = [30, 14, 7]
+
+# Notification content type of expiry warnings, used to avoid duplicates
+EXPIRY_WARNING_CONTENT_TYPE = 'certification_expiry'
+
+# Roles receiving a digest of the day's expiry warnings
+DIGEST_ROLES = ['admin', 'manager']
+
+
+def expiring_certifications(on_date, days_ahead=EXPIRY_WARNING_DAYS):
+    """
+    Return the certification spans whose coverage ends exactly one of
+    `days_ahead` days after `on_date`, as {days: [TechnicianValidCertification]}.
+    
+    Certifications renewed without a gap are not reported, as their span
+    runs to the renewal's expiry date.
+    """
+    from .models import TechnicianValidCertification
+    
+    targets = {on_date + timedelta(days=days): days for days in days_ahead}
+    expiring = {days: [] for days in days_ahead}
+    for valid in TechnicianValidCertification.objects.filter(
+        valid_until__in=list(targets)
+    ).select_related('technician', 'certification').order_by('valid_until', 'technician__full_name'):
+        expiring[targets[valid.valid_until]].append(valid)
+    return expiring
+
+
+def send_expiry_warnings(on_date, days_ahead=EXPIRY_WARNING_DAYS):
+    """
+    Notify technicians (those with a user account) of certifications
+    expiring in `days_ahead` days, and send admins and managers one digest
+    per threshold. All notifications are created with one bulk insert, and
+    warnings already sent today are skipped, so the sweep can be rerun.
+    
+    Returns the number of notifications created.
+    """
+    from apps.communication.models import Notification
+    from apps.users.models import User
+    
+    expiring = expiring_certifications(on_date, days_ahead)
+    
+    already_sent = set(Notification.objects.filter(
+        content_type=EXPIRY_WARNING_CONTENT_TYPE,
+        created_at__date=timezone.localdate()
+    ).values_list('user_id', 'title'))
+    
+    notifications = []
+    
+    def notify(user_id, title, message, object_id, data):
+        if (user_id, title) in already_sent:
+            return
+        already_sent.add((user_id, title))
+        notifications.append(Notification(
+            user_id=user_id,
+            type='warning',
+            title=title,
+            message=message,
+            content_type=EXPIRY_WARNING_CONTENT_TYPE,
+            object_id=object_id,
+            data=data
+        ))
+    
+    digest_users = list(User.objects.filter(role__in=DIGEST_ROLES, is_active=True).values_list('pk', flat=True))
+    
+    for days, valid_certifications in expiring.items():
+        if not valid_certifications:
+            continue
+        
+        for valid in valid_certifications:
+            if valid.technician.user_id:
+                notify(
+                    valid.technician.user_id,
+                    f"{valid.certification.name} expires in {days} days",
+                    f"Your {valid.certification.name} certification expires on {valid.valid_until}. "
+                    "Please arrange the renewal.",
+                    valid.certification_id,
+                    {'technician_id': valid.technician_id, 'expiry_date': valid.valid_until.isoformat(), 'days': days}
+                )
+        
+        expiry_date = valid_certifications[0].valid_until
+        lines = [
+            f"- {valid.technician.full_name} ({valid.technician.employee_number}): {valid.certification.name}"
+            for valid in valid_certifications
+        ]
+        for user_id in digest_users:
+            notify(
+                user_id,
+                f"{len(valid_certifications)} certifications expire on {expiry_date}",
+                f"Certifications expiring in {days} days:\n" + "\n".join(lines),
+                None,
+                {
+                    'expiry_date': expiry_date.isoformat(),
+                    'days': days,
+                    'technician_certifications': [
+                        [valid.technician_id, valid.certification_id] for valid in valid_certifications
+                    ],
+                }
+            )
+    
+    Notification.objects.bulk_create(notifications, batch_size=500)
+    return len(notifications)
+
+
+def sweep_certifications(on_date=None):
+    """
+    Recompute every technician's certification validity spans, then send
+    the expiry warnings. Returns (span rows, notifications).
+    """
+    from .models import TechnicianValidCertification
+    
+    on_date = on_date or timezone.localdate()
+    valid_count = TechnicianValidCertification.refresh()
+    return valid_count, send_expiry_warnings(on_date)
@@ -0,0 +1,49 @@
+"""
+Cost KPI formulas for TechnicianCostMetrics.
+
+The formulas work on whole columns at once, so that the per-row save path
+and bulk recomputations over years of metrics share the same code.
+"""
+
+from decimal import Decimal
+
+# Factors used when a technician has no rating or completion rate yet
+DEFAULT_CUSTOMER_RATING = 3.0
+DEFAULT_COMPLETION_FACTOR = 0.5
+
+# Efficiency score weights, balancing productivity, quality and reliability
+TASKS_PER_HOUR_WEIGHT = 0.4
+CUSTOMER_RATING_WEIGHT = 0.3
+COMPLETION_RATE_WEIGHT = 0.3
+
+
+def compute_cost_kpis(hours, tasks, costs, customer_ratings, completion_rates):
+    """
+    Compute cost KPIs for columns of raw metrics.
+    
+    Takes equally long sequences of hours worked, tasks completed, total
+    cost, and the technicians' customer rating and completion rate. Returns
+    the (cost_per_hour, cost_per_task, efficiency_score) columns as lists;
+    a KPI is None where it cannot be computed.
+    """
+    cost_per_hour = [
+        Decimal(cost) / Decimal(hour) if hour and hour > 0 else None
+        for hour, cost in zip(hours, costs)
+    ]
+    cost_per_task = [
+        Decimal(cost) / task if task and task > 0 else None
+        for task, cost in zip(tasks, costs)
+    ]
+    
+    # Higher score means better efficiency, scaled to a 0-100 range
+    efficiency_score = [
+        (
+            (task / float(hour)) * TASKS_PER_HOUR_WEIGHT +
+            ((rating or DEFAULT_CUSTOMER_RATING) / 5) * CUSTOMER_RATING_WEIGHT +
+            (completion / 100 if completion else DEFAULT_COMPLETION_FACTOR) * COMPLETION_RATE_WEIGHT
+        ) * 100
+        if hour and hour > 0 and task and task > 0 else None
+        for hour, task, rating, completion in zip(hours, tasks, customer_ratings, completion_rates)
+    ]
+    
+    return cost_per_hour, cost_per_task, efficiency_score
@@ -0,0 +1,30 @@
+"""
+Compact closed days of technician location history into daily tracks.
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.technicians.models import TechnicianDailyTrack
+
+
+class Command(BaseCommand):
+    help = "Fold raw location fixes of closed days into compact per-technician daily tracks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help="Compact fixes recorded before this date (YYYY-MM-DD). Defaults to today."
+        )
+
+    def handle(self, *args, **options):
+        before = None
+        if options['before']:
+            try:
+                before = date.fromisoformat(options['before'])
+            except ValueError:
+                raise CommandError("Invalid --before date. Use ISO format (YYYY-MM-DD)")
+
+        count = TechnicianDailyTrack.compact_closed_days(before=before)
+        self.stdout.write(self.style.SUCCESS(f"Compacted {count} location fixes."))
@@ -0,0 +1,15 @@
+"""
+Rebuild the technicians' daily performance metrics from assignments and ratings.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.technicians.models import TechnicianDailyMetrics
+
+
+class Command(BaseCommand):
+    help = "Recompute every technician's pre-aggregated daily performance metrics."
+    
+    def handle(self, *args, **options):
+        count = TechnicianDailyMetrics.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily metrics rows."))
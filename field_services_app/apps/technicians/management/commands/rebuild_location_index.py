@@ -0,0 +1,15 @@
+"""
+Rebuild the technicians' last known positions from their location history.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.technicians.models import TechnicianLastLocation
+
+
+class Command(BaseCommand):
+    help = "Rebuild the last known position index used for nearest-technician lookups."
+    
+    def handle(self, *args, **options):
+        count = TechnicianLastLocation.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed last known positions for {count} technicians."))
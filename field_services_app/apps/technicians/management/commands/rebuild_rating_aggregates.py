@@ -0,0 +1,15 @@
+"""
+Rebuild technicians' running rating aggregates from their stored ratings.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.technicians.models import Technician
+
+
+class Command(BaseCommand):
+    help = "Recompute every technician's rating sum, count and average customer rating from scratch."
+    
+    def handle(self, *args, **options):
+        count = Technician.rebuild_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {count} technicians."))
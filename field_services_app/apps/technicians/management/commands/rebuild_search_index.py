@@ -0,0 +1,15 @@
+"""
+Rebuild the technician search index.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.technicians.search import index_technicians
+
+
+class Command(BaseCommand):
+    help = "Rebuild the trigram search index over technicians and their specialties."
+    
+    def handle(self, *args, **options):
+        count = index_technicians()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} technicians."))
@@ -0,0 +1,44 @@
+"""
+Recompute the derived KPIs of stored technician cost metrics.
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.technicians.models import TechnicianCostMetrics
+
+
+class Command(BaseCommand):
+    help = "Recompute cost per hour, cost per task and efficiency score of stored cost metrics."
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--technician',
+            type=int,
+            help="Only recompute the metrics of this technician id."
+        )
+        parser.add_argument(
+            '--since',
+            help="Only recompute periods starting on or after this date (YYYY-MM-DD)."
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help="Number of rows computed and written per batch."
+        )
+    
+    def handle(self, *args, **options):
+        metrics = TechnicianCostMetrics.objects.all()
+        if options['technician']:
+            metrics = metrics.filter(technician_id=options['technician'])
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("Invalid --since date. Use ISO format (YYYY-MM-DD)")
+            metrics = metrics.filter(period_start__gte=since)
+        
+        count = TechnicianCostMetrics.recompute_kpis(metrics, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed KPIs of {count} cost metrics rows."))
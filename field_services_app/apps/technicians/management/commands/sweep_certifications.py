@@ -0,0 +1,35 @@
+"""
+Refresh the technicians' valid certifications and send expiry warnings.
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.technicians.compliance import sweep_certifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every technician's certification validity spans and warn about "
+        "certifications expiring in 30, 14 and 7 days. Meant to run nightly."
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Run the sweep as of this date (YYYY-MM-DD, default today)."
+        )
+    
+    def handle(self, *args, **options):
+        on_date = None
+        if options['date']:
+            try:
+                on_date = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("Invalid date format. Use ISO format (YYYY-MM-DD)")
+        
+        valid_count, notification_count = sweep_certifications(on_date)
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {valid_count} certification spans and sent {notification_count} expiry warnings."
+        ))
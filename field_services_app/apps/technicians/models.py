@@ -3,6 +3,8 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth import get_user_model
 from phonenumber_field.modelfields import PhoneNumberField
 
+from .caching import invalidate_team_performance
+
 User = get_user_model()
 
 class Specialty(models.Model):
@@ -37,6 +39,55 @@ class Certification(models.Model):
         return self.name
 
 
+class TechnicianQuerySet(models.QuerySet):
+    """Custom queryset for technicians."""
+    
+    def with_roster_data(self):
+        """
+        Annotate and prefetch everything the roster listing needs.
+        
+        The active assignment count is computed in the main query, while
+        specialties and today's check-ins are fetched with one query each, so
+        serializing a page costs the same number of queries whatever its size.
+        """
+        from django.utils import timezone
+        
+        today = timezone.now().date()
+        today_check_ins = TechnicianCheckIn.objects.filter(
+            check_in_time__date=today
+        ).select_related(
+            'check_in_location', 'check_out_location'
+        ).order_by('-check_in_time')
+        
+        return self.annotate(
+            active_assignments_total=models.Count(
+                'work_order_assignments',
+                filter=models.Q(
+                    work_order_assignments__status__in=Technician.ACTIVE_ASSIGNMENT_STATUSES
+                ),
+                distinct=True
+            )
+        ).prefetch_related(
+            'specialties',
+            models.Prefetch('check_ins', queryset=today_check_ins, to_attr='today_check_ins')
+        )
+    
+    def certified_for(self, certification_ids, on_date=None):
+        """
+        Keep technicians holding every one of the given certifications,
+        valid on `on_date` (today by default).
+        """
+        certification_ids = set(certification_ids)
+        if not certification_ids:
+            return self
+        holders = TechnicianValidCertification.objects.valid_on(on_date).filter(
+            certification_id__in=certification_ids
+        ).values('technician_id').annotate(
+            held=models.Count('certification_id')
+        ).filter(held=len(certification_ids)).values('technician_id')
+        return self.filter(pk__in=holders)
+
+
 class Technician(models.Model):
     """Model representing a field technician."""
     AVAILABILITY_STATUS_CHOICES = [
@@ -52,6 +103,9 @@ class Technician(models.Model):
         ('self_employed', 'Self-Employed'),
     ]
     
+    # Work order assignment statuses that count as active work
+    ACTIVE_ASSIGNMENT_STATUSES = ['pending', 'accepted', 'in_progress']
+    
     # User account (optional, for technicians who have system access)
     user = models.OneToOneField(
         User, 
@@ -156,9 +210,15 @@ class Technician(models.Model):
         help_text="Percentage of tasks completed successfully"
     )
     
+    # Running rating aggregate, customer_rating = rating_sum / rating_count
+    rating_sum = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TechnicianQuerySet.as_manager()
 
     class Meta:
         ordering = ['employee_number']
@@ -169,17 +229,115 @@ class Technician(models.Model):
     @property
     def active_assignments_count(self):
         """Return the count of active assignments for this technician."""
-        return self.assignments.filter(status__in=['assigned', 'in_progress']).count()
+        # Reuse the count annotated by TechnicianQuerySet.with_roster_data()
+        if hasattr(self, 'active_assignments_total'):
+            return self.active_assignments_total
+        return self.work_order_assignments.filter(status__in=self.ACTIVE_ASSIGNMENT_STATUSES).count()
     
     @property
     def total_assignments_count(self):
         """Return the total count of assignments for this technician."""
-        return self.assignments.count()
+        return self.work_order_assignments.count()
     
     @property
     def completed_assignments_count(self):
         """Return the count of completed assignments for this technician."""
-        return self.assignments.filter(status='completed').count()
+        return self.work_order_assignments.filter(status='completed').count()
+    
+    @classmethod
+    def apply_rating_change(cls, technician_id, rating_delta, count_delta):
+        """
+        Adjust a technician's running rating aggregate and average in a
+        single atomic UPDATE.
+        """
+        rating_sum = models.F('rating_sum') + rating_delta
+        rating_count = models.F('rating_count') + count_delta
+        cls.objects.filter(pk=technician_id).update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            customer_rating=models.Case(
+                models.When(rating_count__lte=-count_delta, then=models.Value(None)),
+                default=models.ExpressionWrapper(
+                    rating_sum / rating_count,
+                    output_field=models.FloatField()
+                ),
+                output_field=models.FloatField()
+            )
+        )
+        invalidate_team_performance()
+    
+    @classmethod
+    def rebuild_rating_aggregates(cls, technician_ids=None):
+        """
+        Recompute rating sums, counts and averages from the stored ratings
+        with one grouped query. Returns the number of technicians updated.
+        """
+        technicians = cls.objects.all()
+        ratings = TechnicianRating.objects.all()
+        if technician_ids is not None:
+            technicians = technicians.filter(pk__in=technician_ids)
+            ratings = ratings.filter(technician_id__in=technician_ids)
+        
+        totals = {
+            row['technician_id']: (row['total'], row['count'])
+            for row in ratings.order_by().values('technician_id').annotate(
+                total=models.Sum('rating'),
+                count=models.Count('id')
+            )
+        }
+        
+        updated = []
+        for technician in technicians.only('pk', 'rating_sum', 'rating_count', 'customer_rating'):
+            total, count = totals.get(technician.pk, (0.0, 0))
+            technician.rating_sum = total
+            technician.rating_count = count
+            technician.customer_rating = total / count if count else None
+            updated.append(technician)
+        
+        cls.objects.bulk_update(
+            updated,
+            ['rating_sum', 'rating_count', 'customer_rating'],
+            batch_size=500
+        )
+        invalidate_team_performance()
+        return len(updated)
+
+
+class TechnicianSearchDocument(models.Model):
+    """
+    Model holding the folded words a technician is searchable by (see
+    search.py), used to rank trigram matches.
+    """
+    technician = models.OneToOneField(
+        Technician,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document'
+    )
+    tokens = models.TextField(blank=True)
+    
+    class Meta:
+        verbose_name = "Technician Search Document"
+        verbose_name_plural = "Technician Search Documents"
+    
+    def __str__(self):
+        return f"{self.technician_id}: {self.tokens}"
+
+
+class TechnicianSearchTrigram(models.Model):
+    """Model representing one trigram of a technician's search document."""
+    technician = models.ForeignKey(Technician, on_delete=models.CASCADE, related_name='search_trigrams')
+    trigram = models.CharField(max_length=3)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['trigram', 'technician']),
+        ]
+        verbose_name = "Technician Search Trigram"
+        verbose_name_plural = "Technician Search Trigrams"
+    
+    def __str__(self):
+        return f"{self.technician_id}: '{self.trigram}'"
 
 
 class TechnicianCertification(models.Model):
@@ -193,11 +351,117 @@ class TechnicianCertification(models.Model):
     class Meta:
         unique_together = ['technician', 'certification', 'issue_date']
         ordering = ['-issue_date']
+        indexes = [
+            models.Index(fields=['expiry_date']),
+            models.Index(fields=['technician', 'certification', 'expiry_date']),
+        ]
     
     def __str__(self):
         return f"{self.technician.full_name} - {self.certification.name}"
 
 
+class TechnicianValidCertificationQuerySet(models.QuerySet):
+    """Custom queryset for precomputed certification validity spans."""
+    
+    def valid_on(self, on_date=None):
+        """Keep the spans covering `on_date` (today by default)."""
+        from django.utils import timezone
+        
+        on_date = on_date or timezone.localdate()
+        return self.filter(
+            models.Q(valid_until__isnull=True) | models.Q(valid_until__gte=on_date),
+            valid_from__lte=on_date
+        )
+
+
+class TechnicianValidCertification(models.Model):
+    """
+    Periods during which a technician holds a certification, precomputed
+    from their TechnicianCertification records: one row per technician,
+    certification and contiguous span of coverage.
+    
+    Records whose validity overlaps or follows on from one another are
+    merged into one span, from the earliest issue date to the latest expiry
+    date (`valid_until` is null when one of them never expires). Spans are
+    refreshed when certifications change, so eligibility checks on any date
+    read one row per certification instead of the whole certification
+    history.
+    """
+    technician = models.ForeignKey(Technician, on_delete=models.CASCADE, related_name='valid_certifications')
+    certification = models.ForeignKey(Certification, on_delete=models.CASCADE, related_name='valid_holders')
+    valid_from = models.DateField()
+    valid_until = models.DateField(blank=True, null=True)
+    
+    objects = TechnicianValidCertificationQuerySet.as_manager()
+    
+    class Meta:
+        unique_together = ['technician', 'certification', 'valid_from']
+        indexes = [
+            models.Index(fields=['certification', 'valid_from', 'valid_until']),
+            models.Index(fields=['valid_until']),
+        ]
+    
+    def __str__(self):
+        return (
+            f"{self.technician_id} - {self.certification_id} "
+            f"from {self.valid_from} until {self.valid_until or 'no expiry'}"
+        )
+    
+    @staticmethod
+    def spans(records):
+        """
+        Merge (issue_date, expiry_date) records, sorted by issue date, into
+        contiguous (valid_from, valid_until) spans.
+        """
+        from datetime import timedelta
+        
+        spans = []
+        for issue_date, expiry_date in records:
+            if spans:
+                valid_from, valid_until = spans[-1]
+                if valid_until is None or issue_date <= valid_until + timedelta(days=1):
+                    if valid_until is not None and (expiry_date is None or expiry_date > valid_until):
+                        spans[-1] = (valid_from, expiry_date)
+                    continue
+            spans.append((issue_date, expiry_date))
+        return spans
+    
+    @classmethod
+    def refresh(cls, technician_ids=None):
+        """
+        Recompute the validity spans of the given technicians (all
+        technicians by default).
+        
+        Returns the number of span rows written.
+        """
+        from itertools import groupby
+        from django.db import transaction
+        
+        records = TechnicianCertification.objects.all()
+        existing = cls.objects.all()
+        if technician_ids is not None:
+            records = records.filter(technician_id__in=technician_ids)
+            existing = existing.filter(technician_id__in=technician_ids)
+        
+        records = records.order_by('technician_id', 'certification_id', 'issue_date').values_list(
+            'technician_id', 'certification_id', 'issue_date', 'expiry_date'
+        )
+        valid = []
+        for (technician_id, certification_id), group in groupby(records, key=lambda record: record[:2]):
+            for valid_from, valid_until in cls.spans(record[2:] for record in group):
+                valid.append(cls(
+                    technician_id=technician_id,
+                    certification_id=certification_id,
+                    valid_from=valid_from,
+                    valid_until=valid_until
+                ))
+        
+        with transaction.atomic():
+            existing.delete()
+            cls.objects.bulk_create(valid, batch_size=1000)
+        return len(valid)
+
+
 class TechnicianLocation(models.Model):
     """Model representing a technician's location at a specific time."""
     technician = models.ForeignKey(Technician, on_delete=models.CASCADE, related_name='locations')
@@ -219,11 +483,243 @@ class TechnicianLocation(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['technician', '-timestamp']),
+        ]
+        constraints = [
+            # Devices resend fixes they are not sure were received
+            models.UniqueConstraint(fields=['technician', 'timestamp'], name='unique_technician_location_fix'),
+        ]
     
     def __str__(self):
         return f"{self.technician.full_name} at {self.timestamp}"
 
 
+class TechnicianLastLocation(models.Model):
+    """
+    Model holding each technician's latest known position.
+    
+    Positions are bucketed into grid cells (see spatial.grid_cell) so that
+    nearest-technician lookups only scan the cells around a job site.
+    """
+    technician = models.OneToOneField(
+        Technician,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='last_location'
+    )
+    location = models.ForeignKey(
+        TechnicianLocation,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        null=True,
+        blank=True
+    )
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    cell_row = models.IntegerField()
+    cell_col = models.IntegerField()
+    timestamp = models.DateTimeField()
+    location_source = models.CharField(max_length=20, default='gps')
+    
+    class Meta:
+        verbose_name = "Technician Last Location"
+        verbose_name_plural = "Technician Last Locations"
+        indexes = [
+            models.Index(fields=['cell_row', 'cell_col']),
+        ]
+    
+    def __str__(self):
+        return f"{self.technician.full_name} last seen at {self.timestamp}"
+    
+    @classmethod
+    def _values_for(cls, location):
+        from .spatial import grid_cell
+        
+        cell_row, cell_col = grid_cell(location.latitude, location.longitude)
+        return {
+            'location_id': location.pk,
+            'latitude': float(location.latitude),
+            'longitude': float(location.longitude),
+            'cell_row': cell_row,
+            'cell_col': cell_col,
+            'timestamp': location.timestamp,
+            'location_source': location.location_source,
+        }
+    
+    @classmethod
+    def record(cls, location):
+        """Store a location fix if it is newer than the technician's last known one."""
+        from django.db import IntegrityError, transaction
+        
+        values = cls._values_for(location)
+        updated = cls.objects.filter(
+            technician_id=location.technician_id,
+            timestamp__lt=location.timestamp
+        ).update(**values)
+        
+        if not updated:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(technician_id=location.technician_id, **values)
+            except IntegrityError:
+                # A newer (or identical) fix is already recorded
+                pass
+    
+    @classmethod
+    def record_many(cls, locations):
+        """
+        Store the newest fix of each technician among the given locations,
+        which may come from bulk_create(ignore_conflicts=True) and so lack
+        their primary keys.
+        """
+        newest = {}
+        for location in locations:
+            current = newest.get(location.technician_id)
+            if current is None or location.timestamp > current.timestamp:
+                newest[location.technician_id] = location
+        
+        missing = [location for location in newest.values() if location.pk is None]
+        if missing:
+            condition = models.Q()
+            for location in missing:
+                condition |= models.Q(technician_id=location.technician_id, timestamp=location.timestamp)
+            stored = {
+                (technician_id, timestamp): pk
+                for pk, technician_id, timestamp in TechnicianLocation.objects.filter(
+                    condition
+                ).values_list('pk', 'technician_id', 'timestamp')
+            }
+            for location in missing:
+                location.pk = stored.get((location.technician_id, location.timestamp))
+        
+        for location in newest.values():
+            cls.record(location)
+    
+    @classmethod
+    def rebuild(cls):
+        """Rebuild the index from the stored location history."""
+        from django.db import transaction
+        
+        latest_ids = Technician.objects.annotate(
+            latest_location_id=models.Subquery(
+                TechnicianLocation.objects.filter(
+                    technician=models.OuterRef('pk')
+                ).order_by('-timestamp').values('id')[:1]
+            )
+        ).filter(latest_location_id__isnull=False).values_list('latest_location_id', flat=True)
+        
+        positions = [
+            cls(technician_id=location.technician_id, **cls._values_for(location))
+            for location in TechnicianLocation.objects.filter(id__in=list(latest_ids))
+        ]
+        
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(positions, batch_size=500)
+        return len(positions)
+
+
+class TechnicianDailyTrack(models.Model):
+    """
+    Model holding one technician's compacted location history for one day.
+    
+    Closed days are folded from TechnicianLocation rows into a single
+    delta-encoded blob (see tracks.encode_track) and the raw rows are deleted.
+    Fixes referenced by check-in records are left as rows.
+    """
+    technician = models.ForeignKey(Technician, on_delete=models.CASCADE, related_name='daily_tracks')
+    date = models.DateField()
+    point_count = models.PositiveIntegerField(default=0)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['technician', 'date']
+        verbose_name = "Technician Daily Track"
+        verbose_name_plural = "Technician Daily Tracks"
+    
+    def __str__(self):
+        return f"{self.technician.full_name} - {self.date} ({self.point_count} points)"
+    
+    @staticmethod
+    def _compactable_locations():
+        """Locations that can be folded into tracks (not referenced by check-ins)."""
+        return TechnicianLocation.objects.filter(
+            check_in_records__isnull=True,
+            check_out_records__isnull=True
+        )
+    
+    @classmethod
+    def compact(cls, technician_id, date):
+        """
+        Fold a technician's raw fixes for the given day into the day's track
+        and delete them. Returns the number of fixes compacted.
+        """
+        from datetime import datetime, time, timedelta
+        from django.db import transaction
+        from django.utils import timezone
+        from .tracks import decode_track, encode_track, iter_points
+        
+        day_start = timezone.make_aware(datetime.combine(date, time.min))
+        day_end = timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min))
+        
+        with transaction.atomic():
+            locations = cls._compactable_locations().filter(
+                technician_id=technician_id,
+                timestamp__gte=day_start,
+                timestamp__lt=day_end
+            ).order_by('timestamp')
+            new_points = list(iter_points(locations))
+            if not new_points:
+                return 0
+            
+            track = cls.objects.select_for_update().filter(technician_id=technician_id, date=date).first()
+            if track is None:
+                track = cls(technician_id=technician_id, date=date)
+                points = new_points
+            else:
+                # Late fixes for an already compacted day are merged into it
+                points = sorted(decode_track(track.data) + new_points, key=lambda point: point.timestamp)
+            
+            track.data = encode_track(points)
+            track.point_count = len(points)
+            track.start_time = points[0].timestamp
+            track.end_time = points[-1].timestamp
+            track.save()
+            
+            ids = [point.id for point in new_points]
+            for offset in range(0, len(ids), 500):
+                TechnicianLocation.objects.filter(id__in=ids[offset:offset + 500]).delete()
+        
+        return len(new_points)
+    
+    @classmethod
+    def compact_closed_days(cls, before=None):
+        """
+        Compact every technician's fixes recorded before the given date
+        (today by default, so only closed days are compacted).
+        Returns the number of fixes compacted.
+        """
+        from datetime import datetime, time
+        from django.db.models.functions import TruncDate
+        from django.utils import timezone
+        
+        before = before or timezone.localdate()
+        cutoff = timezone.make_aware(datetime.combine(before, time.min))
+        days = cls._compactable_locations().filter(
+            timestamp__lt=cutoff
+        ).annotate(
+            day=TruncDate('timestamp')
+        ).order_by().values_list('technician_id', 'day').distinct()
+        
+        return sum(cls.compact(technician_id, day) for technician_id, day in list(days))
+
+
 class TechnicianCheckIn(models.Model):
     """Model representing a technician's check-in/check-out record."""
     STATUS_CHOICES = [
@@ -251,10 +747,29 @@ class TechnicianCheckIn(models.Model):
     notes = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='checked_in')
     
+    # Client-supplied idempotency keys, so that retried requests are not applied twice
+    check_in_key = models.CharField(max_length=100, blank=True, null=True)
+    check_out_key = models.CharField(max_length=100, blank=True, null=True)
+    
     class Meta:
         ordering = ['-check_in_time']
         verbose_name = "Check In/Out"
         verbose_name_plural = "Check Ins/Outs"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['technician'],
+                condition=models.Q(check_out_time__isnull=True),
+                name='unique_open_check_in_per_technician'
+            ),
+            models.UniqueConstraint(
+                fields=['technician', 'check_in_key'],
+                name='unique_check_in_key_per_technician'
+            ),
+            models.UniqueConstraint(
+                fields=['technician', 'check_out_key'],
+                name='unique_check_out_key_per_technician'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.technician.full_name} - {self.check_in_time}"
@@ -292,18 +807,211 @@ class TechnicianRating(models.Model):
     def __str__(self):
         return f"{self.technician.full_name} - {self.rating}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so that saves can adjust the running aggregate
+        instance._stored_rating = (instance.technician_id, instance.rating)
+        return instance
+    
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         super().save(*args, **kwargs)
         # Update the technician's average rating
-        self.update_technician_rating()
+        self.update_technician_rating(adding)
+        self._stored_rating = (self.technician_id, self.rating)
+    
+    def update_technician_rating(self, adding=False):
+        """
+        Update the technician's average rating.
+        
+        The technician's running rating sum and count are adjusted by this
+        rating alone, so the cost does not grow with the rating history.
+        """
+        if adding:
+            Technician.apply_rating_change(self.technician_id, self.rating, 1)
+            return
+        
+        stored = getattr(self, '_stored_rating', None)
+        if stored is None:
+            # Previous value unknown, recompute from scratch
+            Technician.rebuild_rating_aggregates([self.technician_id])
+        elif stored[0] != self.technician_id:
+            Technician.apply_rating_change(stored[0], -stored[1], -1)
+            Technician.apply_rating_change(self.technician_id, self.rating, 1)
+        elif stored[1] != self.rating:
+            Technician.apply_rating_change(self.technician_id, self.rating - stored[1], 0)
+    
+    @classmethod
+    def bulk_import(cls, ratings, batch_size=500):
+        """
+        Create many ratings at once.
+        
+        Ratings are inserted with bulk_create and each affected technician's
+        aggregate is updated once with the sum and count of its new ratings.
+        """
+        from django.db import transaction
+        from django.utils import timezone
+        
+        changes = {}
+        for rating in ratings:
+            total, count = changes.get(rating.technician_id, (0.0, 0))
+            changes[rating.technician_id] = (total + rating.rating, count + 1)
+        
+        with transaction.atomic():
+            created = cls.objects.bulk_create(ratings, batch_size=batch_size)
+            for technician_id, (total, count) in changes.items():
+                Technician.apply_rating_change(technician_id, total, count)
+            # bulk_create sends no signals, so refresh the daily metrics here
+            TechnicianDailyMetrics.refresh(
+                (rating.technician_id, timezone.localdate(rating.created_at)) for rating in created
+            )
+        return created
+
+
+class TechnicianDailyMetrics(models.Model):
+    """
+    Model holding one technician's pre-aggregated performance for one day.
+    
+    Rows are kept up to date by signal handlers as assignments, work orders
+    and ratings change, so performance over any period is a sum of at most
+    one row per day. An assignment counts on the local date of its work
+    order's scheduled start (or of its assignment when unscheduled).
+    """
+    COUNTED_ASSIGNMENT_STATUSES = ['accepted', 'in_progress', 'completed']
+    
+    technician = models.ForeignKey(Technician, on_delete=models.CASCADE, related_name='daily_metrics')
+    date = models.DateField()
+    total_assignments = models.PositiveIntegerField(default=0)
+    on_time_arrivals = models.PositiveIntegerField(default=0)
+    completed_tasks = models.PositiveIntegerField(default=0)
+    rating_sum = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    work_type_counts = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['technician', 'date']
+        verbose_name = "Technician Daily Metrics"
+        verbose_name_plural = "Technician Daily Metrics"
+    
+    def __str__(self):
+        return f"{self.technician.full_name} - {self.date}"
+    
+    @staticmethod
+    def assignment_date(work_order, assigned_at=None):
+        """Return the day an assignment to the given work order counts on."""
+        from django.utils import timezone
+        
+        moment = work_order.scheduled_start or assigned_at
+        return timezone.localdate(moment) if moment else None
+    
+    @classmethod
+    def rebuild(cls, technician_ids=None, dates=None):
+        """
+        Recompute the daily rows from assignments and ratings with grouped
+        queries, optionally restricted to some technicians and days.
+        Returns the number of rows written.
+        """
+        from django.db import transaction
+        from django.db.models.functions import Coalesce, TruncDate
+        from apps.work_orders.models import WorkOrderAssignment
+        
+        assignments = WorkOrderAssignment.objects.filter(
+            status__in=cls.COUNTED_ASSIGNMENT_STATUSES
+        ).annotate(
+            day=TruncDate(Coalesce('work_order__scheduled_start', 'assigned_at'))
+        )
+        ratings = TechnicianRating.objects.annotate(day=TruncDate('created_at'))
+        rows = cls.objects.all()
+        if technician_ids is not None:
+            assignments = assignments.filter(technician_id__in=technician_ids)
+            ratings = ratings.filter(technician_id__in=technician_ids)
+            rows = rows.filter(technician_id__in=technician_ids)
+        if dates is not None:
+            assignments = assignments.filter(day__in=dates)
+            ratings = ratings.filter(day__in=dates)
+            rows = rows.filter(date__in=dates)
+        
+        metrics = {}
+        
+        def row_for(technician_id, day):
+            key = (technician_id, day)
+            if key not in metrics:
+                metrics[key] = cls(technician_id=technician_id, date=day)
+            return metrics[key]
+        
+        for values in assignments.order_by().values('technician_id', 'day', 'work_order__type').annotate(
+            total=models.Count('id'),
+            on_time=models.Count('id', filter=models.Q(started_at__lte=models.F('work_order__scheduled_start'))),
+            completed=models.Count('id', filter=models.Q(status='completed'))
+        ):
+            row = row_for(values['technician_id'], values['day'])
+            row.total_assignments += values['total']
+            row.on_time_arrivals += values['on_time']
+            row.completed_tasks += values['completed']
+            work_type = values['work_order__type']
+            row.work_type_counts[work_type] = row.work_type_counts.get(work_type, 0) + values['total']
+        
+        for values in ratings.order_by().values('technician_id', 'day').annotate(
+            total=models.Sum('rating'),
+            count=models.Count('id')
+        ):
+            row = row_for(values['technician_id'], values['day'])
+            row.rating_sum = values['total']
+            row.rating_count = values['count']
+        
+        with transaction.atomic():
+            rows.delete()
+            cls.objects.bulk_create(metrics.values(), batch_size=500)
+        invalidate_team_performance()
+        return len(metrics)
+    
+    @classmethod
+    def refresh(cls, keys):
+        """
+        Recompute the rows for the given (technician_id, date) pairs, grouped
+        per technician. Pairs with a missing part are ignored.
+        """
+        days_by_technician = {}
+        for technician_id, day in keys:
+            if technician_id is not None and day is not None:
+                days_by_technician.setdefault(technician_id, set()).add(day)
+        for technician_id, days in days_by_technician.items():
+            cls.rebuild(technician_ids=[technician_id], dates=sorted(days))
     
-    def update_technician_rating(self):
-        """Update the technician's average rating."""
-        ratings = TechnicianRating.objects.filter(technician=self.technician)
-        if ratings.exists():
-            avg_rating = ratings.aggregate(models.Avg('rating'))['rating__avg']
-            self.technician.customer_rating = avg_rating
-            self.technician.save(update_fields=['customer_rating'])
+    @classmethod
+    def summarize(cls, technician, start_date, end_date):
+        """
+        Sum a technician's daily rows between two dates (inclusive) in a
+        single query.
+        """
+        totals = {
+            'total_assignments': 0,
+            'on_time_arrivals': 0,
+            'completed_tasks': 0,
+            'rating_sum': 0.0,
+            'rating_count': 0,
+            'work_type_counts': {},
+        }
+        rows = cls.objects.filter(
+            technician=technician,
+            date__gte=start_date,
+            date__lte=end_date
+        ).values_list(
+            'total_assignments', 'on_time_arrivals', 'completed_tasks',
+            'rating_sum', 'rating_count', 'work_type_counts'
+        )
+        for assignments, on_time, completed, rating_sum, rating_count, work_types in rows:
+            totals['total_assignments'] += assignments
+            totals['on_time_arrivals'] += on_time
+            totals['completed_tasks'] += completed
+            totals['rating_sum'] += rating_sum
+            totals['rating_count'] += rating_count
+            for work_type, count in work_types.items():
+                totals['work_type_counts'][work_type] = totals['work_type_counts'].get(work_type, 0) + count
+        return totals
 
 
 class TechnicianCostMetrics(models.Model):
@@ -336,39 +1044,120 @@ class TechnicianCostMetrics(models.Model):
     def __str__(self):
         return f"{self.technician.full_name} - {self.period_start} to {self.period_end}"
     
+    KPI_FIELDS = ['cost_per_hour', 'cost_per_task', 'efficiency_score']
+    
     def calculate_kpis(self):
-        """Calculate derived KPIs based on raw metrics."""
-        if self.total_hours_worked > 0:
-            self.cost_per_hour = self.total_cost / self.total_hours_worked
-        
-        if self.total_tasks_completed > 0:
-            self.cost_per_task = self.total_cost / self.total_tasks_completed
-        
-        # Efficiency score calculation (custom formula)
-        # Higher score means better efficiency
-        if self.total_hours_worked > 0 and self.total_tasks_completed > 0:
-            tasks_per_hour = self.total_tasks_completed / self.total_hours_worked
-            customer_rating_factor = self.technician.customer_rating or 3.0  # Default to mid-range if no rating
-            completion_rate_factor = self.technician.completion_rate / 100 if self.technician.completion_rate else 0.5
-            
-            # Weighted formula that balances productivity, quality, and reliability
-            self.efficiency_score = (
-                (tasks_per_hour * 0.4) +
-                ((customer_rating_factor / 5) * 0.3) +
-                (completion_rate_factor * 0.3)
-            ) * 100  # Scale to 0-100 range
+        """Calculate derived KPIs based on raw metrics (does not save)."""
+        from .kpis import compute_cost_kpis
         
-        self.save(update_fields=['cost_per_hour', 'cost_per_task', 'efficiency_score'])
+        cost_per_hour, cost_per_task, efficiency_score = compute_cost_kpis(
+            [self.total_hours_worked],
+            [self.total_tasks_completed],
+            [self.total_cost],
+            [self.technician.customer_rating],
+            [self.technician.completion_rate]
+        )
+        self.cost_per_hour = cost_per_hour[0]
+        self.cost_per_task = cost_per_task[0]
+        self.efficiency_score = efficiency_score[0]
     
     def save(self, *args, **kwargs):
-        """Override save method to ensure KPIs are calculated."""
-        # First save to get an ID if it's a new record
+        """Override save method to ensure KPIs are calculated, in a single write."""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or not set(self.KPI_FIELDS).intersection(update_fields):
+            self.calculate_kpis()
+            if update_fields is not None:
+                kwargs['update_fields'] = list(update_fields) + self.KPI_FIELDS
         super().save(*args, **kwargs)
         
-        # Calculate KPIs if not part of the current save operation
-        update_fields = kwargs.get('update_fields', [])
-        if 'cost_per_hour' not in update_fields and 'cost_per_task' not in update_fields and 'efficiency_score' not in update_fields:
-            self.calculate_kpis()
+    @classmethod
+    def bulk_record(cls, metrics, batch_size=500):
+        """
+        Create or update many metrics rows (matched on technician and period)
+        in one transaction, with their KPIs computed in batch.
+        
+        The technician of each row must be set, as its rating and completion
+        rate feed the KPIs. Returns the (created, updated) counts.
+        """
+        from django.db import transaction
+        from .kpis import compute_cost_kpis
+        
+        if not metrics:
+            return 0, 0
+        
+        cost_per_hour, cost_per_task, efficiency_score = compute_cost_kpis(
+            [metric.total_hours_worked for metric in metrics],
+            [metric.total_tasks_completed for metric in metrics],
+            [metric.total_cost for metric in metrics],
+            [metric.technician.customer_rating for metric in metrics],
+            [metric.technician.completion_rate for metric in metrics]
+        )
+        for metric, per_hour, per_task, score in zip(metrics, cost_per_hour, cost_per_task, efficiency_score):
+            metric.cost_per_hour = per_hour
+            metric.cost_per_task = per_task
+            metric.efficiency_score = score
+        
+        keys = {(metric.technician_id, metric.period_start, metric.period_end) for metric in metrics}
+        with transaction.atomic():
+            existing = sum(
+                1 for key in cls.objects.filter(
+                    technician_id__in={key[0] for key in keys},
+                    period_start__in={key[1] for key in keys}
+                ).values_list('technician_id', 'period_start', 'period_end')
+                if key in keys
+            )
+            cls.objects.bulk_create(
+                metrics,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['technician', 'period_start', 'period_end'],
+                update_fields=[
+                    'total_hours_worked', 'total_tasks_completed', 'total_cost', 'notes',
+                    'updated_at'
+                ] + cls.KPI_FIELDS
+            )
+        return len(keys) - existing, existing
+    
+    @classmethod
+    def recompute_kpis(cls, queryset=None, chunk_size=1000):
+        """
+        Recompute the KPIs of many metrics rows, for example after a formula
+        change.
+        
+        Raw metrics and technician factors are read column by column, one
+        chunk at a time, and written back with bulk_update. Returns the number
+        of rows updated.
+        """
+        from django.db import transaction
+        from .kpis import compute_cost_kpis
+        
+        queryset = cls.objects.all() if queryset is None else queryset
+        rows = queryset.order_by('pk').values_list(
+            'pk', 'total_hours_worked', 'total_tasks_completed', 'total_cost',
+            'technician__customer_rating', 'technician__completion_rate'
+        )
+        
+        updated = 0
+        last_pk = None
+        while True:
+            chunk = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                return updated
+            
+            pks, hours, tasks, costs, ratings, completion_rates = zip(*chunk)
+            cost_per_hour, cost_per_task, efficiency_score = compute_cost_kpis(
+                hours, tasks, costs, ratings, completion_rates
+            )
+            metrics = [
+                cls(pk=pk, cost_per_hour=per_hour, cost_per_task=per_task, efficiency_score=score)
+                for pk, per_hour, per_task, score in zip(pks, cost_per_hour, cost_per_task, efficiency_score)
+            ]
+            with transaction.atomic():
+                cls.objects.bulk_update(metrics, cls.KPI_FIELDS, batch_size=200)
+            
+            updated += len(metrics)
+            last_pk = pks[-1]
 
 
 class EmploymentTypeKpiReport(models.Model):
@@ -411,61 +1200,180 @@ class EmploymentTypeKpiReport(models.Model):
     
     @classmethod
     def generate_report(cls, period_type, period_start, period_end):
-        """Generate KPI reports for all employment types for the given period."""
+        """
+        Generate KPI reports for all employment types for the given period.
+        
+        Technician and cost metrics are aggregated with one GROUP BY over the
+        employment type each, and the reports are upserted in a single
+        statement.
+        """
         from django.db.models import Avg, Sum, Count
         
-        for emp_type, _ in Technician.EMPLOYMENT_TYPE_CHOICES:
-            # Get all technicians of this employment type
-            technicians = Technician.objects.filter(employment_type=emp_type)
-            technicians_count = technicians.count()
-            
-            if technicians_count == 0:
-                continue
+        # Get technician performance metrics per employment type
+        technician_metrics = {
+            row['employment_type']: row
+            for row in Technician.objects.order_by().values('employment_type').annotate(
+                technicians_count=Count('id'),
+                avg_customer_rating=Avg('customer_rating'),
+                avg_completion_rate=Avg('completion_rate'),
+                avg_punctuality_rate=Avg('punctuality_rate')
+            )
+        }
             
-            # Get cost metrics for the period
-            cost_metrics = TechnicianCostMetrics.objects.filter(
-                technician__employment_type=emp_type,
+        # Get cost metrics for the period per employment type
+        cost_metrics = {
+            row['technician__employment_type']: row
+            for row in TechnicianCostMetrics.objects.filter(
                 period_start__gte=period_start,
                 period_end__lte=period_end
-            )
-            
-            # Calculate aggregated metrics
-            metrics_data = cost_metrics.aggregate(
+            ).order_by().values('technician__employment_type').annotate(
                 avg_cost_per_hour=Avg('cost_per_hour'),
                 avg_cost_per_task=Avg('cost_per_task'),
                 avg_efficiency_score=Avg('efficiency_score'),
                 total_cost=Sum('total_cost'),
                 total_tasks=Sum('total_tasks_completed')
             )
+        }
             
-            # Get technician performance metrics
-            technician_metrics = technicians.aggregate(
-                avg_customer_rating=Avg('customer_rating'),
-                avg_completion_rate=Avg('completion_rate'),
-                avg_punctuality_rate=Avg('punctuality_rate')
-            )
-            
-            # Create or update the report
-            report, created = cls.objects.update_or_create(
+        reports = []
+        for emp_type, _ in Technician.EMPLOYMENT_TYPE_CHOICES:
+            technicians = technician_metrics.get(emp_type)
+            if not technicians:
+                continue
+            costs = cost_metrics.get(emp_type, {})
+            reports.append(cls(
                 period_type=period_type,
                 period_start=period_start,
                 period_end=period_end,
                 employment_type=emp_type,
-                defaults={
-                    'technicians_count': technicians_count,
-                    'avg_cost_per_hour': metrics_data['avg_cost_per_hour'],
-                    'avg_cost_per_task': metrics_data['avg_cost_per_task'],
-                    'avg_efficiency_score': metrics_data['avg_efficiency_score'],
-                    'total_cost': metrics_data['total_cost'] or 0,
-                    'total_tasks_completed': metrics_data['total_tasks'] or 0,
-                    'avg_customer_rating': technician_metrics['avg_customer_rating'],
-                    'avg_completion_rate': technician_metrics['avg_completion_rate'],
-                    'avg_punctuality_rate': technician_metrics['avg_punctuality_rate'],
-                }
-            )
+                technicians_count=technicians['technicians_count'],
+                avg_cost_per_hour=costs.get('avg_cost_per_hour'),
+                avg_cost_per_task=costs.get('avg_cost_per_task'),
+                avg_efficiency_score=costs.get('avg_efficiency_score'),
+                total_cost=costs.get('total_cost') or 0,
+                total_tasks_completed=costs.get('total_tasks') or 0,
+                avg_customer_rating=technicians['avg_customer_rating'],
+                avg_completion_rate=technicians['avg_completion_rate'],
+                avg_punctuality_rate=technicians['avg_punctuality_rate'],
+            ))
+        
+        # Create or update the reports
+        cls.objects.bulk_create(
+            reports,
+            update_conflicts=True,
+            unique_fields=['period_type', 'period_start', 'period_end', 'employment_type'],
+            update_fields=[
+                'technicians_count', 'avg_cost_per_hour', 'avg_cost_per_task',
+                'avg_efficiency_score', 'total_cost', 'total_tasks_completed',
+                'avg_customer_rating', 'avg_completion_rate', 'avg_punctuality_rate',
+                'updated_at'
+            ]
+        )
             
         return cls.objects.filter(
             period_type=period_type,
             period_start=period_start,
             period_end=period_end
         )
+
+    @classmethod
+    def iter_periods(cls, period_type, start_date, end_date):
+        """
+        Yield the (period_start, period_end) calendar periods of the given
+        type that overlap the date range.
+        """
+        from datetime import date, timedelta
+        
+        months = {'monthly': 1, 'quarterly': 3, 'yearly': 12}[period_type]
+        month = (start_date.month - 1) // months * months
+        year = start_date.year
+        while True:
+            period_start = date(year, month + 1, 1)
+            if period_start > end_date:
+                return
+            year, month = divmod(year * 12 + month + months, 12)
+            yield period_start, date(year, month + 1, 1) - timedelta(days=1)
+
+
+class KpiReportJob(models.Model):
+    """
+    Model tracking an asynchronous EmploymentTypeKpiReport generation.
+    
+    A job covers one period, or every period of a type within a date range
+    when backfilling. Periods are generated by Celery workers in parallel,
+    each one counting itself as done when it finishes.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    period_type = models.CharField(max_length=20, choices=EmploymentTypeKpiReport.PERIOD_TYPE_CHOICES)
+    period_start = models.DateField()
+    period_end = models.DateField()
+    backfill = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_periods = models.PositiveIntegerField(default=0)
+    completed_periods = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='kpi_report_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "KPI Report Job"
+        verbose_name_plural = "KPI Report Jobs"
+    
+    def __str__(self):
+        kind = "Backfill" if self.backfill else "Report"
+        return f"{kind} {self.get_period_type_display()}: {self.period_start} to {self.period_end} ({self.status})"
+    
+    @property
+    def periods(self):
+        """The (period_start, period_end) pairs this job generates."""
+        if self.backfill:
+            return list(EmploymentTypeKpiReport.iter_periods(self.period_type, self.period_start, self.period_end))
+        return [(self.period_start, self.period_end)]
+    
+    def mark_started(self):
+        """Flag the job as running when its first period starts."""
+        from django.utils import timezone
+        
+        type(self).objects.filter(pk=self.pk, status='pending').update(
+            status='running',
+            started_at=timezone.now()
+        )
+    
+    def mark_period_done(self):
+        """
+        Count one generated period, completing the job with the last one.
+        Safe to call from concurrent workers.
+        """
+        from django.utils import timezone
+        
+        jobs = type(self).objects.filter(pk=self.pk)
+        jobs.update(completed_periods=models.F('completed_periods') + 1)
+        jobs.filter(
+            status='running',
+            completed_periods__gte=models.F('total_periods')
+        ).update(status='completed', finished_at=timezone.now())
+    
+    def mark_failed(self, error):
+        """Record a failed period, failing the whole job."""
+        from django.utils import timezone
+        
+        type(self).objects.filter(pk=self.pk).update(
+            status='failed',
+            error=str(error),
+            finished_at=timezone.now()
+        )
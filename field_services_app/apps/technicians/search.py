@@ -0,0 +1,178 @@
+"""
+Trigram search index over technicians.
+
+Each technician's searchable text (employee number, names, email and
+specialty names) is folded and broken into trigrams, which are stored in
+TechnicianSearchTrigram. A query is answered by counting, per technician,
+how many of its own trigrams are indexed, so misspelt and partially typed
+names still match without scanning the technician table.
+"""
+
+import math
+import re
+import unicodedata
+
+from rest_framework import filters
+
+# Spelling variants of romanized Cantonese (Hong Kong government, Yale and
+# Jyutping), folded to a single form, e.g. Cheung / Zoeng, Chan / Chaan,
+# Lee / Li, Yan / Jan
+ROMANIZATION_FOLDS = [
+    ('tsz', 'ch'),
+    ('ts', 'ch'),
+    ('z', 'ch'),
+    ('j', 'y'),
+    ('aa', 'a'),
+    ('ee', 'i'),
+    ('oo', 'u'),
+    ('oe', 'eo'),
+    ('eu', 'eo'),
+]
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Minimum share of a query's trigrams a technician must match
+MIN_SIMILARITY = 0.5
+
+
+def fold(text):
+    """Return the folded tokens of a text: no accents, lowercase, variants unified."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    tokens = []
+    for token in TOKEN_RE.findall(text):
+        for variant, folded in ROMANIZATION_FOLDS:
+            token = token.replace(variant, folded)
+        tokens.append(token)
+    return tokens
+
+
+def trigrams(tokens):
+    """
+    Return the set of trigrams of the given tokens. Tokens are padded with
+    two leading spaces so that one or two typed characters match as prefixes.
+    """
+    grams = set()
+    for token in tokens:
+        padded = f"  {token} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return grams
+
+
+def technician_tokens(technician, specialty_names):
+    """Return the folded tokens a technician is searchable by."""
+    return fold(' '.join(filter(None, [
+        technician.employee_number,
+        technician.full_name,
+        technician.nickname,
+        technician.email,
+        *specialty_names,
+    ])))
+
+
+def search_technicians(query, queryset=None, limit=20):
+    """
+    Rank technicians by how well they match the query.
+    
+    Returns a list of (score, technician_id) tuples, best first, at most
+    `limit` of them unless `limit` is None. The score is the share of the
+    query's trigrams the technician matches, plus a bonus when a query word
+    is a prefix of one of the technician's words.
+    """
+    from django.db.models import Count
+    from .models import TechnicianSearchTrigram
+    
+    query_tokens = fold(query)
+    query_grams = trigrams(query_tokens)
+    if not query_grams:
+        return []
+    
+    matches = TechnicianSearchTrigram.objects.filter(trigram__in=query_grams)
+    if queryset is not None:
+        matches = matches.filter(technician__in=queryset.values('pk'))
+    minimum_hits = max(1, math.ceil(len(query_grams) * MIN_SIMILARITY))
+    candidates = matches.order_by().values('technician_id').annotate(
+        hits=Count('id')
+    ).filter(hits__gte=minimum_hits).order_by('-hits')
+    if limit is not None:
+        candidates = candidates[:limit * 5]
+    candidates = {row['technician_id']: row['hits'] for row in candidates}
+    
+    # Break ties between similar trigram matches on word prefixes
+    from .models import TechnicianSearchDocument
+    documents = TechnicianSearchDocument.objects.filter(
+        technician_id__in=list(candidates)
+    ).values_list('technician_id', 'tokens')
+    
+    results = []
+    for technician_id, tokens in documents:
+        words = tokens.split()
+        score = candidates[technician_id] / len(query_grams)
+        if all(any(word.startswith(token) for word in words) for token in query_tokens):
+            score += 0.5
+        results.append((score, technician_id))
+    
+    results.sort(key=lambda result: (-result[0], result[1]))
+    return results if limit is None else results[:limit]
+
+
+def index_technicians(technician_ids=None):
+    """
+    (Re)build the search index entries of the given technicians, or of every
+    technician. Returns the number of technicians indexed.
+    """
+    from django.db import transaction
+    from .models import Technician, TechnicianSearchDocument, TechnicianSearchTrigram
+    
+    technicians = Technician.objects.prefetch_related('specialties')
+    if technician_ids is not None:
+        technicians = technicians.filter(pk__in=technician_ids)
+    
+    documents = []
+    grams = []
+    for technician in technicians:
+        tokens = technician_tokens(technician, [specialty.name for specialty in technician.specialties.all()])
+        documents.append(TechnicianSearchDocument(technician=technician, tokens=' '.join(tokens)))
+        grams.extend(
+            TechnicianSearchTrigram(technician=technician, trigram=gram)
+            for gram in trigrams(tokens)
+        )
+    
+    with transaction.atomic():
+        stale_documents = TechnicianSearchDocument.objects.all()
+        stale_grams = TechnicianSearchTrigram.objects.all()
+        if technician_ids is not None:
+            stale_documents = stale_documents.filter(technician_id__in=technician_ids)
+            stale_grams = stale_grams.filter(technician_id__in=technician_ids)
+        stale_documents.delete()
+        stale_grams.delete()
+        TechnicianSearchDocument.objects.bulk_create(documents, batch_size=500)
+        TechnicianSearchTrigram.objects.bulk_create(grams, batch_size=1000)
+    return len(documents)
+
+
+class TechnicianSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter answering the `search` parameter from the trigram index
+    instead of LIKE scans over the technician fields. Matches come best
+    first unless the client asked for an ordering, so the filter goes after
+    OrderingFilter.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        from django.db.models import Case, IntegerField, When
+        from rest_framework.settings import api_settings
+        
+        query = ' '.join(self.get_search_terms(request))
+        if not query:
+            return queryset
+        ids = [technician_id for _, technician_id in search_technicians(query, queryset, limit=None)]
+        if not ids:
+            return queryset.none()
+        queryset = queryset.filter(pk__in=ids).annotate(search_rank=Case(
+            *[When(pk=technician_id, then=position) for position, technician_id in enumerate(ids)],
+            output_field=IntegerField()
+        ))
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        return queryset.order_by('search_rank')
@@ -8,7 +8,8 @@ from .models import (
     TechnicianCheckIn,
     TechnicianRating,
     TechnicianCostMetrics,
-    EmploymentTypeKpiReport
+    EmploymentTypeKpiReport,
+    KpiReportJob
 )
 
 
@@ -80,12 +81,15 @@ class TechnicianListSerializer(serializers.ModelSerializer):
     def get_today_check_in(self, obj):
         """Get the technician's check-in record for today, if any."""
         from django.utils import timezone
-        import datetime
         
-        today = timezone.now().date()
-        check_in = obj.check_ins.filter(
-            check_in_time__date=today
-        ).order_by('-check_in_time').first()
+        # Use the check-ins prefetched by TechnicianQuerySet.with_roster_data()
+        if hasattr(obj, 'today_check_ins'):
+            check_in = obj.today_check_ins[0] if obj.today_check_ins else None
+        else:
+            today = timezone.now().date()
+            check_in = obj.check_ins.filter(
+                check_in_time__date=today
+            ).order_by('-check_in_time').first()
         
         if check_in:
             return TechnicianCheckInSerializer(check_in).data
@@ -197,6 +201,7 @@ class CheckInRequestSerializer(serializers.Serializer):
     site_name = serializers.CharField(required=False, allow_blank=True)
     notes = serializers.CharField(required=False, allow_blank=True)
     send_whatsapp_notification = serializers.BooleanField(default=False)
+    idempotency_key = serializers.CharField(required=False, allow_blank=True, max_length=100)
 
 
 class CheckOutRequestSerializer(serializers.Serializer):
@@ -208,6 +213,29 @@ class CheckOutRequestSerializer(serializers.Serializer):
     altitude = serializers.FloatField(required=False, allow_null=True)
     notes = serializers.CharField(required=False, allow_blank=True)
     send_whatsapp_notification = serializers.BooleanField(default=False)
+    idempotency_key = serializers.CharField(required=False, allow_blank=True, max_length=100)
+
+
+class LocationFixSerializer(serializers.Serializer):
+    """Serializer for a single GPS fix posted by a device."""
+    latitude = serializers.FloatField(min_value=-90.0, max_value=90.0)
+    longitude = serializers.FloatField(min_value=-180.0, max_value=180.0)
+    accuracy = serializers.FloatField(required=False, allow_null=True)
+    altitude = serializers.FloatField(required=False, allow_null=True)
+    timestamp = serializers.DateTimeField()
+
+
+class LocationBatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of GPS fixes from one device.
+    
+    Fixes are validated one by one by the ingest action with
+    LocationFixSerializer, so that a single bad fix, even one that is not an
+    object, is rejected without failing the rest of the batch.
+    """
+    technician_id = serializers.IntegerField()
+    batch_id = serializers.CharField(required=False, allow_blank=True)
+    fixes = serializers.ListField(allow_empty=True)
 
 
 class TechnicianRatingRequestSerializer(serializers.Serializer):
@@ -221,6 +249,11 @@ class TechnicianRatingRequestSerializer(serializers.Serializer):
     work_order = serializers.IntegerField(required=False, allow_null=True)
 
 
+class TechnicianRatingImportSerializer(TechnicianRatingRequestSerializer):
+    """Serializer for one row of a bulk rating import."""
+    technician_id = serializers.IntegerField(required=True)
+
+
 class TechnicianCostMetricsSerializer(serializers.ModelSerializer):
     """Serializer for technician cost metrics."""
     technician_name = serializers.SerializerMethodField()
@@ -246,6 +279,22 @@ class TechnicianCostMetricsSerializer(serializers.ModelSerializer):
         }
 
 
+class CostMetricsRecordSerializer(serializers.Serializer):
+    """Serializer for one row of a bulk cost metrics recording."""
+    technician_id = serializers.IntegerField()
+    period_start = serializers.DateField()
+    period_end = serializers.DateField()
+    total_hours_worked = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    total_tasks_completed = serializers.IntegerField(min_value=0)
+    total_cost = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+    
+    def validate(self, data):
+        if data['period_start'] > data['period_end']:
+            raise serializers.ValidationError("period_start must not be after period_end")
+        return data
+
+
 class EmploymentTypeKpiReportSerializer(serializers.ModelSerializer):
     """Serializer for employment type KPI reports."""
     employment_type_display = serializers.SerializerMethodField()
@@ -271,6 +320,18 @@ class EmploymentTypeKpiReportSerializer(serializers.ModelSerializer):
         return obj.get_period_type_display()
 
 
+class KpiReportJobSerializer(serializers.ModelSerializer):
+    """Serializer for KPI report generation jobs."""
+    
+    class Meta:
+        model = KpiReportJob
+        fields = [
+            'id', 'period_type', 'period_start', 'period_end', 'backfill',
+            'status', 'total_periods', 'completed_periods', 'error',
+            'created_at', 'started_at', 'finished_at'
+        ]
+
+
 class TechnicianExtendedDetailSerializer(TechnicianDetailSerializer):
     """Extended serializer that includes employment and cost details."""
     employment_type_display = serializers.SerializerMethodField()
@@ -0,0 +1,198 @@
+"""
+Signal handlers for the technicians app.
+"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.work_orders.models import WorkOrder, WorkOrderAssignment
+
+from .caching import invalidate_team_performance
+from .search import index_technicians
+from .models import (
+    Specialty,
+    Technician,
+    TechnicianCertification,
+    TechnicianDailyMetrics,
+    TechnicianLocation,
+    TechnicianLastLocation,
+    TechnicianRating,
+    TechnicianValidCertification,
+)
+
+
+@receiver(post_save, sender=TechnicianLocation)
+def update_last_location(sender, instance, created, **kwargs):
+    """
+    Signal handler to keep the technician's last known position (used for
+    nearest-technician lookups) in step with new location fixes.
+    """
+    if created:
+        TechnicianLastLocation.record(instance)
+
+
+@receiver(pre_save, sender=WorkOrderAssignment)
+def remember_assignment_metrics_day(sender, instance, **kwargs):
+    """
+    Signal handler to remember which daily metrics row an assignment counted
+    on before it is saved, in case its technician or work order changes.
+    """
+    instance._previous_metrics_key = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list(
+            'technician_id', 'work_order__scheduled_start', 'assigned_at'
+        ).first()
+        if previous:
+            technician_id, scheduled_start, assigned_at = previous
+            instance._previous_metrics_key = (
+                technician_id, timezone.localdate(scheduled_start or assigned_at)
+            )
+
+
+@receiver(post_save, sender=WorkOrderAssignment)
+@receiver(post_delete, sender=WorkOrderAssignment)
+def update_assignment_daily_metrics(sender, instance, **kwargs):
+    """
+    Signal handler to refresh the daily metrics rows affected by an
+    assignment change.
+    """
+    keys = {(
+        instance.technician_id,
+        TechnicianDailyMetrics.assignment_date(instance.work_order, instance.assigned_at)
+    )}
+    previous = getattr(instance, '_previous_metrics_key', None)
+    if previous:
+        keys.add(previous)
+    TechnicianDailyMetrics.refresh(keys)
+
+
+@receiver(pre_save, sender=WorkOrder)
+def remember_work_order_schedule(sender, instance, **kwargs):
+    """
+    Signal handler to remember a work order's stored schedule and type, so
+    that rescheduling can move its assignments between daily metrics rows.
+    """
+    instance._previous_schedule = None
+    if instance.pk:
+        instance._previous_schedule = sender.objects.filter(pk=instance.pk).values_list(
+            'scheduled_start', 'type'
+        ).first()
+
+
+@receiver(post_save, sender=WorkOrder)
+def update_work_order_daily_metrics(sender, instance, created, **kwargs):
+    """
+    Signal handler to refresh the daily metrics of a work order's technicians
+    when it is rescheduled or its type changes.
+    """
+    previous = getattr(instance, '_previous_schedule', None)
+    if created or previous is None or previous == (instance.scheduled_start, instance.type):
+        return
+    
+    keys = set()
+    for technician_id, assigned_at in instance.assignments.values_list('technician_id', 'assigned_at'):
+        keys.add((technician_id, timezone.localdate(previous[0] or assigned_at)))
+        keys.add((technician_id, TechnicianDailyMetrics.assignment_date(instance, assigned_at)))
+    TechnicianDailyMetrics.refresh(keys)
+
+
+@receiver(post_save, sender=TechnicianRating)
+@receiver(post_delete, sender=TechnicianRating)
+def update_rating_daily_metrics(sender, instance, **kwargs):
+    """
+    Signal handler to refresh the daily metrics row of a rating.
+    """
+    day = timezone.localdate(instance.created_at)
+    keys = {(instance.technician_id, day)}
+    stored = getattr(instance, '_stored_rating', None)
+    if stored:
+        keys.add((stored[0], day))
+    TechnicianDailyMetrics.refresh(keys)
+
+
+@receiver(post_delete, sender=TechnicianRating)
+def remove_rating_from_aggregate(sender, instance, **kwargs):
+    """
+    Signal handler to take a deleted rating out of its technician's running
+    aggregate, whether it was deleted alone, in bulk or by cascade.
+    """
+    technician_id, rating = getattr(instance, '_stored_rating', (instance.technician_id, instance.rating))
+    Technician.apply_rating_change(technician_id, -rating, -1)
+
+
+@receiver(post_save, sender=Technician)
+@receiver(post_delete, sender=Technician)
+@receiver(post_save, sender=Specialty)
+@receiver(post_delete, sender=Specialty)
+@receiver(m2m_changed, sender=Technician.specialties.through)
+def invalidate_team_metrics(sender, **kwargs):
+    """
+    Signal handler to drop cached team performance results when technician
+    rates, availability or specialties (including their names) change.
+    """
+    invalidate_team_performance()
+
+
+@receiver(post_save, sender=Technician)
+def update_technician_search_index(sender, instance, **kwargs):
+    """
+    Signal handler to keep a technician's search index entries in step with
+    their details.
+    """
+    index_technicians([instance.pk])
+
+
+@receiver(m2m_changed, sender=Technician.specialties.through)
+def update_specialties_search_index(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal handler to reindex technicians whose specialties changed, from
+    either side of the relation.
+    """
+    if reverse and action == 'pre_clear':
+        # Remember who is about to lose the specialty
+        instance._cleared_technician_ids = list(instance.technicians.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        index_technicians([instance.pk])
+    elif action == 'post_clear':
+        index_technicians(getattr(instance, '_cleared_technician_ids', []))
+    else:
+        index_technicians(pk_set)
+
+
+@receiver(post_save, sender=Specialty)
+def update_specialty_search_index(sender, instance, created, **kwargs):
+    """
+    Signal handler to reindex the technicians of a renamed specialty.
+    """
+    if not created:
+        index_technicians(list(instance.technicians.values_list('pk', flat=True)))
+
+
+@receiver(pre_delete, sender=Specialty)
+def remember_specialty_technicians(sender, instance, **kwargs):
+    """
+    Signal handler to remember the technicians of a specialty about to be
+    deleted, as its through rows are deleted without m2m_changed.
+    """
+    instance._technician_ids = list(instance.technicians.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Specialty)
+def update_deleted_specialty_search_index(sender, instance, **kwargs):
+    """
+    Signal handler to reindex the technicians of a deleted specialty.
+    """
+    index_technicians(getattr(instance, '_technician_ids', []))
+
+
+@receiver(post_save, sender=TechnicianCertification)
+@receiver(post_delete, sender=TechnicianCertification)
+def refresh_valid_certifications(sender, instance, **kwargs):
+    """
+    Signal handler to keep the technician's precomputed valid certifications
+    in step with their certification records.
+    """
+    TechnicianValidCertification.refresh([instance.technician_id])
@@ -0,0 +1,231 @@
+"""
+Spatial helpers for technician positions.
+
+Technicians' latest fixes are bucketed into a fixed latitude/longitude grid
+(see TechnicianLastLocation), so nearest-neighbour lookups only read the
+cells around the query point instead of every stored location.
+
+Pairwise distances between technicians and job sites go through a shared
+DistanceMatrix, which caches them per process so repeated dispatch and
+routing runs over the same sites do not recompute them.
+"""
+
+import math
+import threading
+from array import array
+from collections import OrderedDict
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Size of a grid cell in degrees (about 1.1 km north-south)
+GRID_CELL_DEGREES = 0.01
+
+# Kilometers per degree of latitude
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Decimal places of the coordinates used as distance cache keys (about 11 m)
+MATRIX_KEY_PRECISION = 4
+
+# Origin/destination pairs kept in the distance cache
+MATRIX_CACHE_SIZE = 200000
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Return the great-circle distance in kilometers between two points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2 +
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_matrix(origins, destinations):
+    """
+    Return the great-circle distances in kilometers from each origin to each
+    destination ((lat, lon) tuples), as one array of distances per origin.
+    
+    The trigonometry of each point is computed once rather than once per
+    pair.
+    """
+    def prepare(points):
+        latitudes = [math.radians(float(latitude)) for latitude, _ in points]
+        longitudes = [math.radians(float(longitude)) for _, longitude in points]
+        return latitudes, longitudes, [math.cos(latitude) for latitude in latitudes]
+    
+    destination_lats, destination_lons, destination_cos = prepare(destinations)
+    origin_lats, origin_lons, origin_cos = prepare(origins)
+    sin, asin, sqrt = math.sin, math.asin, math.sqrt
+    
+    rows = []
+    for lat1, lon1, cos1 in zip(origin_lats, origin_lons, origin_cos):
+        rows.append(array('d', (
+            2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(
+                sin((lat2 - lat1) / 2) ** 2 + cos1 * cos2 * sin((lon2 - lon1) / 2) ** 2
+            )))
+            for lat2, lon2, cos2 in zip(destination_lats, destination_lons, destination_cos)
+        )))
+    return rows
+
+
+class DistanceMatrix:
+    """
+    Origin x destination distance lookups backed by a bounded LRU cache.
+    
+    Points are keyed on their coordinates rounded to `precision` decimal
+    places. Pairs missing from the cache are computed with one `backend`
+    call, a callable with the signature of haversine_matrix (swap in a
+    local router for road distances or travel times). Hit and miss counts
+    are kept for monitoring, see stats().
+    """
+    
+    def __init__(self, backend=haversine_matrix, max_entries=MATRIX_CACHE_SIZE, precision=MATRIX_KEY_PRECISION):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _key(self, point):
+        return (round(float(point[0]), self.precision), round(float(point[1]), self.precision))
+    
+    def matrix(self, origins, destinations):
+        """
+        Return the distances from each origin to each destination as a list
+        of rows. Pairs involving an unknown (None) position are None.
+        """
+        origin_keys = [None if point is None else self._key(point) for point in origins]
+        destination_keys = [None if point is None else self._key(point) for point in destinations]
+        rows = [[None] * len(destination_keys) for _ in origin_keys]
+        missing_origins = {}
+        missing_destinations = {}
+        
+        with self._lock:
+            for row, origin in zip(rows, origin_keys):
+                if origin is None:
+                    continue
+                for index, destination in enumerate(destination_keys):
+                    if destination is None:
+                        continue
+                    distance = self._cache.get((origin, destination))
+                    if distance is None:
+                        self.misses += 1
+                        missing_origins.setdefault(origin, len(missing_origins))
+                        missing_destinations.setdefault(destination, len(missing_destinations))
+                    else:
+                        self.hits += 1
+                        self._cache.move_to_end((origin, destination))
+                        row[index] = distance
+        
+        if not missing_origins:
+            return rows
+        
+        # One backend call for every missing origin and destination
+        computed = self.backend(list(missing_origins), list(missing_destinations))
+        
+        with self._lock:
+            for origin, origin_index in missing_origins.items():
+                computed_row = computed[origin_index]
+                for destination, destination_index in missing_destinations.items():
+                    self._cache[(origin, destination)] = computed_row[destination_index]
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        
+        for row, origin in zip(rows, origin_keys):
+            if origin not in missing_origins:
+                continue
+            computed_row = computed[missing_origins[origin]]
+            for index, destination in enumerate(destination_keys):
+                if row[index] is None and destination is not None:
+                    row[index] = computed_row[missing_destinations[destination]]
+        return rows
+    
+    def distance(self, origin, destination):
+        """Return the distance between two points, or None if either is unknown."""
+        return self.matrix([origin], [destination])[0][0]
+    
+    def stats(self):
+        """Return the cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._cache),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+    
+    def clear(self):
+        """Empty the cache and reset the counters."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Shared by dispatch and routing
+distance_matrix = DistanceMatrix()
+
+
+def grid_cell(latitude, longitude):
+    """Return the (row, col) grid cell containing the given point."""
+    return (
+        math.floor(float(latitude) / GRID_CELL_DEGREES),
+        math.floor(float(longitude) / GRID_CELL_DEGREES),
+    )
+
+
+def _covered_radius_km(latitude, rings):
+    """
+    Return the radius around a point that is fully covered by the cells
+    within `rings` cells of the point's own cell.
+    """
+    span = rings * GRID_CELL_DEGREES
+    # East-west cells shrink towards the poles, so use the worst latitude in range
+    worst_latitude = min(89.0, abs(float(latitude)) + span)
+    return span * KM_PER_DEGREE * math.cos(math.radians(worst_latitude))
+
+
+def nearest_positions(queryset, latitude, longitude, limit=10, max_radius_km=50.0):
+    """
+    Find the positions closest to a point.
+    
+    `queryset` is a TechnicianLastLocation queryset, already filtered on
+    whatever technician attributes the caller needs. The search starts with
+    the cells next to the point and doubles the number of rings of cells
+    searched until `limit` positions are found inside the covered radius or
+    `max_radius_km` is reached.
+    
+    Returns a list of (distance_km, position) tuples, closest first.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    row, col = grid_cell(latitude, longitude)
+    rings = 1
+    
+    while True:
+        covered_km = _covered_radius_km(latitude, rings)
+        search_km = min(covered_km, max_radius_km)
+        
+        candidates = queryset.filter(
+            cell_row__gte=row - rings,
+            cell_row__lte=row + rings,
+            cell_col__gte=col - rings,
+            cell_col__lte=col + rings,
+        )
+        
+        results = []
+        for position in candidates:
+            distance = haversine_km(latitude, longitude, position.latitude, position.longitude)
+            if distance <= search_km:
+                results.append((distance, position))
+        
+        # Anything outside the searched cells is further away than covered_km,
+        # so the results are exact once enough of them fall inside it
+        if len(results) >= limit or covered_km >= max_radius_km:
+            results.sort(key=lambda result: result[0])
+            return results[:limit]
+        
+        rings *= 2
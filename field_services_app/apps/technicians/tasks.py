@@ -0,0 +1,81 @@
+"""
+Celery tasks for the technicians app.
+"""
+
+import logging
+
+from celery import shared_task
+
+from .models import EmploymentTypeKpiReport, KpiReportJob
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_kpi_report_period(job_id, period_start, period_end):
+    """Generate the employment type KPI reports of one period of a job."""
+    from datetime import date
+    
+    job = KpiReportJob.objects.get(pk=job_id)
+    if job.status == 'failed':
+        return
+    
+    job.mark_started()
+    try:
+        EmploymentTypeKpiReport.generate_report(
+            period_type=job.period_type,
+            period_start=date.fromisoformat(period_start),
+            period_end=date.fromisoformat(period_end)
+        )
+    except Exception as exc:
+        job.mark_failed(exc)
+        raise
+    job.mark_period_done()
+
+
+@shared_task
+def sweep_certifications():
+    """Nightly certification compliance sweep, see compliance.sweep_certifications."""
+    from .compliance import sweep_certifications as run_sweep
+    
+    valid_count, notification_count = run_sweep()
+    return {'valid_certifications': valid_count, 'notifications': notification_count}
+
+
+@shared_task
+def send_whatsapp_notification(whatsapp_number, message):
+    """Send a WhatsApp notification to a technician."""
+    # This would integrate with WhatsApp API
+    # For now, just log the message
+    logger.info("WhatsApp notification would be sent to %s: %s", whatsapp_number, message)
+
+
+def start_kpi_report_job(job):
+    """
+    Queue one task per period of the job once the current transaction
+    commits, so that backfills are spread across all workers.
+    
+    Queueing runs within the request, so it is not retried: when the broker
+    cannot be reached the job is marked failed (tasks already queued then
+    skip their period) rather than left pending forever.
+    """
+    from django.db import transaction
+    
+    periods = job.periods
+    job.total_periods = len(periods)
+    job.save(update_fields=['total_periods'])
+    
+    def dispatch():
+        for period_start, period_end in periods:
+            try:
+                generate_kpi_report_period.apply_async(
+                    (job.pk, period_start.isoformat(), period_end.isoformat()),
+                    retry=False
+                )
+            except Exception as exc:
+                logger.exception("Could not queue KPI report job %s", job.pk)
+                job.mark_failed(exc)
+                return
+    
+    transaction.on_commit(dispatch)
+    return job
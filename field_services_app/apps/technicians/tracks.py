@@ -0,0 +1,269 @@
+"""
+Location history helpers: downsampling, simplification and streaming of
+technician tracks.
+"""
+
+import heapq
+import json
+import math
+import struct
+import sys
+import zlib
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .spatial import EARTH_RADIUS_KM
+
+# A stored fix, with the same attributes as a TechnicianLocation row
+TrackPoint = namedtuple(
+    'TrackPoint',
+    ['id', 'latitude', 'longitude', 'altitude', 'accuracy', 'timestamp', 'location_source']
+)
+
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000
+
+# Points serialized per chunk of a streamed response
+STREAM_CHUNK_SIZE = 500
+
+
+def iter_points(queryset, chunk_size=2000):
+    """Iterate over a TechnicianLocation queryset as TrackPoint tuples."""
+    for row in queryset.values_list(*TrackPoint._fields).iterator(chunk_size=chunk_size):
+        yield TrackPoint(*row)
+
+
+# Encoded track layout: version, point count, then the column arrays
+TRACK_FORMAT_VERSION = 1
+TRACK_HEADER = struct.Struct('<BI')
+
+# Location sources stored as one byte per point in encoded tracks
+TRACK_SOURCES = ('check_in', 'check_out', 'gps', 'manual')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _delta_encode(values, typecode):
+    encoded = array(typecode, values)
+    for index in range(len(encoded) - 1, 0, -1):
+        encoded[index] -= encoded[index - 1]
+    return encoded
+
+
+def _delta_decode(encoded):
+    for index in range(1, len(encoded)):
+        encoded[index] += encoded[index - 1]
+    return encoded
+
+
+def _to_bytes(values):
+    # Encoded tracks are little-endian whatever the host
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode, data, offset, count):
+    values = array(typecode)
+    end = offset + values.itemsize * count
+    values.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, end
+
+
+def encode_track(points):
+    """
+    Encode chronologically ordered points into a compact binary blob.
+    
+    Timestamps (microseconds) and coordinates (microdegrees, the precision of
+    TechnicianLocation) are delta-encoded into integer arrays, altitude and
+    accuracy are stored as 32-bit floats (NaN for missing values) and the
+    source as one byte. The concatenated arrays are then zlib-compressed,
+    which packs the small deltas of a continuous track very tightly.
+    """
+    nan = float('nan')
+    columns = [
+        _delta_encode(((point.timestamp - EPOCH) // timedelta(microseconds=1) for point in points), 'q'),
+        _delta_encode((round(float(point.latitude) * 1000000) for point in points), 'i'),
+        _delta_encode((round(float(point.longitude) * 1000000) for point in points), 'i'),
+        array('f', (nan if point.altitude is None else point.altitude for point in points)),
+        array('f', (nan if point.accuracy is None else point.accuracy for point in points)),
+        array('B', (TRACK_SOURCES.index(point.location_source) for point in points)),
+    ]
+    payload = b''.join(_to_bytes(column) for column in columns)
+    return TRACK_HEADER.pack(TRACK_FORMAT_VERSION, len(points)) + zlib.compress(payload, 9)
+
+
+def decode_track(data):
+    """Decode a blob produced by encode_track into a list of TrackPoints."""
+    data = bytes(data)
+    version, count = TRACK_HEADER.unpack_from(data)
+    if version != TRACK_FORMAT_VERSION:
+        raise ValueError(f"Unsupported track format version: {version}")
+    payload = zlib.decompress(data[TRACK_HEADER.size:])
+    
+    timestamps, offset = _from_bytes('q', payload, 0, count)
+    latitudes, offset = _from_bytes('i', payload, offset, count)
+    longitudes, offset = _from_bytes('i', payload, offset, count)
+    altitudes, offset = _from_bytes('f', payload, offset, count)
+    accuracies, offset = _from_bytes('f', payload, offset, count)
+    sources, offset = _from_bytes('B', payload, offset, count)
+    
+    _delta_decode(timestamps)
+    _delta_decode(latitudes)
+    _delta_decode(longitudes)
+    
+    return [
+        TrackPoint(
+            None,
+            Decimal(latitude).scaleb(-6),
+            Decimal(longitude).scaleb(-6),
+            None if math.isnan(altitude) else altitude,
+            None if math.isnan(accuracy) else accuracy,
+            EPOCH + timedelta(microseconds=timestamp),
+            TRACK_SOURCES[source],
+        )
+        for timestamp, latitude, longitude, altitude, accuracy, source in zip(
+            timestamps, latitudes, longitudes, altitudes, accuracies, sources
+        )
+    ]
+
+
+def iter_track(technician, start=None, end=None, newest_first=True):
+    """
+    Iterate over a technician's location history between `start` and `end`.
+    
+    Reads both the raw TechnicianLocation rows and the compacted
+    TechnicianDailyTrack blobs, merged into a single time-ordered stream.
+    Compacted days are decoded one at a time.
+    """
+    from .models import TechnicianDailyTrack
+    
+    locations = technician.locations.all()
+    tracks = TechnicianDailyTrack.objects.filter(technician=technician)
+    if start is not None:
+        locations = locations.filter(timestamp__gte=start)
+        tracks = tracks.filter(end_time__gte=start)
+    if end is not None:
+        locations = locations.filter(timestamp__lte=end)
+        tracks = tracks.filter(start_time__lte=end)
+    
+    def compacted_points():
+        for track in tracks.order_by('-date' if newest_first else 'date').iterator():
+            points = decode_track(track.data)
+            if newest_first:
+                points.reverse()
+            for point in points:
+                if (start is None or point.timestamp >= start) and (end is None or point.timestamp <= end):
+                    yield point
+    
+    hot_points = iter_points(locations.order_by('-timestamp' if newest_first else 'timestamp'))
+    return heapq.merge(
+        hot_points,
+        compacted_points(),
+        key=lambda point: point.timestamp,
+        reverse=newest_first
+    )
+
+
+def bucket_points(points, seconds):
+    """
+    Downsample chronologically ordered points to one point per time bucket.
+    
+    The last fix of each `seconds`-long bucket is kept, so the result is made
+    of real fixes rather than averaged positions.
+    """
+    kept = []
+    current_bucket = None
+    for point in points:
+        bucket = math.floor(point.timestamp.timestamp() / seconds)
+        if bucket == current_bucket:
+            kept[-1] = point
+        else:
+            kept.append(point)
+            current_bucket = bucket
+    return kept
+
+
+def _project(points):
+    """
+    Project points onto a local plane in meters (equirectangular around the
+    track's mean latitude), returning x and y coordinate arrays.
+    """
+    latitudes = array('d', (float(point.latitude) for point in points))
+    longitudes = array('d', (float(point.longitude) for point in points))
+    scale = math.cos(math.radians(sum(latitudes) / len(latitudes)))
+    to_meters = math.pi * EARTH_RADIUS_M / 180
+    xs = array('d', (longitude * to_meters * scale for longitude in longitudes))
+    ys = array('d', (latitude * to_meters for latitude in latitudes))
+    return xs, ys
+
+
+def simplify_points(points, tolerance_m):
+    """
+    Simplify chronologically ordered points with the Douglas-Peucker algorithm.
+    
+    Points closer than `tolerance_m` meters to the line joining the points
+    kept around them are dropped. Runs iteratively over flat coordinate
+    arrays, so long tracks do not hit the recursion limit.
+    """
+    count = len(points)
+    if count < 3:
+        return list(points)
+    
+    xs, ys = _project(points)
+    keep = bytearray(count)
+    keep[0] = keep[-1] = 1
+    tolerance_sq = tolerance_m * tolerance_m
+    
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1, x2, y2 = xs[first], ys[first], xs[last], ys[last]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+        
+        max_distance_sq = -1.0
+        max_index = first
+        for index in range(first + 1, last):
+            px, py = xs[index] - x1, ys[index] - y1
+            if length_sq:
+                # Distance to the segment, clamped to its end points
+                t = max(0.0, min(1.0, (px * dx + py * dy) / length_sq))
+                px, py = px - t * dx, py - t * dy
+            distance_sq = px * px + py * py
+            if distance_sq > max_distance_sq:
+                max_distance_sq = distance_sq
+                max_index = index
+        
+        if max_distance_sq > tolerance_sq:
+            keep[max_index] = 1
+            stack.append((first, max_index))
+            stack.append((max_index, last))
+    
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def stream_json(points, serializer_class):
+    """
+    Yield a JSON array of the given points, rendered with `serializer_class`,
+    in chunks of STREAM_CHUNK_SIZE points.
+    """
+    serializer = serializer_class()
+    yield '['
+    chunk = []
+    first = True
+    for point in points:
+        chunk.append(json.dumps(serializer.to_representation(point), cls=DjangoJSONEncoder))
+        if len(chunk) >= STREAM_CHUNK_SIZE:
+            yield ('' if first else ',') + ','.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield ('' if first else ',') + ','.join(chunk)
+    yield ']'
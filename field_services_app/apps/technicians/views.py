@@ -1,3 +1,11 @@
+import csv
+import io
+import logging
+import math
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import viewsets, status, filters
@@ -15,10 +23,15 @@ from .models import (
     Certification,
     TechnicianCheckIn,
     TechnicianLocation,
+    TechnicianLastLocation,
     TechnicianRating,
+    TechnicianDailyMetrics,
     TechnicianCostMetrics,
-    EmploymentTypeKpiReport
+    EmploymentTypeKpiReport,
+    KpiReportJob
 )
+from .availability import CHECKED_IN, FREE, LEAVE, SCHEDULED, availability_matrix
+from .caching import TEAM_PERFORMANCE_TIMEOUT, team_performance_key
 from .serializers import (
     TechnicianListSerializer,
     TechnicianDetailSerializer,
@@ -35,8 +48,18 @@ from .serializers import (
     CheckOutRequestSerializer,
     TechnicianRatingRequestSerializer,
     TechnicianCostMetricsSerializer,
-    EmploymentTypeKpiReportSerializer
+    CostMetricsRecordSerializer,
+    EmploymentTypeKpiReportSerializer,
+    KpiReportJobSerializer,
+    LocationBatchSerializer,
+    LocationFixSerializer,
+    TechnicianRatingImportSerializer
 )
+from .search import TechnicianSearchFilter, search_technicians
+from .spatial import nearest_positions
+from .tracks import iter_track, bucket_points, simplify_points, stream_json
+
+logger = logging.getLogger(__name__)
 
 class TechnicianViewSet(viewsets.ModelViewSet):
     """ViewSet for viewing and editing technician information."""
@@ -54,7 +77,7 @@ class TechnicianViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAdmin]
         elif self.action in ['create', 'update', 'partial_update']:
             permission_classes = [IsAdmin | IsManager]
-        elif self.action in ['list', 'retrieve', 'available', 'team_performance']:
+        elif self.action in ['list', 'retrieve', 'available', 'team_performance', 'ingest_locations', 'search']:
             permission_classes = [IsAuthenticated]
         else:
             # Other detail actions
@@ -71,12 +94,19 @@ class TechnicianViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(id=user.technician_profile.id)
             
         # Apply filters
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, TechnicianSearchFilter]
     filterset_fields = ['availability_status', 'specialties']
+    # Answered from the trigram index, see search.py
     search_fields = ['employee_number', 'full_name', 'nickname', 'email', 'specialties__name']
     ordering_fields = ['employee_number', 'full_name', 'customer_rating', 'punctuality_rate', 'completion_rate']
     ordering = ['employee_number']
     
+    # Rows per INSERT when storing ingested GPS fixes
+    location_ingest_chunk_size = 500
+    
+    # Roles allowed to post any technician's GPS fixes, besides staff
+    location_ingest_roles = ['admin', 'manager']
+    
     def get_serializer_class(self):
         if self.action == 'list':
             return TechnicianListSerializer
@@ -87,6 +117,11 @@ class TechnicianViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         
+        # Roster listings serialize check-ins, assignment counts and specialties
+        # for every row, so fetch them up front instead of once per technician
+        if self.action in ['list', 'available']:
+            queryset = queryset.with_roster_data()
+        
         # Filter by specialty if provided
         specialty = self.request.query_params.get('specialty', None)
         if specialty:
@@ -101,6 +136,18 @@ class TechnicianViewSet(viewsets.ModelViewSet):
             except (ValueError, TypeError):
                 pass
                 
+        # Filter by held certifications (comma-separated ids), valid on
+        # `certified_on` (today by default)
+        certification = self.request.query_params.get('certification', None)
+        if certification:
+            try:
+                certification_ids = [int(value) for value in certification.split(',')]
+                certified_on = self.request.query_params.get('certified_on', None)
+                certified_on = datetime.fromisoformat(certified_on).date() if certified_on else None
+                queryset = queryset.certified_for(certification_ids, on_date=certified_on)
+            except (ValueError, TypeError):
+                pass
+        
         return queryset
     
     @action(detail=False, methods=['get'])
@@ -110,6 +157,59 @@ class TechnicianViewSet(viewsets.ModelViewSet):
         serializer = TechnicianListSerializer(technicians, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def nearest(self, request):
+        """Get the technicians closest to a point, by last known position."""
+        try:
+            latitude = float(request.query_params['latitude'])
+            longitude = float(request.query_params['longitude'])
+        except (KeyError, ValueError, TypeError):
+            latitude = longitude = math.nan
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return Response(
+                {"error": "latitude and longitude are required, between -90 and 90 and -180 and 180"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 100)
+            radius_km = float(request.query_params.get('radius_km', 50))
+        except (ValueError, TypeError):
+            return Response(
+                {"error": "limit and radius_km must be numbers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if limit < 1 or not (math.isfinite(radius_km) and radius_km > 0):
+            return Response(
+                {"error": "limit must be positive and radius_km a positive number"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        positions = TechnicianLastLocation.objects.filter(
+            technician__availability_status=request.query_params.get('availability_status', 'available')
+        )
+        specialty = request.query_params.get('specialty')
+        if specialty:
+            positions = positions.filter(technician__specialties__name__icontains=specialty).distinct()
+        
+        results = nearest_positions(positions, latitude, longitude, limit=limit, max_radius_km=radius_km)
+        
+        technicians = Technician.objects.filter(
+            id__in=[position.technician_id for _, position in results]
+        ).with_roster_data().in_bulk()
+        
+        data = [
+            {
+                'technician': TechnicianListSerializer(technicians[position.technician_id]).data,
+                'distance_km': round(distance, 3),
+                'latitude': position.latitude,
+                'longitude': position.longitude,
+                'timestamp': position.timestamp,
+            }
+            for distance, position in results
+        ]
+        return Response(data)
+    
     @action(detail=True, methods=['get'])
     def assignments(self, request, pk=None):
         """Get all work orders assigned to a technician."""
@@ -130,66 +230,240 @@ class TechnicianViewSet(viewsets.ModelViewSet):
         start_date_str = request.query_params.get('start_date')
         end_date_str = request.query_params.get('end_date')
         
-        locations = technician.locations.all()
+        start_date = end_date = None
         
         if start_date_str:
             try:
                 start_date = datetime.fromisoformat(start_date_str)
-                locations = locations.filter(timestamp__gte=start_date)
             except (ValueError, TypeError):
                 return Response(
                     {"error": "Invalid start_date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            if timezone.is_naive(start_date):
+                start_date = timezone.make_aware(start_date)
         
         if end_date_str:
             try:
                 end_date = datetime.fromisoformat(end_date_str)
-                locations = locations.filter(timestamp__lte=end_date)
             except (ValueError, TypeError):
                 return Response(
                     {"error": "Invalid end_date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            if timezone.is_naive(end_date):
+                end_date = timezone.make_aware(end_date)
         
-        serializer = TechnicianLocationSerializer(locations, many=True)
-        return Response(serializer.data)
+        # Optional downsampling (one fix per `bucket` seconds) and
+        # Douglas-Peucker simplification (tolerance of `simplify` meters)
+        try:
+            bucket = int(request.query_params['bucket']) if 'bucket' in request.query_params else None
+            simplify = float(request.query_params['simplify']) if 'simplify' in request.query_params else None
+        except (ValueError, TypeError):
+            return Response(
+                {"error": "bucket must be a number of seconds and simplify a number of meters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (bucket is not None and bucket <= 0) or (simplify is not None and simplify <= 0):
+            return Response(
+                {"error": "bucket and simplify must be positive"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # History is read from both raw fixes and compacted daily tracks
+        if bucket or simplify:
+            points = list(iter_track(technician, start_date, end_date, newest_first=False))
+            if bucket:
+                points = bucket_points(points, bucket)
+            if simplify:
+                points = simplify_points(points, simplify)
+            # Keep the newest-first order of the unfiltered history
+            points = reversed(points)
+        else:
+            points = iter_track(technician, start_date, end_date)
+        
+        # Stream the JSON array so long histories are never built in memory
+        return StreamingHttpResponse(
+            stream_json(points, TechnicianLocationSerializer),
+            content_type='application/json'
+        )
+    
+    @action(detail=False, methods=['post'], url_path='ingest-locations')
+    def ingest_locations(self, request):
+        """
+        Store batches of GPS fixes posted by devices.
+        
+        Each batch holds the fixes of one technician. Fixes that are invalid,
+        repeat a (technician, timestamp) pair or are not newer than the last
+        stored fix are rejected; the rest are written with bulk inserts. The
+        response reports, per batch, which fixes were rejected so that devices
+        only resend those. Technicians may only post their own fixes; other
+        accounts than staff, admins and managers have every fix rejected.
+        """
+        batches = request.data.get('batches') if isinstance(request.data, dict) else request.data
+        if not isinstance(batches, list):
+            return Response(
+                {"error": "batches must be a list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        batch_serializer = LocationBatchSerializer(data=batches, many=True)
+        if not batch_serializer.is_valid():
+            return Response(batch_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        batches = batch_serializer.validated_data
+        
+        technician_ids = {batch['technician_id'] for batch in batches}
+        technicians = self.get_queryset().filter(id__in=technician_ids)
+        # Admins and managers may post any technician's fixes, technicians
+        # only their own and other accounts none
+        user = request.user
+        if not (user.is_staff or getattr(user, 'role', None) in self.location_ingest_roles):
+            own_id = user.technician_profile.id if hasattr(user, 'technician_profile') else None
+            technicians = technicians.filter(id=own_id)
+        
+        with transaction.atomic():
+            # Concurrent posts for the same technicians wait for each other, so
+            # the stale and duplicate checks below see every stored fix and the
+            # accepted counts are exact
+            allowed_ids = set(
+                technicians.select_for_update().order_by('id').values_list('id', flat=True)
+            )
+            latest_timestamps = dict(
+                TechnicianLastLocation.objects.filter(
+                    technician_id__in=allowed_ids
+                ).values_list('technician_id', 'timestamp')
+            )
+            
+            seen = set()
+            new_locations = []
+            results = []
+            for batch in batches:
+                technician_id = batch['technician_id']
+                result = {
+                    'batch_id': batch.get('batch_id'),
+                    'technician_id': technician_id,
+                    'received': len(batch['fixes']),
+                    'accepted': 0,
+                    'rejected': [],
+                }
+                results.append(result)
+                
+                if technician_id not in allowed_ids:
+                    result['rejected'] = [
+                        {'index': index, 'reason': 'unknown_technician'}
+                        for index in range(len(batch['fixes']))
+                    ]
+                    continue
+                
+                latest = latest_timestamps.get(technician_id)
+                for index, fix in enumerate(batch['fixes']):
+                    fix_serializer = LocationFixSerializer(data=fix)
+                    if not fix_serializer.is_valid():
+                        result['rejected'].append({'index': index, 'reason': 'invalid', 'errors': fix_serializer.errors})
+                        continue
+                    
+                    data = fix_serializer.validated_data
+                    key = (technician_id, data['timestamp'])
+                    if key in seen:
+                        result['rejected'].append({'index': index, 'reason': 'duplicate'})
+                        continue
+                    if latest is not None and data['timestamp'] <= latest:
+                        result['rejected'].append({'index': index, 'reason': 'stale'})
+                        continue
+                    
+                    seen.add(key)
+                    new_locations.append(TechnicianLocation(
+                        technician_id=technician_id,
+                        latitude=round(data['latitude'], 6),
+                        longitude=round(data['longitude'], 6),
+                        accuracy=data.get('accuracy'),
+                        altitude=data.get('altitude'),
+                        timestamp=data['timestamp'],
+                        location_source='gps'
+                    ))
+                    result['accepted'] += 1
+            
+            # bulk_create skips post_save, so refresh the last known positions
+            # here. The unique constraint still guards against writers that do
+            # not take the lock
+            created = TechnicianLocation.objects.bulk_create(
+                new_locations,
+                batch_size=self.location_ingest_chunk_size,
+                ignore_conflicts=True
+            )
+            TechnicianLastLocation.record_many(created)
+        
+        return Response({
+            'accepted': sum(result['accepted'] for result in results),
+            'rejected': sum(len(result['rejected']) for result in results),
+            'batches': results,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
     
     @action(detail=True, methods=['post'])
     def check_in(self, request, pk=None):
-        """Check in a technician."""
+        """
+        Check in a technician.
+        
+        Requests carrying an idempotency key (the Idempotency-Key header or
+        the idempotency_key field) are applied once; replays return the
+        original check-in. A technician can only have one open check-in.
+        """
         technician = self.get_object()
         serializer = CheckInRequestSerializer(data=request.data)
         
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create location record
-        location = TechnicianLocation.objects.create(
-            technician=technician,
-            latitude=serializer.validated_data['latitude'],
-            longitude=serializer.validated_data['longitude'],
-            accuracy=serializer.validated_data.get('accuracy'),
-            altitude=serializer.validated_data.get('altitude'),
-            timestamp=timezone.now(),
-            location_source='check_in'
-        )
+        key = self._idempotency_key(request, serializer)
+        check_ins = TechnicianCheckIn.objects.select_related('check_in_location', 'check_out_location')
+        if key:
+            replay = check_ins.filter(technician=technician, check_in_key=key).first()
+            if replay:
+                return Response(TechnicianCheckInSerializer(replay).data)
         
-        # Create check-in record
-        check_in = TechnicianCheckIn.objects.create(
-            technician=technician,
-            check_in_time=timezone.now(),
-            check_in_location=location,
-            site_name=serializer.validated_data.get('site_name', ''),
-            notes=serializer.validated_data.get('notes', ''),
-            status='checked_in'
-        )
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                # Create location record
+                location = TechnicianLocation.objects.create(
+                    technician=technician,
+                    latitude=serializer.validated_data['latitude'],
+                    longitude=serializer.validated_data['longitude'],
+                    accuracy=serializer.validated_data.get('accuracy'),
+                    altitude=serializer.validated_data.get('altitude'),
+                    timestamp=now,
+                    location_source='check_in'
+                )
+                
+                # Create check-in record
+                check_in = TechnicianCheckIn.objects.create(
+                    technician=technician,
+                    check_in_time=now,
+                    check_in_location=location,
+                    site_name=serializer.validated_data.get('site_name', ''),
+                    notes=serializer.validated_data.get('notes', ''),
+                    status='checked_in',
+                    check_in_key=key
+                )
+        except IntegrityError:
+            # Lost a race against a concurrent replay, or already checked in
+            replay = check_ins.filter(technician=technician, check_in_key=key).first() if key else None
+            if replay:
+                return Response(TechnicianCheckInSerializer(replay).data)
+            open_check_in = check_ins.filter(technician=technician, check_out_time__isnull=True).first()
+            return Response(
+                {
+                    "error": "Technician is already checked in",
+                    "check_in": TechnicianCheckInSerializer(open_check_in).data if open_check_in else None
+                },
+                status=status.HTTP_409_CONFLICT
+            )
         
         # Send WhatsApp notification if requested
         if serializer.validated_data.get('send_whatsapp_notification', False) and technician.whatsapp_number:
             self._send_whatsapp_notification(
                 technician,
-                f"Check-in registered for {technician.full_name} at {check_in.check_in_time.strftime('%H:%M')}."
+                f"Check-in registered for {technician.full_name} at {timezone.localtime(now).strftime('%H:%M')}."
             )
         
         result_serializer = TechnicianCheckInSerializer(check_in)
@@ -197,62 +471,118 @@ class TechnicianViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def check_out(self, request, pk=None):
-        """Check out a technician."""
+        """
+        Check out a technician.
+        
+        Like check-in, replays of a request with the same idempotency key
+        return the original check-out; a key already used to check out of
+        another check-in is refused.
+        """
         technician = self.get_object()
         serializer = CheckOutRequestSerializer(data=request.data)
         
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get the check-in record
-        try:
-            check_in = TechnicianCheckIn.objects.get(
-                id=serializer.validated_data['check_in_id'],
-                technician=technician
-            )
-        except TechnicianCheckIn.DoesNotExist:
-            return Response(
-                {"error": "Check-in record not found"}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        # Check if already checked out
-        if check_in.check_out_time is not None:
-            return Response(
-                {"error": "Technician has already checked out from this check-in"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Create location record if coordinates provided
-        check_out_location = None
-        if 'latitude' in serializer.validated_data and 'longitude' in serializer.validated_data:
-            check_out_location = TechnicianLocation.objects.create(
-                technician=technician,
-                latitude=serializer.validated_data['latitude'],
-                longitude=serializer.validated_data['longitude'],
-                accuracy=serializer.validated_data.get('accuracy'),
-                altitude=serializer.validated_data.get('altitude'),
-                timestamp=timezone.now(),
-                location_source='check_out'
-            )
+        key = self._idempotency_key(request, serializer)
+        check_in_id = serializer.validated_data['check_in_id']
+        replay_response = self._check_out_replay(technician, key, check_in_id)
+        if replay_response is not None:
+            return replay_response
         
-        # Update check-in record
-        check_in.check_out_time = timezone.now()
-        check_in.check_out_location = check_out_location
-        check_in.notes = (check_in.notes or '') + '\n\n' + (serializer.validated_data.get('notes', '') or '')
-        check_in.status = 'checked_out'
-        check_in.save()
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                # Get and lock the check-in record
+                try:
+                    check_in = TechnicianCheckIn.objects.select_related(
+                        'check_in_location', 'check_out_location'
+                    ).select_for_update(of=('self',)).get(
+                        id=check_in_id,
+                        technician=technician
+                    )
+                except TechnicianCheckIn.DoesNotExist:
+                    return Response(
+                        {"error": "Check-in record not found"}, 
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+        
+                # Check if already checked out
+                if check_in.check_out_time is not None:
+                    if key and check_in.check_out_key == key:
+                        return Response(TechnicianCheckInSerializer(check_in).data)
+                    return Response(
+                        {"error": "Technician has already checked out from this check-in"}, 
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+        
+                # Create location record if coordinates provided
+                check_out_location = None
+                if 'latitude' in serializer.validated_data and 'longitude' in serializer.validated_data:
+                    check_out_location = TechnicianLocation.objects.create(
+                        technician=technician,
+                        latitude=serializer.validated_data['latitude'],
+                        longitude=serializer.validated_data['longitude'],
+                        accuracy=serializer.validated_data.get('accuracy'),
+                        altitude=serializer.validated_data.get('altitude'),
+                        timestamp=now,
+                        location_source='check_out'
+                    )
+        
+                # Update check-in record
+                check_in.check_out_time = now
+                check_in.check_out_location = check_out_location
+                check_in.notes = (check_in.notes or '') + '\n\n' + (serializer.validated_data.get('notes', '') or '')
+                check_in.status = 'checked_out'
+                check_in.check_out_key = key
+                check_in.save(update_fields=[
+                    'check_out_time', 'check_out_location', 'notes', 'status', 'check_out_key'
+                ])
+        except IntegrityError:
+            # Lost a race against a concurrent request with the same key
+            replay_response = self._check_out_replay(technician, key, check_in_id)
+            if replay_response is None:
+                raise
+            return replay_response
         
         # Send WhatsApp notification if requested
         if serializer.validated_data.get('send_whatsapp_notification', False) and technician.whatsapp_number:
             self._send_whatsapp_notification(
                 technician,
-                f"Check-out registered for {technician.full_name} at {check_in.check_out_time.strftime('%H:%M')}."
+                f"Check-out registered for {technician.full_name} at {timezone.localtime(now).strftime('%H:%M')}."
             )
         
         result_serializer = TechnicianCheckInSerializer(check_in)
         return Response(result_serializer.data)
     
+    def _check_out_replay(self, technician, key, check_in_id):
+        """
+        Return the response to a check-out whose idempotency key was already
+        used: the original check-out when it is a replay, a 409 when the key
+        checked out of another check-in. None when the key is unused.
+        """
+        if not key:
+            return None
+        previous = TechnicianCheckIn.objects.select_related(
+            'check_in_location', 'check_out_location'
+        ).filter(technician=technician, check_out_key=key).first()
+        if previous is None:
+            return None
+        if previous.pk == check_in_id:
+            return Response(TechnicianCheckInSerializer(previous).data)
+        return Response(
+            {
+                "error": "Idempotency key already used to check out of another check-in",
+                "check_in": TechnicianCheckInSerializer(previous).data
+            },
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    def _idempotency_key(self, request, serializer):
+        """Return the request's idempotency key, or None if it has none."""
+        key = request.headers.get('Idempotency-Key') or serializer.validated_data.get('idempotency_key')
+        return key[:100] if key else None
+    
     @action(detail=True, methods=['post'])
     def assign_task(self, request, pk=None):
         """Assign a task to a technician."""
@@ -380,6 +710,211 @@ class TechnicianViewSet(viewsets.ModelViewSet):
         
         return Response(availability_data)
     
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Type-ahead search over technicians and their specialties, tolerant of
+        typos and romanization variants. Results are ranked best first.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {"error": "q is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except (ValueError, TypeError):
+            limit = 10
+        
+        results = search_technicians(query, self.get_queryset(), limit=limit)
+        technicians = Technician.objects.only(
+            'id', 'employee_number', 'full_name', 'nickname', 'availability_status'
+        ).in_bulk([technician_id for _, technician_id in results])
+        
+        return Response([
+            {
+                'id': technician_id,
+                'employee_number': technicians[technician_id].employee_number,
+                'full_name': technicians[technician_id].full_name,
+                'nickname': technicians[technician_id].nickname,
+                'availability_status': technicians[technician_id].availability_status,
+                'score': round(score, 3),
+            }
+            for score, technician_id in results
+            if technician_id in technicians
+        ])
+    
+    @action(detail=True, methods=['get'])
+    def route(self, request, pk=None):
+        """
+        Plan the technician's route for a date (today by default): the order
+        of their assigned work orders with ETAs, honoring time windows.
+        """
+        from apps.work_orders.routing import plan_day
+        
+        technician = self.get_object()
+        date_str = request.query_params.get('date')
+        
+        if date_str:
+            try:
+                target_date = datetime.fromisoformat(date_str).date()
+            except (ValueError, TypeError):
+                return Response(
+                    {"error": "Invalid date format. Use ISO format (YYYY-MM-DD)"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            target_date = timezone.localdate()
+        
+        route = plan_day(technician.id, target_date)
+        route['technician_id'] = technician.id
+        route['date'] = target_date.isoformat()
+        return Response(route)
+    
+    @action(detail=False, methods=['post'], url_path='rebalance-routes')
+    def rebalance_routes(self, request):
+        """
+        Rebalance a team's work orders for a date between its technicians to
+        minimize total travel time. With `apply`, the moves are saved.
+        
+        Moves that would double-book their new technician are reported under
+        `conflicts`, and refused on apply unless `allow_conflicts` is set.
+        """
+        from apps.work_orders.conflicts import check_assignments
+        from apps.work_orders.models import WorkOrder, WorkOrderAssignment
+        from apps.work_orders.routing import rebalance_team
+        
+        technician_ids = request.data.get('technician_ids')
+        if not isinstance(technician_ids, list) or len(technician_ids) < 2:
+            return Response(
+                {"error": "technician_ids must be a list of at least two technicians"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            technician_ids = [int(technician_id) for technician_id in technician_ids]
+        except (ValueError, TypeError):
+            return Response(
+                {"error": "technician_ids must be a list of integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            target_date = datetime.fromisoformat(request.data.get('date', timezone.localdate().isoformat())).date()
+        except (ValueError, TypeError):
+            return Response(
+                {"error": "Invalid date format. Use ISO format (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        technician_ids = list(Technician.objects.filter(pk__in=technician_ids).values_list('pk', flat=True))
+        result = rebalance_team(technician_ids, target_date)
+        
+        # A work order may move more than once, only where it ends up counts
+        holders = {}
+        for move in result['moves']:
+            original = holders.get(move['work_order_id'], (move['from_technician_id'],))[0]
+            holders[move['work_order_id']] = (original, move['to_technician_id'])
+        moved = {
+            work_order_id: (original, final)
+            for work_order_id, (original, final) in holders.items() if original != final
+        }
+        work_orders = WorkOrder.objects.in_bulk(list(moved))
+        result['conflicts'] = check_assignments(
+            [(final, work_orders[work_order_id]) for work_order_id, (_original, final) in moved.items()],
+            released=[(original, work_order_id) for work_order_id, (original, _final) in moved.items()]
+        )
+        
+        if request.data.get('apply'):
+            if result['conflicts'] and not request.data.get('allow_conflicts'):
+                return Response(
+                    {
+                        "error": "The moves would double-book technicians",
+                        "conflicts": result['conflicts'],
+                        "moves": result['moves'],
+                    },
+                    status=status.HTTP_409_CONFLICT
+                )
+            with transaction.atomic():
+                for move in result['moves']:
+                    assignment = WorkOrderAssignment.objects.select_for_update().filter(
+                        work_order_id=move['work_order_id'],
+                        technician_id=move['from_technician_id']
+                    ).first()
+                    taken = WorkOrderAssignment.objects.filter(
+                        work_order_id=move['work_order_id'],
+                        technician_id=move['to_technician_id']
+                    ).exists()
+                    if assignment is None or taken:
+                        # The assignments changed since the plan was made
+                        transaction.set_rollback(True)
+                        return Response(
+                            {
+                                "error": f"Work order {move['work_order_id']} can no longer be moved "
+                                         f"from technician {move['from_technician_id']} to "
+                                         f"technician {move['to_technician_id']}",
+                                "moves": result['moves'],
+                            },
+                            status=status.HTTP_409_CONFLICT
+                        )
+                    assignment.technician_id = move['to_technician_id']
+                    assignment.save()
+        
+        result['date'] = target_date.isoformat()
+        return Response(result)
+    
+    @action(detail=False, methods=['get'])
+    def availability_matrix(self, request):
+        """
+        Get a technicians x time slots occupancy matrix for a date range
+        (7 days from today by default), optionally filtered by specialty.
+        """
+        max_days = 31
+        
+        try:
+            start_date = datetime.fromisoformat(
+                request.query_params.get('start_date', timezone.localdate().isoformat())
+            ).date()
+            end_date = datetime.fromisoformat(
+                request.query_params.get('end_date', (start_date + timedelta(days=6)).isoformat())
+            ).date()
+        except (ValueError, TypeError):
+            return Response(
+                {"error": "Invalid date format. Use ISO format (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if end_date < start_date or (end_date - start_date).days >= max_days:
+            return Response(
+                {"error": f"end_date must be on or after start_date, within {max_days} days"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            slot_minutes = int(request.query_params.get('slot_minutes', 60))
+        except (ValueError, TypeError):
+            slot_minutes = 0
+        if slot_minutes < 15 or 1440 % slot_minutes:
+            return Response(
+                {"error": "slot_minutes must be at least 15 and divide a day evenly"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        technicians = Technician.objects.order_by('full_name')
+        specialty = request.query_params.get('specialty')
+        if specialty:
+            technicians = technicians.filter(specialties__name__icontains=specialty).distinct()
+        
+        matrix = availability_matrix(technicians, start_date, end_date, slot_minutes)
+        matrix['legend'] = {
+            FREE: 'free',
+            SCHEDULED: 'scheduled work',
+            CHECKED_IN: 'checked in on site',
+            LEAVE: 'on leave or inactive',
+        }
+        return Response(matrix)
+    
     @action(detail=True, methods=['get'])
     def performance(self, request, pk=None):
         """Get performance metrics for a technician."""
@@ -433,33 +968,20 @@ class TechnicianViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        # Get relevant data for calculations
-        from apps.work_orders.models import WorkOrderTask
+        # Sum the pre-aggregated daily rows for the period
+        totals = TechnicianDailyMetrics.summarize(technician, start_date, end_date)
         
         # Punctuality metrics
-        assignments = WorkOrderTask.objects.filter(
-            assigned_technician=technician,
-            scheduled_date__gte=start_date,
-            scheduled_date__lte=end_date,
-            status__in=['completed', 'in_progress', 'assigned']
-        )
-        
-        total_assignments = assignments.count()
-        on_time_arrivals = assignments.filter(actual_start_time__lte=F('scheduled_start_time')).count()
+        total_assignments = totals['total_assignments']
+        on_time_arrivals = totals['on_time_arrivals']
         
         # Task completion metrics
-        completed_tasks = assignments.filter(status='completed').count()
+        completed_tasks = totals['completed_tasks']
         incomplete_tasks = total_assignments - completed_tasks
         
         # Customer satisfaction
-        ratings = TechnicianRating.objects.filter(
-            technician=technician,
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        
-        feedback_count = ratings.count()
-        avg_rating = ratings.aggregate(Avg('rating'))['rating__avg']
+        feedback_count = totals['rating_count']
+        avg_rating = totals['rating_sum'] / feedback_count if feedback_count else None
         
         # Calculate rates
         punctuality_rate = (on_time_arrivals / total_assignments * 100) if total_assignments > 0 else 0
@@ -469,14 +991,8 @@ class TechnicianViewSet(viewsets.ModelViewSet):
         days_in_period = (end_date - start_date).days + 1
         avg_tasks_per_day = total_assignments / days_in_period if days_in_period > 0 else 0
         
-        # Calculate specialty utilization
-        specialty_counts = {}
-        for assignment in assignments:
-            for task_type in assignment.work_order.work_types.all():
-                if task_type.name in specialty_counts:
-                    specialty_counts[task_type.name] += 1
-                else:
-                    specialty_counts[task_type.name] = 1
+        # Specialty utilization, by work order type
+        specialty_counts = totals['work_type_counts']
         
         # Prepare metrics data
         metrics_data = {
@@ -533,6 +1049,41 @@ class TechnicianViewSet(viewsets.ModelViewSet):
         rating_serializer = TechnicianRatingSerializer(rating)
         return Response(rating_serializer.data, status=status.HTTP_201_CREATED)
     
+    @action(detail=False, methods=['post'], url_path='import-ratings')
+    def import_ratings(self, request):
+        """Import many ratings at once, e.g. from post-job surveys."""
+        serializer = TechnicianRatingImportSerializer(data=request.data, many=True)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        technician_ids = {row['technician_id'] for row in serializer.validated_data}
+        existing_ids = set(Technician.objects.filter(id__in=technician_ids).values_list('id', flat=True))
+        missing_ids = technician_ids - existing_ids
+        if missing_ids:
+            return Response(
+                {"error": f"Technicians not found: {sorted(missing_ids)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        from apps.work_orders.models import WorkOrder
+        work_order_ids = {row.get('work_order') for row in serializer.validated_data} - {None}
+        existing_work_order_ids = set(
+            WorkOrder.objects.filter(id__in=work_order_ids).values_list('id', flat=True)
+        )
+        
+        ratings = TechnicianRating.bulk_import([
+            TechnicianRating(
+                technician_id=row['technician_id'],
+                rating=row['rating'],
+                feedback=row.get('feedback', ''),
+                work_order_id=row.get('work_order') if row.get('work_order') in existing_work_order_ids else None
+            )
+            for row in serializer.validated_data
+        ])
+        
+        return Response({'imported': len(ratings)}, status=status.HTTP_201_CREATED)
+    
     @action(detail=False, methods=['get'])
     def team_performance(self, request):
         """Get team performance metrics."""
@@ -584,47 +1135,91 @@ class TechnicianViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        # Get active technicians
-        active_technicians = Technician.objects.filter(
+        cache_key = team_performance_key(period_type, start_date, end_date)
+        metrics_data = cache.get(cache_key)
+        if metrics_data is None:
+            metrics_data = self._team_performance_metrics(start_date, end_date)
+            cache.set(cache_key, metrics_data, TEAM_PERFORMANCE_TIMEOUT)
+        
+        serializer = TeamPerformanceMetricsSerializer(metrics_data)
+        return Response(serializer.data)
+    
+    def _team_performance_metrics(self, start_date, end_date):
+        """
+        Compute team performance for a period.
+        
+        Technician averages and the period's assignment total (summed from
+        the daily metrics rows) come from a single aggregate query.
+        """
+        from django.db.models import OuterRef, Subquery, Sum
+        
+        period_tasks = TechnicianDailyMetrics.objects.filter(
+            technician=OuterRef('pk'),
+            date__gte=start_date,
+            date__lte=end_date
+        ).order_by().values('technician').annotate(
+            total=Sum('total_assignments')
+        ).values('total')
+        
+        # Get active technicians and their averages in one pass
+        totals = Technician.objects.filter(
             availability_status__in=['available', 'on_assignment']
+        ).annotate(
+            period_tasks=Subquery(period_tasks)
+        ).aggregate(
+            total_technicians=Count('id'),
+            avg_punctuality=Avg('punctuality_rate'),
+            avg_completion=Avg('completion_rate'),
+            avg_customer_satisfaction=Avg('customer_rating'),
+            total_tasks=Sum('period_tasks')
         )
         
-        total_technicians = active_technicians.count()
+        total_technicians = totals['total_technicians']
+        avg_completion = totals['avg_completion'] or 0
         
-        # Calculate team averages
-        avg_punctuality = active_technicians.aggregate(Avg('punctuality_rate'))['punctuality_rate__avg'] or 0
-        avg_completion = active_technicians.aggregate(Avg('completion_rate'))['completion_rate__avg'] or 0
-        avg_customer_satisfaction = active_technicians.filter(
-            customer_rating__isnull=False
-        ).aggregate(Avg('customer_rating'))['customer_rating__avg'] or 0
+        # Average assignments per technician per day over the period
+        days_in_period = (end_date - start_date).days + 1
+        technician_days = total_technicians * days_in_period
+        avg_tasks_per_day = (totals['total_tasks'] or 0) / technician_days if technician_days > 0 else 0
         
         # Get top specialties
-        from django.db.models import Count
         top_specialties = Specialty.objects.annotate(
             technician_count=Count('technicians')
         ).order_by('-technician_count')[:5].values_list('name', flat=True)
         
         # Prepare metrics data
-        metrics_data = {
+        return {
             'total_technicians': total_technicians,
-            'avg_punctuality_rate': avg_punctuality,
+            'avg_punctuality_rate': totals['avg_punctuality'] or 0,
             'avg_completion_rate': avg_completion,
             'avg_task_completion_rate': avg_completion,  # Same as completion rate in this context
-            'avg_customer_satisfaction': avg_customer_satisfaction,
-            'avg_tasks_per_day': 4.2,  # Placeholder, would require additional calculation
+            'avg_customer_satisfaction': totals['avg_customer_satisfaction'] or 0,
+            'avg_tasks_per_day': avg_tasks_per_day,
             'top_specialties': list(top_specialties),
             'period_start': datetime.combine(start_date, datetime.min.time()).isoformat(),
             'period_end': datetime.combine(end_date, datetime.max.time()).isoformat()
         }
         
-        serializer = TeamPerformanceMetricsSerializer(metrics_data)
-        return Response(serializer.data)
-    
     def _send_whatsapp_notification(self, technician, message):
-        """Helper method to send WhatsApp notification."""
-        # This would integrate with WhatsApp API
-        # For now, just log the message
-        print(f"WhatsApp notification would be sent to {technician.whatsapp_number}: {message}")
+        """
+        Helper method to send WhatsApp notification.
+    
+        The message is sent by a background task, queued once the current
+        transaction commits. Queueing still happens within the request, so it
+        is not retried and a broker failure is logged rather than failing the
+        already saved check-in or check-out.
+        """
+        from .tasks import send_whatsapp_notification
+        
+        whatsapp_number = str(technician.whatsapp_number)
+        
+        def queue():
+            try:
+                send_whatsapp_notification.apply_async((whatsapp_number, message), retry=False)
+            except Exception:
+                logger.exception("Could not queue the WhatsApp notification to %s", whatsapp_number)
+        
+        transaction.on_commit(queue)
         return True
 
 
@@ -683,7 +1278,8 @@ class TechnicianCostMetricsViewSet(viewsets.ModelViewSet):
         - Admin and managers can perform all actions
         - Regular users and technicians can only view their own data or listing
         """
-        if self.action in ['create', 'update', 'partial_update', 'destroy', 'record_metrics']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'record_metrics',
+                           'record_metrics_bulk', 'recompute_kpis']:
             permission_classes = [IsAdmin | IsManager]
         else:
             permission_classes = [IsAuthenticated]
@@ -807,11 +1403,115 @@ class TechnicianCostMetricsViewSet(viewsets.ModelViewSet):
             }
         )
         
-        # Calculate KPIs
-        metrics.calculate_kpis()
-        
+        # KPIs are calculated as part of the save
         serializer = self.get_serializer(metrics)
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['post'])
+    def record_metrics_bulk(self, request):
+        """
+        Record cost metrics for many technicians and periods at once.
+        
+        Accepts a JSON array of rows (or {"metrics": [...]}), or an uploaded
+        CSV file with the same columns. Valid rows are created or updated in
+        a single transaction; invalid rows are reported by index without
+        aborting the batch.
+        """
+        if 'file' in request.FILES:
+            try:
+                rows = list(csv.DictReader(io.TextIOWrapper(request.FILES['file'], encoding='utf-8-sig')))
+            except (UnicodeDecodeError, csv.Error):
+                return Response(
+                    {"error": "Invalid CSV file"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            rows = request.data.get('metrics')
+        
+        if not isinstance(rows, list):
+            return Response(
+                {"error": "Expected a list of metrics or a CSV file"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        errors = []
+        valid_rows = []
+        for index, row in enumerate(rows):
+            serializer = CostMetricsRecordSerializer(data=row)
+            if serializer.is_valid():
+                valid_rows.append((index, serializer.validated_data))
+            else:
+                errors.append({'row': index, 'errors': serializer.errors})
+        
+        # Resolve all technicians in a single query
+        technicians = Technician.objects.only('id', 'customer_rating', 'completion_rate').in_bulk(
+            {data['technician_id'] for _, data in valid_rows}
+        )
+        
+        metrics = []
+        seen = {}
+        for index, data in valid_rows:
+            technician = technicians.get(data['technician_id'])
+            if technician is None:
+                errors.append({'row': index, 'errors': {'technician_id': ["Technician not found"]}})
+                continue
+            key = (technician.id, data['period_start'], data['period_end'])
+            if key in seen:
+                errors.append({'row': index, 'errors': {'non_field_errors': [f"Duplicate of row {seen[key]}"]}})
+                continue
+            seen[key] = index
+            metrics.append(TechnicianCostMetrics(
+                technician=technician,
+                period_start=data['period_start'],
+                period_end=data['period_end'],
+                total_hours_worked=data['total_hours_worked'],
+                total_tasks_completed=data['total_tasks_completed'],
+                total_cost=data['total_cost'],
+                notes=data['notes']
+            ))
+        
+        created, updated = TechnicianCostMetrics.bulk_record(metrics)
+        errors.sort(key=lambda error: error['row'])
+        
+        return Response(
+            {'created': created, 'updated': updated, 'errors': errors},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+    
+    @action(detail=False, methods=['post'])
+    def recompute_kpis(self, request):
+        """
+        Recompute the derived KPIs of stored cost metrics, optionally limited
+        to a technician and to periods starting on or after period_start.
+        """
+        metrics = TechnicianCostMetrics.objects.all()
+        
+        technician_id = request.data.get('technician_id')
+        if technician_id:
+            try:
+                technician_id = int(str(technician_id))
+            except (ValueError, TypeError):
+                return Response(
+                    {"error": "technician_id must be an integer"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            metrics = metrics.filter(technician_id=technician_id)
+        
+        period_start = request.data.get('period_start')
+        if period_start:
+            try:
+                start_date = datetime.fromisoformat(period_start).date()
+            except (ValueError, TypeError):
+                return Response(
+                    {"error": "Invalid period_start format. Use ISO format (YYYY-MM-DD)"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            metrics = metrics.filter(period_start__gte=start_date)
+        
+        count = TechnicianCostMetrics.recompute_kpis(metrics)
+        return Response({'updated': count})
 
 
 class EmploymentTypeKpiReportViewSet(viewsets.ModelViewSet):
@@ -826,7 +1526,7 @@ class EmploymentTypeKpiReportViewSet(viewsets.ModelViewSet):
         - Only admin and managers can generate reports and modify data
         - Regular users can only view reports
         """
-        if self.action in ['create', 'update', 'partial_update', 'destroy', 'generate']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'generate', 'backfill']:
             permission_classes = [IsAdmin | IsManager]
         else:
             permission_classes = [IsAuthenticated]
@@ -839,7 +1539,30 @@ class EmploymentTypeKpiReportViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def generate(self, request):
-        """Generate KPI reports for all employment types."""
+        """
+        Queue the generation of KPI reports for all employment types.
+        Poll the returned job at jobs/<id>/ for its progress.
+        """
+        return self._queue_report_job(request, backfill=False)
+    
+    @action(detail=False, methods=['post'])
+    def backfill(self, request):
+        """
+        Queue the generation of KPI reports for every period of the given type
+        between period_start and period_end, spread across the workers.
+        """
+        return self._queue_report_job(request, backfill=True)
+    
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>\d+)')
+    def job_status(self, request, job_id=None):
+        """Get the status of a KPI report generation job."""
+        job = get_object_or_404(KpiReportJob, pk=job_id)
+        return Response(KpiReportJobSerializer(job).data)
+    
+    def _queue_report_job(self, request, backfill):
+        """Validate a generation request and queue it as a KpiReportJob."""
+        from .tasks import start_kpi_report_job
+        
         # Required fields
         required_fields = ['period_type', 'period_start', 'period_end']
         for field in required_fields:
@@ -866,15 +1589,27 @@ class EmploymentTypeKpiReportViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Generate reports
-        reports = EmploymentTypeKpiReport.generate_report(
-            period_type=period_type,
-            period_start=period_start,
-            period_end=period_end
-        )
+        if period_start > period_end:
+            return Response(
+                {"error": "period_start must not be after period_end"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        serializer = self.get_serializer(reports, many=True)
-        return Response(serializer.data)
+        with transaction.atomic():
+            job = KpiReportJob.objects.create(
+                period_type=period_type,
+                period_start=period_start,
+                period_end=period_end,
+                backfill=backfill,
+                requested_by=request.user
+            )
+            start_kpi_report_job(job)
+        
+        # The tasks are queued on commit, which may have failed the job
+        job.refresh_from_db()
+        if job.status == 'failed':
+            return Response(KpiReportJobSerializer(job).data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(KpiReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=False, methods=['get'])
     def compare(self, request):
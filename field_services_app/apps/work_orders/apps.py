@@ -0,0 +1,20 @@
+"""
+Application configuration for the work_orders app.
+"""
+
+from django.apps import AppConfig
+
+
+class WorkOrdersConfig(AppConfig):
+    """
+    Configuration for the work_orders app.
+    """
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.work_orders'
+    verbose_name = 'Work Order Management'
+    
+    def ready(self):
+        """
+        Import signal handlers when app is ready.
+        """
+        import apps.work_orders.signals  # noqa
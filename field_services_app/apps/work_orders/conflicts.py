@@ -0,0 +1,273 @@
+"""
+Detection of double-booked technicians.
+
+A ConflictIndex loads the assignments scheduled in a horizon with one query
+and keeps, per technician, their scheduled windows sorted by start with a
+running maximum of the ends. Checking a new window is then two binary
+searches plus a scan of the windows that actually reach into it, and
+scanning the whole horizon for overlaps is a sweep over each technician's
+sorted windows: O(n log n) for n assignments, plus the overlaps reported.
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from itertools import accumulate
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import WorkOrder, WorkOrderAssignment
+
+# Assignment statuses that hold a slot in the technician's schedule
+CONFLICT_ASSIGNMENT_STATUSES = ['pending', 'accepted', 'in_progress']
+
+# Window assumed for a work order with a start but no end or estimated duration
+DEFAULT_WINDOW_MINUTES = 60
+
+# How far back to look for work orders whose window is derived from their
+# start and estimated duration, when loading a horizon
+ESTIMATED_WINDOW_LOOKBACK = timedelta(days=7)
+
+# Days covered by the default conflict scan
+SCAN_DAYS = 30
+
+
+def scheduled_window(work_order):
+    """
+    Return the (start, end) window a work order books, or None when it is
+    not scheduled. The end defaults to the start plus the estimated duration.
+    """
+    start = work_order.scheduled_start
+    if start is None:
+        return None
+    end = work_order.scheduled_end
+    if end is None or end <= start:
+        end = start + timedelta(minutes=work_order.estimated_duration or DEFAULT_WINDOW_MINUTES)
+    return start, end
+
+
+class ScheduledWindow:
+    """One assignment's booked window."""
+    
+    def __init__(self, assignment_id, work_order_id, title, start, end):
+        self.assignment_id = assignment_id
+        self.work_order_id = work_order_id
+        self.title = title
+        self.start = start
+        self.end = end
+    
+    def as_dict(self):
+        return {
+            'assignment_id': self.assignment_id,
+            'work_order_id': self.work_order_id,
+            'title': self.title,
+            'start': self.start,
+            'end': self.end,
+        }
+
+
+class TechnicianIntervals:
+    """A technician's scheduled windows, sorted by start."""
+    
+    def __init__(self, windows):
+        self.windows = sorted(windows, key=lambda window: (window.start, window.end))
+        self.starts = [window.start for window in self.windows]
+        # Nondecreasing, so the first window that may still be running at a
+        # given time is found by binary search
+        self.max_ends = list(accumulate((window.end for window in self.windows), max))
+    
+    def overlapping(self, start, end):
+        """Return the windows overlapping [start, end), in start order."""
+        first = bisect_right(self.max_ends, start)
+        last = bisect_left(self.starts, end)
+        return [window for window in self.windows[first:last] if window.end > start]
+    
+    def overlaps(self):
+        """
+        Yield every pair of overlapping windows, sweeping the windows in start
+        order while keeping the ones still running in a heap keyed on their end.
+        """
+        running = []
+        for position, window in enumerate(self.windows):
+            while running and running[0][0] <= window.start:
+                heapq.heappop(running)
+            for _end, _position, other in running:
+                yield other, window
+            heapq.heappush(running, (window.end, position, window))
+
+
+class ConflictIndex:
+    """
+    Per-technician interval index of the active assignments whose windows
+    reach into [horizon_start, horizon_end).
+    """
+    
+    def __init__(self, horizon_start, horizon_end, technician_ids=None):
+        self.horizon_start = horizon_start
+        self.horizon_end = horizon_end
+        
+        assignments = WorkOrderAssignment.objects.filter(
+            status__in=CONFLICT_ASSIGNMENT_STATUSES,
+            work_order__status__in=WorkOrder.ACTIVE_STATUSES,
+            work_order__scheduled_start__lt=horizon_end,
+        ).filter(
+            Q(work_order__scheduled_end__gt=horizon_start) |
+            Q(
+                work_order__scheduled_end__isnull=True,
+                work_order__scheduled_start__gt=horizon_start - ESTIMATED_WINDOW_LOOKBACK
+            )
+        ).select_related('work_order', 'technician').only(
+            'technician_id', 'technician__full_name', 'work_order_id', 'work_order__title',
+            'work_order__scheduled_start', 'work_order__scheduled_end', 'work_order__estimated_duration'
+        )
+        if technician_ids is not None:
+            assignments = assignments.filter(technician_id__in=technician_ids)
+        
+        windows = {}
+        self.technician_names = {}
+        for assignment in assignments:
+            window = scheduled_window(assignment.work_order)
+            if window is None or window[1] <= horizon_start:
+                continue
+            windows.setdefault(assignment.technician_id, []).append(
+                ScheduledWindow(assignment.pk, assignment.work_order_id, assignment.work_order.title, *window)
+            )
+            self.technician_names[assignment.technician_id] = assignment.technician.full_name
+        self.technicians = {
+            technician_id: TechnicianIntervals(technician_windows)
+            for technician_id, technician_windows in windows.items()
+        }
+    
+    def conflicts(self, technician_id, start, end, exclude_work_order_id=None):
+        """Return the technician's windows overlapping [start, end)."""
+        intervals = self.technicians.get(technician_id)
+        if intervals is None:
+            return []
+        return [
+            window for window in intervals.overlapping(start, end)
+            if window.work_order_id != exclude_work_order_id
+        ]
+    
+    def scan(self):
+        """
+        Return every double booking in the horizon as a dict with the
+        technician, both assignments and the overlap in minutes, ordered by
+        the start of the overlap.
+        """
+        report = []
+        for technician_id, intervals in self.technicians.items():
+            for first, second in intervals.overlaps():
+                overlap_start = max(first.start, second.start)
+                overlap_end = min(first.end, second.end)
+                report.append({
+                    'technician_id': technician_id,
+                    'technician_name': self.technician_names[technician_id],
+                    'overlap_start': overlap_start,
+                    'overlap_minutes': round((overlap_end - overlap_start).total_seconds() / 60),
+                    'assignments': [first.as_dict(), second.as_dict()],
+                })
+        report.sort(key=lambda conflict: (conflict['overlap_start'], conflict['technician_id']))
+        return report
+
+
+def find_conflicts(technician_id, work_order):
+    """
+    Return the technician's other active assignments overlapping the work
+    order's scheduled window (none when the work order is not scheduled).
+    """
+    window = scheduled_window(work_order)
+    if window is None:
+        return []
+    index = ConflictIndex(window[0], window[1], technician_ids=[technician_id])
+    return index.conflicts(technician_id, *window, exclude_work_order_id=work_order.pk)
+
+
+def check_assignment(technician_id, work_order, status='pending'):
+    """
+    Return the double bookings assigning the technician to the work order
+    would cause, as dicts (see ScheduledWindow.as_dict). Assignments in a
+    status that holds no slot never conflict.
+    """
+    if status not in CONFLICT_ASSIGNMENT_STATUSES:
+        return []
+    return [window.as_dict() for window in find_conflicts(technician_id, work_order)]
+
+
+def check_assignments(assignments, released=()):
+    """
+    Check many new (technician_id, work_order) assignments at once, against
+    the technicians' active assignments and against each other, with one
+    query. Assignments in `released`, (technician_id, work_order_id) pairs
+    about to be given up, are not counted.
+    
+    Returns a {'technician_id', 'work_order_id', 'conflicts'} dict per
+    conflicting assignment.
+    """
+    windows = {}
+    for technician_id, work_order in assignments:
+        window = scheduled_window(work_order)
+        if window is not None:
+            windows.setdefault(technician_id, []).append(
+                ScheduledWindow(None, work_order.pk, work_order.title, *window)
+            )
+    if not windows:
+        return []
+    
+    released = set(released)
+    index = ConflictIndex(
+        min(window.start for technician_windows in windows.values() for window in technician_windows),
+        max(window.end for technician_windows in windows.values() for window in technician_windows),
+        technician_ids=list(windows)
+    )
+    report = []
+    for technician_id, technician_windows in windows.items():
+        for window in technician_windows:
+            conflicts = [
+                other for other in index.conflicts(
+                    technician_id, window.start, window.end, exclude_work_order_id=window.work_order_id
+                )
+                if (technician_id, other.work_order_id) not in released
+            ] + [
+                other for other in technician_windows
+                if other.work_order_id != window.work_order_id
+                and other.start < window.end and window.start < other.end
+            ]
+            if conflicts:
+                conflicts.sort(key=lambda other: (other.start, other.end))
+                report.append({
+                    'technician_id': technician_id,
+                    'work_order_id': window.work_order_id,
+                    'conflicts': [other.as_dict() for other in conflicts],
+                })
+    return report
+
+
+def check_schedule(work_order):
+    """
+    Check a work order's (possibly unsaved) schedule against the other
+    assignments of its active crew, see check_assignments.
+    """
+    if work_order.pk is None:
+        return []
+    crew = WorkOrderAssignment.objects.filter(
+        work_order_id=work_order.pk,
+        status__in=CONFLICT_ASSIGNMENT_STATUSES
+    ).values_list('technician_id', flat=True)
+    return check_assignments([(technician_id, work_order) for technician_id in crew])
+
+
+def conflict_messages(technician_name, conflicts):
+    """Describe a technician's double bookings, one message per conflict."""
+    return [
+        f"{technician_name} is already booked on work order {conflict['work_order_id']} "
+        f"({conflict['title']}) from {timezone.localtime(conflict['start']):%Y-%m-%d %H:%M} "
+        f"to {timezone.localtime(conflict['end']):%Y-%m-%d %H:%M}."
+        for conflict in conflicts
+    ]
+
+
+def scan_conflicts(start=None, days=SCAN_DAYS):
+    """Report the double bookings of the `days` days from `start` (now by default)."""
+    start = start or timezone.now()
+    return ConflictIndex(start, start + timedelta(days=days)).scan()
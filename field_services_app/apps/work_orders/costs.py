@@ -0,0 +1,77 @@
+"""
+Work order and project cost rollups.
+
+Rollups are refreshed for the affected work orders and projects when an
+item, inventory transaction or expense changes (see signals.py), and the
+nightly reconciliation recomputes every rollup in chunks with grouped
+queries, correcting any that drifted (for example after bulk updates,
+which skip signals).
+"""
+
+from .models import ProjectCost, WorkOrder, WorkOrderCost
+
+# Work orders or projects recomputed per chunk by the reconciliation
+RECONCILE_CHUNK_SIZE = 1000
+
+
+def refresh_costs(work_order_ids=(), project_ids=()):
+    """
+    Recompute the rollups of the given work orders, then those of the given
+    projects and of the projects the work orders belong to.
+    """
+    project_ids = set(project_ids)
+    if work_order_ids:
+        rollups = WorkOrderCost.refresh(list(work_order_ids))
+        project_ids.update(rollup.project_id for rollup in rollups)
+    if project_ids:
+        ProjectCost.refresh(list(project_ids))
+
+
+def _stored_costs(model, key_field, ids, fields):
+    return {
+        row[0]: row[1:]
+        for row in model.objects.filter(**{f'{key_field}__in': ids}).values_list(key_field, *fields)
+    }
+
+
+def _chunks(queryset, chunk_size):
+    """Yield the primary keys of a queryset in chunks, paginating on the key."""
+    last_pk = None
+    while True:
+        page = queryset.order_by('pk')
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        ids = list(page.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def reconcile_costs(chunk_size=RECONCILE_CHUNK_SIZE):
+    """
+    Recompute every work order and project rollup. Returns the number of
+    rollups of each kind written and how many of them had to be corrected.
+    """
+    from apps.projects.models import Project
+    
+    stats = {'work_orders': 0, 'projects': 0, 'corrected': 0}
+    
+    fields = ['project_id'] + WorkOrderCost.COST_FIELDS
+    for ids in _chunks(WorkOrder.objects.all(), chunk_size):
+        stored = _stored_costs(WorkOrderCost, 'work_order_id', ids, fields)
+        for rollup in WorkOrderCost.refresh(ids):
+            stats['work_orders'] += 1
+            if stored.get(rollup.work_order_id) != tuple(getattr(rollup, field) for field in fields):
+                stats['corrected'] += 1
+    
+    # Projects last, so they add up the corrected work order rollups
+    fields = ['work_order_count'] + WorkOrderCost.COST_FIELDS
+    for ids in _chunks(Project.objects.all(), chunk_size):
+        stored = _stored_costs(ProjectCost, 'project_id', ids, fields)
+        for rollup in ProjectCost.refresh(ids):
+            stats['projects'] += 1
+            if stored.get(rollup.project_id) != tuple(getattr(rollup, field) for field in fields):
+                stats['corrected'] += 1
+    
+    return stats
@@ -0,0 +1,344 @@
+"""
+Dispatch matching: scores technicians for work orders and solves batches of
+open work orders against the whole fleet.
+
+A technician is a candidate for a work order when they hold all of its
+required specialties and valid (unexpired) certifications and their
+availability status allows dispatch. Candidates are then scored on distance
+from their last known position, current assignment load, customer rating
+and availability.
+"""
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+# Availability statuses that can be dispatched, with their score
+DISPATCHABLE_STATUSES = {
+    'available': 1.0,
+    'on_assignment': 0.6,
+}
+
+# Weights of the score components, adding up to 1
+WEIGHTS = {
+    'distance': 0.35,
+    'load': 0.25,
+    'rating': 0.2,
+    'availability': 0.2,
+}
+
+# Distance (km) at which the distance score halves
+DISTANCE_HALF_SCORE_KM = 5.0
+
+# Score used when the technician's or the work order's position is unknown
+UNKNOWN_DISTANCE_SCORE = 0.5
+
+# Rating assumed for technicians without ratings
+DEFAULT_RATING = 3.0
+
+# Work order statuses that are waiting for technicians
+OPEN_STATUSES = ['pending', 'scheduled']
+
+# Cost of leaving a work order unassigned in batch dispatch, by priority, so
+# that urgent work is served first when technicians run short
+UNASSIGNED_COST = {
+    'low': 2.0,
+    'medium': 3.0,
+    'high': 4.0,
+    'urgent': 5.0,
+}
+
+# Cost of an infeasible pairing, never chosen over leaving work unassigned
+INFEASIBLE_COST = 1e6
+
+
+class Fleet:
+    """
+    Snapshot of the dispatchable technicians and everything scoring needs,
+    loaded with one query per source.
+    """
+    
+    def __init__(self, technicians=None, on_date=None):
+        from apps.technicians.models import Technician, TechnicianLastLocation, TechnicianValidCertification
+        
+        on_date = on_date or timezone.localdate()
+        technicians = Technician.objects.all() if technicians is None else technicians
+        rows = technicians.filter(
+            availability_status__in=list(DISPATCHABLE_STATUSES)
+        ).annotate(
+            load=Count(
+                'work_order_assignments',
+                filter=Q(work_order_assignments__status__in=Technician.ACTIVE_ASSIGNMENT_STATUSES)
+            )
+        ).values_list('id', 'full_name', 'availability_status', 'customer_rating', 'load')
+        
+        self.technicians = {
+            technician_id: {
+                'id': technician_id,
+                'full_name': full_name,
+                'availability_status': availability_status,
+                'customer_rating': customer_rating,
+                'load': load,
+                'specialties': set(),
+                'certifications': set(),
+                'position': None,
+            }
+            for technician_id, full_name, availability_status, customer_rating, load in rows
+        }
+        ids = list(self.technicians)
+        
+        for technician_id, specialty_id in Technician.specialties.through.objects.filter(
+            technician_id__in=ids
+        ).values_list('technician_id', 'specialty_id'):
+            self.technicians[technician_id]['specialties'].add(specialty_id)
+        
+        for technician_id, certification_id in TechnicianValidCertification.objects.valid_on(on_date).filter(
+            technician_id__in=ids
+        ).values_list('technician_id', 'certification_id'):
+            self.technicians[technician_id]['certifications'].add(certification_id)
+        
+        for technician_id, latitude, longitude in TechnicianLastLocation.objects.filter(
+            technician_id__in=ids
+        ).values_list('technician_id', 'latitude', 'longitude'):
+            self.technicians[technician_id]['position'] = (latitude, longitude)
+        
+        self._distances = {}
+    
+    def load_distances(self, jobs):
+        """
+        Look up the distances from every technician to the given jobs with a
+        single distance matrix call, so scoring does not compute them pair
+        by pair.
+        """
+        from apps.technicians.spatial import distance_matrix
+        
+        technicians = [technician for technician in self.technicians.values() if technician['position']]
+        jobs = [job for job in jobs if job['position']]
+        rows = distance_matrix.matrix(
+            [technician['position'] for technician in technicians],
+            [job['position'] for job in jobs]
+        )
+        for technician, row in zip(technicians, rows):
+            for job, distance_km in zip(jobs, row):
+                self._distances[technician['id'], job['work_order'].pk] = distance_km
+    
+    def score(self, technician, job, extra_load=0):
+        """
+        Score a technician for a job (see job_requirements), between 0 and 1.
+        Returns None when the technician cannot take the job.
+        """
+        from apps.technicians.spatial import distance_matrix
+        
+        if not job['specialties'] <= technician['specialties']:
+            return None
+        if not job['certifications'] <= technician['certifications']:
+            return None
+        
+        distance_km = None
+        distance_score = UNKNOWN_DISTANCE_SCORE
+        if technician['position'] and job['position']:
+            distance_km = self._distances.get((technician['id'], job['work_order'].pk))
+            if distance_km is None:
+                distance_km = distance_matrix.distance(technician['position'], job['position'])
+            distance_score = 1 / (1 + distance_km / DISTANCE_HALF_SCORE_KM)
+        
+        load_score = 1 / (1 + technician['load'] + extra_load)
+        rating_score = (technician['customer_rating'] or DEFAULT_RATING) / 5
+        availability_score = DISPATCHABLE_STATUSES[technician['availability_status']]
+        
+        score = (
+            WEIGHTS['distance'] * distance_score +
+            WEIGHTS['load'] * load_score +
+            WEIGHTS['rating'] * rating_score +
+            WEIGHTS['availability'] * availability_score
+        )
+        return score, distance_km
+
+
+def job_requirements(work_orders):
+    """
+    Return the dispatch requirements of work orders: their required
+    specialty and certification ids and position.
+    """
+    jobs = []
+    for work_order in work_orders.prefetch_related('required_specialties', 'required_certifications'):
+        position = None
+        if work_order.latitude is not None and work_order.longitude is not None:
+            position = (float(work_order.latitude), float(work_order.longitude))
+        jobs.append({
+            'work_order': work_order,
+            'specialties': {specialty.pk for specialty in work_order.required_specialties.all()},
+            'certifications': {certification.pk for certification in work_order.required_certifications.all()},
+            'position': position,
+        })
+    return jobs
+
+
+def _proposal(technician, score, distance_km):
+    return {
+        'technician_id': technician['id'],
+        'technician_name': technician['full_name'],
+        'score': round(score, 4),
+        'distance_km': None if distance_km is None else round(distance_km, 2),
+        'active_assignments': technician['load'],
+    }
+
+
+def rank_candidates(work_order, limit=5, fleet=None):
+    """Return the best `limit` candidate technicians for one work order."""
+    from .models import WorkOrder
+    
+    fleet = fleet or Fleet()
+    job = job_requirements(WorkOrder.objects.filter(pk=work_order.pk))[0]
+    assigned = set(work_order.assignments.values_list('technician_id', flat=True))
+    fleet.load_distances([job])
+    
+    candidates = []
+    for technician in fleet.technicians.values():
+        if technician['id'] in assigned:
+            continue
+        result = fleet.score(technician, job)
+        if result is not None:
+            candidates.append(_proposal(technician, *result))
+    
+    candidates.sort(key=lambda candidate: -candidate['score'])
+    return candidates[:limit]
+
+
+def solve_assignment(cost):
+    """
+    Solve the rectangular assignment problem for a cost matrix with at
+    least as many columns as rows (Hungarian algorithm with shortest
+    augmenting paths, O(rows² x columns)).
+    
+    Returns the column assigned to each row.
+    """
+    rows = len(cost)
+    columns = len(cost[0]) if rows else 0
+    infinity = float('inf')
+    u = [0.0] * (rows + 1)
+    v = [0.0] * (columns + 1)
+    owner = [0] * (columns + 1)
+    way = [0] * (columns + 1)
+    
+    for row in range(1, rows + 1):
+        owner[0] = row
+        column = 0
+        min_reduced = [infinity] * (columns + 1)
+        used = [False] * (columns + 1)
+        while True:
+            used[column] = True
+            current_row = owner[column]
+            row_cost = cost[current_row - 1]
+            row_potential = u[current_row]
+            delta = infinity
+            next_column = 0
+            for candidate in range(1, columns + 1):
+                if not used[candidate]:
+                    reduced = row_cost[candidate - 1] - row_potential - v[candidate]
+                    if reduced < min_reduced[candidate]:
+                        min_reduced[candidate] = reduced
+                        way[candidate] = column
+                    if min_reduced[candidate] < delta:
+                        delta = min_reduced[candidate]
+                        next_column = candidate
+            for candidate in range(columns + 1):
+                if used[candidate]:
+                    u[owner[candidate]] += delta
+                    v[candidate] -= delta
+                else:
+                    min_reduced[candidate] -= delta
+            column = next_column
+            if owner[column] == 0:
+                break
+        # Flip the augmenting path
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+    
+    assignment = [None] * rows
+    for column in range(1, columns + 1):
+        if owner[column]:
+            assignment[owner[column] - 1] = column - 1
+    return assignment
+
+
+def dispatch_batch(work_orders, capacity=1, candidates_per_job=10, fleet=None):
+    """
+    Assign many work orders to the fleet at once, maximizing the total score.
+    
+    Each technician can receive up to `capacity` of the work orders, later
+    ones scoring lower as their load grows. Only each work order's best
+    `candidates_per_job` technicians are considered, which keeps the
+    optimization small. Work orders that cannot be served are returned
+    unassigned, lowest priority first.
+    
+    Work orders that already have an active assignment are skipped, and
+    technicians who were ever assigned to a work order are not proposed
+    for it again.
+    
+    Returns a list of {'work_order_id', 'proposal'} dicts, proposal being
+    None for unassigned work orders.
+    """
+    from apps.technicians.models import Technician
+    from .models import WorkOrderAssignment
+    
+    fleet = fleet or Fleet()
+    jobs = job_requirements(
+        work_orders.exclude(assignments__status__in=Technician.ACTIVE_ASSIGNMENT_STATUSES)
+    )
+    if not jobs:
+        return []
+    fleet.load_distances(jobs)
+    assigned = set(
+        WorkOrderAssignment.objects.filter(
+            work_order_id__in=[job['work_order'].pk for job in jobs]
+        ).values_list('work_order_id', 'technician_id')
+    )
+    
+    # Shortlist each job's best technicians, one column per technician slot
+    columns = {}
+    shortlists = []
+    for job in jobs:
+        scored = []
+        for technician in fleet.technicians.values():
+            if (job['work_order'].pk, technician['id']) in assigned:
+                continue
+            result = fleet.score(technician, job)
+            if result is not None:
+                scored.append((result[0], technician['id']))
+        scored.sort(reverse=True)
+        shortlist = [technician_id for _, technician_id in scored[:candidates_per_job]]
+        shortlists.append(set(shortlist))
+        for technician_id in shortlist:
+            for slot in range(capacity):
+                columns.setdefault((technician_id, slot), len(columns))
+    
+    column_keys = list(columns)
+    cost = []
+    results = []
+    for job, shortlist in zip(jobs, shortlists):
+        row = [INFEASIBLE_COST] * len(column_keys)
+        row_results = {}
+        for index, (technician_id, slot) in enumerate(column_keys):
+            if technician_id not in shortlist:
+                continue
+            result = fleet.score(fleet.technicians[technician_id], job, extra_load=slot)
+            if result is not None:
+                row[index] = 1 - result[0]
+                row_results[index] = result
+        # Leaving the job unassigned is always possible, at a priority cost
+        row.extend([UNASSIGNED_COST.get(job['work_order'].priority, 3.0)] * len(jobs))
+        cost.append(row)
+        results.append(row_results)
+    
+    assignment = solve_assignment(cost)
+    
+    dispatch = []
+    for job, column, row_results in zip(jobs, assignment, results):
+        proposal = None
+        if column in row_results:
+            technician = fleet.technicians[column_keys[column][0]]
+            proposal = _proposal(technician, *row_results[column])
+        dispatch.append({'work_order_id': job['work_order'].pk, 'proposal': proposal})
+    return dispatch
@@ -0,0 +1,343 @@
+"""
+Bulk import of work orders with their line items from CSV or JSONL files.
+
+The file is streamed record by record (one work order with its items) and
+written in chunks: references are resolved with one query per model per
+chunk and cached for the rest of the import, item totals are computed in
+Python, and each chunk's work orders, items and status history rows are
+inserted with bulk_create, and their cost rollups refreshed, inside one
+transaction. A WorkOrderImportCheckpoint row, saved in that same
+transaction, records the number of records committed, so an interrupted
+import resumes after the last good chunk and never imports a chunk twice.
+
+CSV files have one row per item; consecutive rows sharing a `work_order_ref`
+belong to the same work order, whose fields are read from the first of
+them. Item columns are prefixed with `item_` (`item_type`, `item_sku`,
+`item_description`, `item_quantity`, `item_unit_price`, `item_notes`).
+JSONL files have one work order object per line, with an `items` list.
+"""
+
+import csv
+import json
+import os
+from collections import defaultdict
+from itertools import groupby
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .costs import refresh_costs
+from .models import WorkOrder, WorkOrderImportCheckpoint, WorkOrderItem, WorkOrderStatus
+
+# Work order fields read from import records
+WORK_ORDER_FIELDS = [
+    'title', 'description', 'status', 'priority', 'type', 'location', 'latitude', 'longitude',
+    'scheduled_start', 'scheduled_end', 'actual_start', 'actual_end', 'estimated_duration',
+    'estimated_cost', 'actual_cost',
+]
+
+# Work order item fields read from import records
+ITEM_FIELDS = ['type', 'description', 'quantity', 'unit_price', 'notes']
+
+# Records (work orders) written per transaction
+IMPORT_CHUNK_SIZE = 500
+
+
+class ImportRecord:
+    """One work order of the import file, with its items, as raw strings."""
+    
+    def __init__(self, number, line, ref, fields, items):
+        self.number = number
+        self.line = line
+        self.ref = ref
+        self.fields = fields
+        self.items = items
+
+
+def iter_csv_records(path):
+    """Yield the ImportRecords of a CSV file, one row per item."""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        reader = csv.DictReader(handle)
+        rows = ((reader.line_num, row) for row in reader)
+        grouped = groupby(rows, key=lambda numbered: numbered[1].get('work_order_ref') or f"line-{numbered[0]}")
+        for number, (ref, group) in enumerate(grouped):
+            group = list(group)
+            line, first = group[0]
+            items = [
+                {name[len('item_'):]: value for name, value in row.items() if name and name.startswith('item_')}
+                for _, row in group
+                if row.get('item_description')
+            ]
+            fields = {name: value for name, value in first.items() if name and not name.startswith('item_')}
+            yield ImportRecord(number, line, ref, fields, items)
+
+
+def iter_jsonl_records(path):
+    """Yield the ImportRecords of a JSONL file, one work order per line."""
+    with open(path, encoding='utf-8') as handle:
+        number = 0
+        for line, text in enumerate(handle, start=1):
+            if not text.strip():
+                continue
+            try:
+                data = json.loads(text)
+            except ValueError as exc:
+                data = {'_error': f"Invalid JSON: {exc}"}
+            if not isinstance(data, dict):
+                data = {'_error': "Each line must be a JSON object"}
+            items = data.pop('items', None) or []
+            yield ImportRecord(number, line, data.get('work_order_ref') or f"line-{line}", data, items)
+            number += 1
+
+
+def iter_records(path, file_format=None):
+    """Yield the ImportRecords of a CSV or JSONL file (by extension unless `file_format` is given)."""
+    file_format = file_format or ('jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+    if file_format == 'jsonl':
+        return iter_jsonl_records(path)
+    return iter_csv_records(path)
+
+
+class ReferenceCache:
+    """
+    Resolve references to related rows (by id, or by a natural key such as a
+    name) for the whole import. Unknown references are looked up in bulk,
+    once per chunk, and both hits and misses are remembered.
+    """
+    
+    def __init__(self, model, key_field):
+        self.model = model
+        self.key_field = key_field
+        self.resolved = {}
+    
+    def load(self, references):
+        """Look up the references not seen yet."""
+        missing = {str(reference).strip() for reference in references if reference not in (None, '')}
+        missing -= set(self.resolved)
+        if not missing:
+            return
+        ids = {int(reference) for reference in missing if reference.isdigit()}
+        keys = missing - {str(pk) for pk in ids}
+        
+        found = {}
+        for pk in self.model.objects.filter(pk__in=ids).values_list('pk', flat=True):
+            found[str(pk)] = pk
+        matches = defaultdict(list)
+        for key, pk in self.model.objects.filter(**{f'{self.key_field}__in': keys}).values_list(self.key_field, 'pk'):
+            matches[key].append(pk)
+        for key, pks in matches.items():
+            # Ambiguous natural keys are refused rather than guessed
+            found[key] = pks[0] if len(pks) == 1 else ValueError(f"matches {len(pks)} rows")
+        
+        for reference in missing:
+            self.resolved[reference] = found.get(reference)
+    
+    def get(self, reference, label):
+        """Return the pk of a loaded reference, None if empty, or raise ValueError."""
+        if reference in (None, ''):
+            return None
+        pk = self.resolved.get(str(reference).strip())
+        if pk is None:
+            raise ValueError(f"Unknown {label}: {reference}")
+        if isinstance(pk, ValueError):
+            raise ValueError(f"Ambiguous {label} {reference}: {pk}")
+        return pk
+
+
+def shape_error(record):
+    """Return why a record is malformed (non-scalar values, items that are not objects), or None."""
+    if '_error' in record.fields:
+        return record.fields['_error']
+    if not isinstance(record.items, list):
+        return "items must be a list"
+    for position, raw_item in enumerate(record.items, start=1):
+        if not isinstance(raw_item, dict):
+            return f"item {position}: must be an object"
+    for name, value in record.fields.items():
+        if isinstance(value, (dict, list)):
+            return f"{name}: must be a single value"
+    for position, raw_item in enumerate(record.items, start=1):
+        for name, value in raw_item.items():
+            if isinstance(value, (dict, list)):
+                return f"item {position}: {name}: must be a single value"
+    return None
+
+
+def _convert(model, name, raw):
+    """
+    Convert a raw value to a model field's Python value, running the field's
+    validation (choices, length, digits), raising ValueError.
+    """
+    field = model._meta.get_field(name)
+    try:
+        value = field.clean(raw, None)
+    except ValidationError as exc:
+        raise ValueError(f"{name}: {' '.join(exc.messages)}")
+    if hasattr(value, 'tzinfo') and hasattr(value, 'hour') and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _convert_fields(model, names, raw_fields):
+    values = {}
+    for name in names:
+        raw = raw_fields.get(name)
+        if raw in (None, ''):
+            continue
+        values[name] = _convert(model, name, raw)
+    return values
+
+
+class WorkOrderImporter:
+    """
+    Import work orders and their items from a file in chunks, resuming from
+    the checkpoint named `checkpoint` when it exists (see the module
+    docstring). The checkpoint name defaults to the file's absolute path.
+    """
+    
+    def __init__(self, path, file_format=None, chunk_size=IMPORT_CHUNK_SIZE, checkpoint=None, user=None):
+        self.path = path
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint or os.path.abspath(path)
+        self.user = user
+        self.references = {
+            'project': ReferenceCache(self._model('projects', 'Project'), 'name'),
+            'customer': ReferenceCache(self._model('customers', 'Company'), 'name'),
+            'contact': ReferenceCache(self._model('customers', 'Contact'), 'email'),
+            'item': ReferenceCache(self._model('inventory', 'InventoryItem'), 'sku'),
+        }
+        self.errors = []
+        self.stats = {'records_done': 0, 'work_orders': 0, 'items': 0, 'errors': 0}
+    
+    @staticmethod
+    def _model(app_label, model_name):
+        from django.apps import apps
+        
+        return apps.get_model(app_label, model_name)
+    
+    def read_checkpoint(self):
+        return WorkOrderImportCheckpoint.objects.filter(name=self.checkpoint).first()
+    
+    def write_checkpoint(self, stats, completed=False):
+        WorkOrderImportCheckpoint.objects.update_or_create(
+            name=self.checkpoint,
+            defaults=dict(stats, source=os.path.abspath(self.path), completed=completed)
+        )
+    
+    def run(self, restart=False, on_chunk=None):
+        """
+        Import the file. Returns the stats dict: records done, work orders
+        and items created and rows rejected. Rejected rows are collected in
+        `errors` as {'line', 'ref', 'error'} dicts.
+        
+        A failure while writing a chunk rolls that chunk back and propagates,
+        leaving the checkpoint at the last committed chunk.
+        """
+        checkpoint = None if restart else self.read_checkpoint()
+        if checkpoint:
+            self.stats.update({key: getattr(checkpoint, key) for key in self.stats})
+        
+        chunk = []
+        for record in iter_records(self.path, self.file_format):
+            if record.number < self.stats['records_done']:
+                continue
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+                if on_chunk:
+                    on_chunk(self.stats)
+        if chunk:
+            self.import_chunk(chunk)
+            if on_chunk:
+                on_chunk(self.stats)
+        
+        self.write_checkpoint(self.stats, completed=True)
+        return self.stats
+    
+    def import_chunk(self, records):
+        """Validate and write one chunk of records in a single transaction."""
+        errors = []
+        well_formed = []
+        for record in records:
+            error = shape_error(record)
+            if error:
+                errors.append({'line': record.line, 'ref': record.ref, 'error': error})
+            else:
+                well_formed.append(record)
+        
+        for name, cache in self.references.items():
+            if name == 'item':
+                cache.load(item.get('sku') for record in well_formed for item in record.items)
+            else:
+                cache.load(record.fields.get(name) for record in well_formed)
+        
+        work_orders = []
+        items_per_work_order = []
+        for record in well_formed:
+            try:
+                work_order, items = self.build(record)
+            except ValueError as exc:
+                errors.append({'line': record.line, 'ref': record.ref, 'error': str(exc)})
+                continue
+            work_orders.append(work_order)
+            items_per_work_order.append(items)
+        
+        stats = dict(self.stats, records_done=records[-1].number + 1)
+        with transaction.atomic():
+            WorkOrder.objects.bulk_create(work_orders, batch_size=self.chunk_size)
+            items = []
+            for work_order, work_order_items in zip(work_orders, items_per_work_order):
+                for item in work_order_items:
+                    item.work_order_id = work_order.pk
+                    items.append(item)
+            WorkOrderItem.objects.bulk_create(items, batch_size=1000)
+            WorkOrderStatus.objects.bulk_create(
+                [
+                    WorkOrderStatus(work_order_id=work_order.pk, status=work_order.status,
+                                    changed_by=self.user, notes="Imported")
+                    for work_order in work_orders
+                ],
+                batch_size=1000
+            )
+            # bulk_create skips the signals maintaining the cost rollups,
+            # refreshed in the same transaction so a failure cannot leave
+            # imported work orders without them
+            refresh_costs([work_order.pk for work_order in work_orders])
+            stats['work_orders'] += len(work_orders)
+            stats['items'] += len(items)
+            stats['errors'] += len(errors)
+            self.write_checkpoint(stats)
+        
+        self.stats = stats
+        self.errors.extend(sorted(errors, key=lambda error: error['line']))
+    
+    def build(self, record):
+        """Build the unsaved WorkOrder and WorkOrderItems of a record, raising ValueError."""
+        if not record.fields.get('title'):
+            raise ValueError("title is required")
+        
+        values = _convert_fields(WorkOrder, WORK_ORDER_FIELDS, record.fields)
+        values['project_id'] = self.references['project'].get(record.fields.get('project'), 'project')
+        values['customer_id'] = self.references['customer'].get(record.fields.get('customer'), 'customer')
+        values['contact_id'] = self.references['contact'].get(record.fields.get('contact'), 'contact')
+        if values['project_id'] is None or values['customer_id'] is None:
+            raise ValueError("project and customer are required")
+        work_order = WorkOrder(created_by=self.user, **values)
+        
+        items = []
+        for position, raw_item in enumerate(record.items, start=1):
+            try:
+                item_values = _convert_fields(WorkOrderItem, ITEM_FIELDS, raw_item)
+                item_values['item_id'] = self.references['item'].get(raw_item.get('sku'), 'inventory item')
+            except ValueError as exc:
+                raise ValueError(f"item {position}: {exc}")
+            if not item_values.get('description'):
+                raise ValueError(f"item {position}: description is required")
+            item = WorkOrderItem(**item_values)
+            # bulk_create skips WorkOrderItem.save(), which computes the total
+            item.total_price = item.quantity * item.unit_price
+            items.append(item)
+        return work_order, items
@@ -0,0 +1,102 @@
+"""
+Import work orders with their line items from a CSV or JSONL file.
+"""
+
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.work_orders.importer import IMPORT_CHUNK_SIZE, WorkOrderImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream work orders and their items from a CSV or JSONL file into the database in chunks. "
+        "Interrupted imports resume after the last committed chunk when run again."
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file to import.")
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help="File format. Defaults to the file extension."
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help="Number of work orders written per transaction."
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="Name of the checkpoint recording progress. Defaults to the file's absolute path."
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help="Ignore an existing checkpoint and import the whole file."
+        )
+        parser.add_argument(
+            '--user',
+            help="Email of the user recorded as creator of the work orders."
+        )
+        parser.add_argument(
+            '--errors',
+            help="Write the rejected rows to this CSV file."
+        )
+    
+    def handle(self, *args, **options):
+        from apps.users.models import User
+        
+        user = None
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f"Unknown user: {options['user']}")
+        
+        importer = WorkOrderImporter(
+            options['path'],
+            file_format=options['format'],
+            chunk_size=options['chunk_size'],
+            checkpoint=options['checkpoint'],
+            user=user
+        )
+        
+        def report(stats):
+            self.stdout.write(
+                f"{stats['records_done']} records read, {stats['work_orders']} work orders "
+                f"and {stats['items']} items imported, {stats['errors']} rejected"
+            )
+        
+        try:
+            stats = importer.run(restart=options['restart'], on_chunk=report)
+        except FileNotFoundError:
+            raise CommandError(f"File not found: {options['path']}")
+        except Exception as exc:
+            raise CommandError(
+                f"Import failed after {importer.stats['records_done']} records: {exc}. "
+                f"Run the command again to resume from checkpoint {importer.checkpoint}."
+            )
+        finally:
+            self.write_errors(importer.errors, options['errors'])
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['work_orders']} work orders and {stats['items']} items "
+            f"({stats['errors']} rows rejected)."
+        ))
+    
+    def write_errors(self, errors, path):
+        if not errors:
+            return
+        if path:
+            with open(path, 'w', newline='') as handle:
+                writer = csv.DictWriter(handle, fieldnames=['line', 'ref', 'error'])
+                writer.writeheader()
+                writer.writerows(errors)
+            self.stdout.write(self.style.WARNING(f"{len(errors)} rejected rows written to {path}."))
+        else:
+            for error in errors[:50]:
+                self.stdout.write(self.style.WARNING(f"Line {error['line']} ({error['ref']}): {error['error']}"))
+            if len(errors) > 50:
+                self.stdout.write(self.style.WARNING(f"... and {len(errors) - 50} more, use --errors to save them all."))
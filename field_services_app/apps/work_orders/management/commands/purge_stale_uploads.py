@@ -0,0 +1,26 @@
+"""
+Cancel abandoned resumable uploads and delete their partial files.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.work_orders.models import WorkOrderUpload
+
+
+class Command(BaseCommand):
+    help = "Cancel the open work order uploads that have not received data for a while."
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=48,
+            help="Cancel uploads idle for more than this many hours."
+        )
+    
+    def handle(self, *args, **options):
+        count = WorkOrderUpload.purge_stale(timezone.now() - timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f"Cancelled {count} stale uploads."))
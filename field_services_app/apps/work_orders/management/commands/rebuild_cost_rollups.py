@@ -0,0 +1,29 @@
+"""
+Recompute the work order and project cost rollups.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.work_orders.costs import RECONCILE_CHUNK_SIZE, reconcile_costs
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every work order and project cost rollup from the items, inventory "
+        "transactions and expenses, correcting any that drifted. Meant to run nightly."
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=RECONCILE_CHUNK_SIZE,
+            help="Number of work orders or projects recomputed per batch."
+        )
+    
+    def handle(self, *args, **options):
+        stats = reconcile_costs(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed {stats['work_orders']} work order and {stats['projects']} project cost rollups "
+            f"({stats['corrected']} corrected)."
+        ))
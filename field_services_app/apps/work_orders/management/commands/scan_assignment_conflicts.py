@@ -0,0 +1,49 @@
+"""
+Report technicians double-booked by overlapping assignments.
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.work_orders.conflicts import SCAN_DAYS, scan_conflicts
+
+
+class Command(BaseCommand):
+    help = (
+        "List the technicians whose active assignments overlap in the coming days, "
+        "with both work orders and the length of the overlap."
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=SCAN_DAYS,
+            help="Number of days to scan."
+        )
+        parser.add_argument(
+            '--start',
+            help="Scan from this date (YYYY-MM-DD, default now)."
+        )
+    
+    def handle(self, *args, **options):
+        start = None
+        if options['start']:
+            try:
+                start = timezone.make_aware(datetime.fromisoformat(options['start']))
+            except ValueError:
+                raise CommandError("Invalid date format. Use ISO format (YYYY-MM-DD)")
+        
+        report = scan_conflicts(start=start, days=options['days'])
+        for conflict in report:
+            first, second = conflict['assignments']
+            self.stdout.write(
+                f"{conflict['technician_name']}: work orders {first['work_order_id']} and "
+                f"{second['work_order_id']} overlap by {conflict['overlap_minutes']} minutes "
+                f"from {timezone.localtime(conflict['overlap_start']):%Y-%m-%d %H:%M}"
+            )
+        
+        style = self.style.WARNING if report else self.style.SUCCESS
+        self.stdout.write(style(f"Found {len(report)} conflicts in the next {options['days']} days."))
@@ -2,11 +2,48 @@
 Models for the work_orders app.
 """
 
+import hashlib
+import os
+import uuid
+
 from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
 
+class WorkOrderQuerySet(models.QuerySet):
+    """Custom queryset for work orders."""
+    
+    def with_crew(self):
+        """
+        Prefetch the assignments with their technicians and users, so
+        assigned_technicians and the assignment listings of any number of
+        work orders cost one extra query.
+        """
+        return self.prefetch_related(
+            models.Prefetch(
+                'assignments',
+                queryset=WorkOrderAssignment.objects.select_related('technician__user', 'assigned_by')
+            )
+        )
+    
+    def overdue(self, now=None):
+        """
+        Keep the active work orders whose scheduled end has passed, evaluated
+        in SQL (see WorkOrder.is_overdue for the per-instance check).
+        
+        Active statuses are listed explicitly rather than excluding the
+        closed ones, so the database can range-scan the (status,
+        scheduled_end) index once per status.
+        """
+        from django.utils import timezone
+        
+        return self.filter(
+            status__in=WorkOrder.ACTIVE_STATUSES,
+            scheduled_end__lt=now or timezone.now()
+        )
+
+
 class WorkOrder(models.Model):
     """
     Work order model representing a service request or job.
@@ -24,6 +61,12 @@ class WorkOrder(models.Model):
         ('paid', _('Paid')),
     )
     
+    # Statuses of work orders that are finished, one way or another
+    CLOSED_STATUSES = ['completed', 'cancelled', 'invoiced', 'paid']
+    
+    # Statuses of work orders that still have work to be done
+    ACTIVE_STATUSES = ['draft', 'pending', 'scheduled', 'in_progress', 'on_hold']
+    
     PRIORITY_CHOICES = (
         ('low', _('Low')),
         ('medium', _('Medium')),
@@ -82,6 +125,20 @@ class WorkOrder(models.Model):
         default='installation'
     )
     location = models.CharField(_('location'), max_length=255, blank=True)
+    latitude = models.DecimalField(_('latitude'), max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(_('longitude'), max_digits=9, decimal_places=6, null=True, blank=True)
+    required_specialties = models.ManyToManyField(
+        'technicians.Specialty',
+        blank=True,
+        related_name='work_orders',
+        verbose_name=_('required specialties')
+    )
+    required_certifications = models.ManyToManyField(
+        'technicians.Certification',
+        blank=True,
+        related_name='work_orders',
+        verbose_name=_('required certifications')
+    )
     scheduled_start = models.DateTimeField(_('scheduled start'), null=True, blank=True)
     scheduled_end = models.DateTimeField(_('scheduled end'), null=True, blank=True)
     actual_start = models.DateTimeField(_('actual start'), null=True, blank=True)
@@ -113,10 +170,23 @@ class WorkOrder(models.Model):
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
     
+    objects = WorkOrderQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('work order')
         verbose_name_plural = _('work orders')
         ordering = ['-created_at']
+        indexes = [
+            # Overdue lookups; priority is carried in the index (PostgreSQL)
+            # so dashboard counts are answered from the index alone
+            models.Index(
+                fields=['status', 'scheduled_end'],
+                include=['priority'],
+                name='work_order_status_end_idx'
+            ),
+            # Schedule horizons (conflict scans, routes)
+            models.Index(fields=['scheduled_start'], name='work_order_start_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.get_status_display()}"
@@ -131,7 +201,7 @@ class WorkOrder(models.Model):
         return (
             self.scheduled_end and 
             now > self.scheduled_end and 
-            self.status not in ['completed', 'cancelled', 'invoiced', 'paid']
+            self.status not in self.CLOSED_STATUSES
         )
     
     @property
@@ -148,8 +218,14 @@ class WorkOrder(models.Model):
     def assigned_technicians(self):
         """
         Return a list of technicians assigned to this work order.
+        
+        Reuses the assignments prefetched by WorkOrderQuerySet.with_crew();
+        otherwise fetches them with their technicians in one query.
         """
-        return [assignment.technician for assignment in self.assignments.all()]
+        assignments = self.assignments.all()
+        if 'assignments' not in getattr(self, '_prefetched_objects_cache', {}):
+            assignments = assignments.select_related('technician')
+        return [assignment.technician for assignment in assignments]
 
 
 class WorkOrderItem(models.Model):
@@ -261,7 +337,7 @@ class WorkOrderAssignment(models.Model):
         unique_together = ['work_order', 'technician']
     
     def __str__(self):
-        return f"{self.work_order.title} - {self.technician.user.get_full_name()}"
+        return f"{self.work_order.title} - {self.technician.full_name}"
 
 
 class WorkOrderStatus(models.Model):
@@ -381,6 +457,228 @@ class WorkOrderSignature(models.Model):
         return f"{self.signer_name} ({self.get_signer_type_display()})"
 
 
+class WorkOrderUpload(models.Model):
+    """
+    Resumable chunked upload of a work order attachment or signature.
+    
+    The client creates the upload with the file's size and SHA-256, sends
+    byte ranges in order (resending from `received_size` after a dropped
+    connection) and finalizes it. Chunks are streamed to a partial file in
+    settings.CHUNKED_UPLOAD_DIR; finalizing checks the size and hash and
+    registers the attachment or signature in one transaction.
+    """
+    
+    KIND_CHOICES = (
+        ('attachment', _('Attachment')),
+        ('signature', _('Signature')),
+    )
+    
+    STATUS_CHOICES = (
+        ('open', _('Open')),
+        ('completed', _('Completed')),
+        ('cancelled', _('Cancelled')),
+    )
+    
+    # Largest file accepted, in bytes
+    MAX_SIZE = 100 * 1024 * 1024
+    
+    # Bytes read from the request and hashed at a time
+    BLOCK_SIZE = 64 * 1024
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    work_order = models.ForeignKey(
+        WorkOrder,
+        on_delete=models.CASCADE,
+        related_name='uploads',
+        verbose_name=_('work order')
+    )
+    kind = models.CharField(_('kind'), max_length=20, choices=KIND_CHOICES, default='attachment')
+    file_name = models.CharField(_('file name'), max_length=255)
+    total_size = models.PositiveBigIntegerField(_('total size'))
+    sha256 = models.CharField(_('SHA-256'), max_length=64)
+    received_size = models.PositiveBigIntegerField(_('received size'), default=0)
+    status = models.CharField(_('status'), max_length=20, choices=STATUS_CHOICES, default='open')
+    metadata = models.JSONField(
+        _('metadata'),
+        default=dict,
+        blank=True,
+        help_text=_('Fields of the attachment or signature created when the upload is finalized')
+    )
+    attachment = models.OneToOneField(
+        'WorkOrderAttachment',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload',
+        verbose_name=_('attachment')
+    )
+    signature = models.OneToOneField(
+        'WorkOrderSignature',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload',
+        verbose_name=_('signature')
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='work_order_uploads',
+        verbose_name=_('created by')
+    )
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('work order upload')
+        verbose_name_plural = _('work order uploads')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.file_name} ({self.received_size}/{self.total_size})"
+    
+    @property
+    def partial_path(self):
+        """Path of the file the received bytes are written to."""
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{self.pk}.part")
+    
+    def write_chunk(self, stream, start, length):
+        """
+        Stream `length` bytes from `stream` into the partial file at offset
+        `start`, which must not be past the bytes received so far. Chunks may
+        be resent, overwriting what was received. Only the bytes actually read
+        count, so a chunk cut short by a dropped connection can be resumed.
+        
+        Returns the new received size.
+        """
+        if start > self.received_size:
+            raise ValueError(f"Chunk starts at {start}, expected at most {self.received_size}")
+        if start + length > self.total_size:
+            raise ValueError("Chunk goes past the declared file size")
+        
+        os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+        written = 0
+        mode = 'r+b' if os.path.exists(self.partial_path) else 'wb'
+        with open(self.partial_path, mode) as handle:
+            handle.seek(start)
+            while written < length:
+                block = stream.read(min(self.BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                handle.write(block)
+                written += len(block)
+        
+        # Another request may have extended the upload meanwhile, keep the larger size
+        end = start + written
+        WorkOrderUpload.objects.filter(pk=self.pk, received_size__lt=end).update(received_size=end)
+        self.refresh_from_db(fields=['received_size', 'updated_at'])
+        return self.received_size
+    
+    def file_hash(self):
+        """Return the SHA-256 of the received bytes, read in blocks."""
+        digest = hashlib.sha256()
+        with open(self.partial_path, 'rb') as handle:
+            for block in iter(lambda: handle.read(self.BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def finalize(self, user=None, ip_address=None):
+        """
+        Check the received file and register it as an attachment or signature.
+        
+        Raises ValueError if the file is incomplete or its hash does not
+        match; after a mismatch the received bytes are discarded so the file
+        can be sent again. Returns the created WorkOrderAttachment or
+        WorkOrderSignature.
+        """
+        from django.db import transaction
+        
+        with transaction.atomic():
+            upload = WorkOrderUpload.objects.select_for_update().get(pk=self.pk)
+            if upload.status != 'open':
+                raise ValueError(f"Upload is {upload.status}")
+            if upload.received_size != upload.total_size:
+                raise ValueError(f"Upload is incomplete: {upload.received_size} of {upload.total_size} bytes received")
+            hash_matches = upload.file_hash() == upload.sha256.lower()
+            if hash_matches:
+                target = upload._register(user, ip_address)
+        
+        if not hash_matches:
+            upload.received_size = 0
+            upload.save(update_fields=['received_size', 'updated_at'])
+            os.remove(upload.partial_path)
+            raise ValueError("SHA-256 mismatch, the file must be uploaded again")
+        
+        self.status = upload.status
+        return target
+    
+    def _register(self, user, ip_address):
+        """
+        Create the attachment or signature from the partial file. Runs inside
+        finalize()'s transaction.
+        """
+        from django.core.files import File
+        from django.db import transaction
+        
+        if self.kind == 'signature':
+            target = WorkOrderSignature(
+                work_order_id=self.work_order_id,
+                signer_name=self.metadata.get('signer_name', ''),
+                signer_title=self.metadata.get('signer_title', ''),
+                signer_type=self.metadata.get('signer_type', 'customer'),
+                notes=self.metadata.get('notes', ''),
+                ip_address=ip_address
+            )
+            file_field = target.signature_image
+        else:
+            target = WorkOrderAttachment(
+                work_order_id=self.work_order_id,
+                type=self.metadata.get('type', 'photo'),
+                name=self.metadata.get('name') or self.file_name,
+                description=self.metadata.get('description', ''),
+                uploaded_by=user or self.created_by
+            )
+            file_field = target.file
+        
+        with open(self.partial_path, 'rb') as handle:
+            file_field.save(self.file_name, File(handle), save=False)
+        try:
+            target.save()
+            setattr(self, self.kind, target)
+            self.status = 'completed'
+            self.save(update_fields=[self.kind, 'status', 'updated_at'])
+        except Exception:
+            # Stored files are not transactional, remove it with the rolled back rows
+            file_field.delete(save=False)
+            raise
+        
+        partial_path = self.partial_path
+        transaction.on_commit(lambda: os.remove(partial_path))
+        return target
+    
+    def cancel(self):
+        """Cancel the upload and discard the received bytes."""
+        self.status = 'cancelled'
+        self.save(update_fields=['status', 'updated_at'])
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+    
+    @classmethod
+    def purge_stale(cls, before):
+        """
+        Cancel the open uploads not written to since `before` and delete
+        their partial files. Returns the number of uploads cancelled.
+        """
+        stale = list(cls.objects.filter(status='open', updated_at__lt=before))
+        for upload in stale:
+            upload.cancel()
+        return len(stale)
+
+
 class WorkOrderNote(models.Model):
     """
     Notes related to work orders.
@@ -409,3 +707,227 @@ class WorkOrderNote(models.Model):
     
     def __str__(self):
         return f"Note for {self.work_order.title}"
+
+
+class WorkOrderCost(models.Model):
+    """
+    Cost rollup of a work order, maintained from its items, the stock issued
+    to it and its expenses so profitability figures read one row.
+    
+    Stock counts issues (sales and write-offs) less returns, and expenses
+    count once approved. Rows are refreshed when a contributing row changes
+    (see signals.py) and recomputed by the nightly reconciliation in
+    costs.py. The manually entered `actual_cost` is left untouched.
+    """
+    work_order = models.OneToOneField(
+        WorkOrder,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='cost_rollup',
+        verbose_name=_('work order')
+    )
+    project = models.ForeignKey(
+        'projects.Project',
+        on_delete=models.CASCADE,
+        related_name='work_order_costs',
+        verbose_name=_('project')
+    )
+    items_cost = models.DecimalField(_('items cost'), max_digits=14, decimal_places=2, default=0)
+    stock_cost = models.DecimalField(_('stock cost'), max_digits=14, decimal_places=2, default=0)
+    expenses_cost = models.DecimalField(_('expenses cost'), max_digits=14, decimal_places=2, default=0)
+    total_cost = models.DecimalField(_('total cost'), max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    # Inventory transactions adding to (or, for returns, taking from) a work order's cost
+    STOCK_ISSUE_TYPES = ['sale', 'write_off']
+    STOCK_RETURN_TYPES = ['return']
+    
+    # Expense statuses counted as cost
+    EXPENSE_STATUSES = ['approved', 'paid', 'reimbursed']
+    
+    COST_FIELDS = ['items_cost', 'stock_cost', 'expenses_cost', 'total_cost']
+    
+    class Meta:
+        verbose_name = _('work order cost')
+        verbose_name_plural = _('work order costs')
+    
+    def __str__(self):
+        return f"{self.work_order_id}: {self.total_cost}"
+    
+    @classmethod
+    def compute(cls, work_order_ids):
+        """
+        Compute the rollups of the given work orders with one grouped query
+        per source. Returns unsaved instances, one per existing work order.
+        """
+        from apps.billing.models import Expense
+        from apps.inventory.models import InventoryTransaction
+        
+        items = dict(
+            WorkOrderItem.objects.filter(work_order_id__in=work_order_ids).values(
+                'work_order_id'
+            ).annotate(total=models.Sum('total_price')).values_list('work_order_id', 'total')
+        )
+        stock = dict(
+            InventoryTransaction.objects.filter(
+                work_order_id__in=work_order_ids,
+                type__in=cls.STOCK_ISSUE_TYPES + cls.STOCK_RETURN_TYPES
+            ).values('work_order_id').annotate(
+                total=models.Sum(
+                    models.Case(
+                        models.When(type__in=cls.STOCK_RETURN_TYPES, then=-models.F('total_price')),
+                        default=models.F('total_price')
+                    )
+                )
+            ).values_list('work_order_id', 'total')
+        )
+        expenses = dict(
+            Expense.objects.filter(
+                work_order_id__in=work_order_ids,
+                status__in=cls.EXPENSE_STATUSES
+            ).values('work_order_id').annotate(
+                total=models.Sum('total_amount')
+            ).values_list('work_order_id', 'total')
+        )
+        
+        rollups = []
+        for work_order_id, project_id in WorkOrder.objects.filter(
+            pk__in=work_order_ids
+        ).values_list('pk', 'project_id'):
+            rollup = cls(
+                work_order_id=work_order_id,
+                project_id=project_id,
+                items_cost=items.get(work_order_id) or 0,
+                stock_cost=stock.get(work_order_id) or 0,
+                expenses_cost=expenses.get(work_order_id) or 0
+            )
+            rollup.total_cost = rollup.items_cost + rollup.stock_cost + rollup.expenses_cost
+            rollups.append(rollup)
+        return rollups
+    
+    @classmethod
+    def refresh(cls, work_order_ids):
+        """
+        Recompute the rollups of the given work orders, dropping those of
+        work orders that no longer exist. Returns the rollups written.
+        """
+        from django.db import transaction
+        
+        rollups = cls.compute(work_order_ids)
+        deleted = set(work_order_ids) - {rollup.work_order_id for rollup in rollups}
+        with transaction.atomic():
+            if deleted:
+                cls.objects.filter(work_order_id__in=deleted).delete()
+            cls.objects.bulk_create(
+                rollups,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['work_order'],
+                update_fields=['project'] + cls.COST_FIELDS + ['updated_at']
+            )
+        return rollups
+
+
+class ProjectCost(models.Model):
+    """
+    Cost rollup of a project: the sum of its work order rollups plus the
+    approved expenses booked to the project without a work order.
+    """
+    project = models.OneToOneField(
+        'projects.Project',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='cost_rollup',
+        verbose_name=_('project')
+    )
+    work_order_count = models.PositiveIntegerField(_('work order count'), default=0)
+    items_cost = models.DecimalField(_('items cost'), max_digits=14, decimal_places=2, default=0)
+    stock_cost = models.DecimalField(_('stock cost'), max_digits=14, decimal_places=2, default=0)
+    expenses_cost = models.DecimalField(_('expenses cost'), max_digits=14, decimal_places=2, default=0)
+    total_cost = models.DecimalField(_('total cost'), max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('project cost')
+        verbose_name_plural = _('project costs')
+    
+    def __str__(self):
+        return f"{self.project_id}: {self.total_cost}"
+    
+    @classmethod
+    def compute(cls, project_ids):
+        """
+        Compute the rollups of the given projects from the work order
+        rollups and direct expenses. Returns unsaved instances.
+        """
+        from apps.billing.models import Expense
+        from apps.projects.models import Project
+        
+        work_orders = {
+            row['project_id']: row
+            for row in WorkOrderCost.objects.filter(project_id__in=project_ids).values('project_id').annotate(
+                count=models.Count('pk'),
+                items=models.Sum('items_cost'),
+                stock=models.Sum('stock_cost'),
+                expenses=models.Sum('expenses_cost')
+            )
+        }
+        direct_expenses = dict(
+            Expense.objects.filter(
+                project_id__in=project_ids,
+                work_order__isnull=True,
+                status__in=WorkOrderCost.EXPENSE_STATUSES
+            ).values('project_id').annotate(
+                total=models.Sum('total_amount')
+            ).values_list('project_id', 'total')
+        )
+        
+        rollups = []
+        for project_id in Project.objects.filter(pk__in=project_ids).values_list('pk', flat=True):
+            row = work_orders.get(project_id, {})
+            rollup = cls(
+                project_id=project_id,
+                work_order_count=row.get('count') or 0,
+                items_cost=row.get('items') or 0,
+                stock_cost=row.get('stock') or 0,
+                expenses_cost=(row.get('expenses') or 0) + (direct_expenses.get(project_id) or 0)
+            )
+            rollup.total_cost = rollup.items_cost + rollup.stock_cost + rollup.expenses_cost
+            rollups.append(rollup)
+        return rollups
+    
+    @classmethod
+    def refresh(cls, project_ids):
+        """Recompute the rollups of the given projects. Returns the rollups written."""
+        rollups = cls.compute(project_ids)
+        cls.objects.bulk_create(
+            rollups,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['project'],
+            update_fields=['work_order_count'] + WorkOrderCost.COST_FIELDS + ['updated_at']
+        )
+        return rollups
+
+
+class WorkOrderImportCheckpoint(models.Model):
+    """
+    Progress of a work order import (see apps.work_orders.importer). The row
+    is saved in the transaction of each imported chunk, so it always matches
+    the work orders actually committed.
+    """
+    name = models.CharField(_('name'), max_length=500, unique=True)
+    source = models.CharField(_('source'), max_length=500)
+    records_done = models.PositiveIntegerField(_('records done'), default=0)
+    work_orders = models.PositiveIntegerField(_('work orders'), default=0)
+    items = models.PositiveIntegerField(_('items'), default=0)
+    errors = models.PositiveIntegerField(_('errors'), default=0)
+    completed = models.BooleanField(_('completed'), default=False)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('work order import checkpoint')
+        verbose_name_plural = _('work order import checkpoints')
+    
+    def __str__(self):
+        return f"{self.name}: {self.records_done} records"
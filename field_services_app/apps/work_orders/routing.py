@@ -0,0 +1,320 @@
+"""
+Daily route planning for technicians.
+
+A technician's day is a set of stops (their assigned work orders with a
+position), each with a time window from the work order's scheduled start and
+end and a service time from its estimated duration. Stops are ordered to
+minimize lateness first and travel time second. Travel times come from a
+pluggable source, straight-line (haversine) distance at an average urban
+speed by default.
+"""
+
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+Stop = namedtuple('Stop', ['work_order_id', 'title', 'position', 'earliest', 'latest', 'duration'])
+
+# Routes with at most this many stops are solved exactly
+EXACT_STOP_LIMIT = 9
+
+# Assignment statuses that still need a visit
+ROUTED_ASSIGNMENT_STATUSES = ['pending', 'accepted', 'in_progress']
+
+# Start of the working day when the technician has no earlier commitment
+DEFAULT_DAY_START = time(8, 0)
+
+# Service time assumed for work orders without an estimated duration (minutes)
+DEFAULT_SERVICE_MINUTES = 60
+
+
+class HaversineTravelTime:
+    """
+    Travel time source using straight-line distance, stretched by a detour
+    factor and driven at an average speed. Distances come from the shared
+    distance matrix cache. Replace it with a router-backed callable with the
+    same signature for real road times; a `matrix(origins, destinations)`
+    method, when present, is used to fetch a whole route's legs at once.
+    """
+    
+    def __init__(self, speed_kmh=25.0, detour_factor=1.4):
+        self.speed_kmh = speed_kmh
+        self.detour_factor = detour_factor
+    
+    def _minutes(self, distance_km):
+        if distance_km is None:
+            return 0.0
+        return distance_km * self.detour_factor / self.speed_kmh * 60
+    
+    def __call__(self, origin, destination):
+        """Return the travel time in minutes between two (lat, lon) points."""
+        return self.matrix([origin], [destination])[0][0]
+    
+    def matrix(self, origins, destinations):
+        """Return the travel times in minutes from each origin to each destination."""
+        from apps.technicians.spatial import distance_matrix
+        
+        return [
+            [self._minutes(distance_km) for distance_km in row]
+            for row in distance_matrix.matrix(origins, destinations)
+        ]
+
+
+def _minutes(moment, day_start):
+    return (moment - day_start).total_seconds() / 60
+
+
+def _leg_matrix(stops, start_position, travel):
+    """
+    Return the travel minutes between stops as rows per origin: one row per
+    stop, then a last row for the start position.
+    """
+    origins = [stop.position for stop in stops] + [start_position]
+    destinations = [stop.position for stop in stops]
+    if hasattr(travel, 'matrix'):
+        return travel.matrix(origins, destinations)
+    return [[travel(origin, destination) for destination in destinations] for origin in origins]
+
+
+def _simulate(order, stops, start_minutes, legs):
+    """
+    Walk the stops in the given order. Returns (lateness, travel, visits),
+    visits being (stop, arrival, service start, travel minutes) tuples.
+    """
+    clock = start_minutes
+    current = len(stops)
+    total_lateness = 0.0
+    total_travel = 0.0
+    visits = []
+    for index in order:
+        stop = stops[index]
+        leg = legs[current][index]
+        arrival = clock + leg
+        service_start = max(arrival, stop.earliest)
+        total_lateness += max(0.0, service_start - stop.latest)
+        total_travel += leg
+        visits.append((stop, arrival, service_start, leg))
+        clock = service_start + stop.duration
+        current = index
+    return total_lateness, total_travel, visits
+
+
+def _exact_order(stops, start_minutes, legs):
+    """
+    Branch and bound over all orders, pruning on (lateness, travel). The
+    travel still to come is bounded below by the cheapest way into each
+    unvisited stop.
+    """
+    count = len(stops)
+    cheapest_in = [min(legs[origin][index] for origin in range(count + 1) if origin != index) for index in range(count)]
+    # Try the stops whose window opens first first, to find good bounds early
+    candidates = sorted(range(count), key=lambda index: stops[index].earliest)
+    best = [None, (float('inf'), float('inf'))]
+    
+    def visit(order, visited, clock, current, lateness, travelled, remaining_bound):
+        if (lateness, travelled + remaining_bound) >= best[1]:
+            return
+        if len(order) == count:
+            best[0], best[1] = list(order), (lateness, travelled)
+            return
+        for index in candidates:
+            if visited & (1 << index):
+                continue
+            stop = stops[index]
+            leg = legs[current][index]
+            service_start = max(clock + leg, stop.earliest)
+            order.append(index)
+            visit(
+                order, visited | (1 << index), service_start + stop.duration, index,
+                lateness + max(0.0, service_start - stop.latest), travelled + leg,
+                remaining_bound - cheapest_in[index]
+            )
+            order.pop()
+    
+    visit([], 0, start_minutes, count, 0.0, 0.0, sum(cheapest_in))
+    return best[0]
+
+
+def _heuristic_order(stops, start_minutes, legs):
+    """Order by window opening, then improve with 2-opt moves until stable."""
+    order = sorted(range(len(stops)), key=lambda index: (stops[index].earliest, stops[index].latest))
+    best_cost = _simulate(order, stops, start_minutes, legs)[:2]
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                cost = _simulate(candidate, stops, start_minutes, legs)[:2]
+                if cost < best_cost:
+                    order, best_cost, improved = candidate, cost, True
+    return order
+
+
+def optimize_route(stops, day_start, start_position=None, travel=None):
+    """
+    Order the stops of one day.
+    
+    Returns a dict with the total lateness and travel (minutes) and the
+    sequence of stops with their ETAs.
+    """
+    travel = travel or HaversineTravelTime()
+    start_minutes = 0.0
+    legs = _leg_matrix(stops, start_position, travel)
+    if len(stops) <= EXACT_STOP_LIMIT:
+        order = _exact_order(stops, start_minutes, legs) or []
+    else:
+        order = _heuristic_order(stops, start_minutes, legs)
+    
+    lateness, total_travel, visits = _simulate(order, stops, start_minutes, legs)
+    return {
+        'total_travel_minutes': round(total_travel, 1),
+        'total_lateness_minutes': round(lateness, 1),
+        'sequence': [
+            {
+                'work_order_id': stop.work_order_id,
+                'title': stop.title,
+                'travel_minutes': round(leg, 1),
+                'eta': day_start + timedelta(minutes=arrival),
+                'service_start': day_start + timedelta(minutes=service_start),
+                'service_end': day_start + timedelta(minutes=service_start + stop.duration),
+                'late_minutes': round(max(0.0, service_start - stop.latest), 1),
+            }
+            for stop, arrival, service_start, leg in visits
+        ],
+    }
+
+
+def day_stops(technician_ids, date):
+    """
+    Load the stops of the given technicians' assignments on a date.
+    Returns the day start and a {technician_id: [Stop, ...]} dict.
+    """
+    from .models import WorkOrderAssignment
+    
+    day_start = timezone.make_aware(datetime.combine(date, DEFAULT_DAY_START))
+    day_end = timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min))
+    
+    stops = {technician_id: [] for technician_id in technician_ids}
+    assignments = WorkOrderAssignment.objects.filter(
+        technician_id__in=technician_ids,
+        status__in=ROUTED_ASSIGNMENT_STATUSES,
+        work_order__scheduled_start__gte=timezone.make_aware(datetime.combine(date, time.min)),
+        work_order__scheduled_start__lt=day_end
+    ).select_related('work_order')
+    
+    for assignment in assignments:
+        work_order = assignment.work_order
+        position = None
+        if work_order.latitude is not None and work_order.longitude is not None:
+            position = (float(work_order.latitude), float(work_order.longitude))
+        duration = work_order.estimated_duration or DEFAULT_SERVICE_MINUTES
+        earliest = max(0.0, _minutes(work_order.scheduled_start, day_start))
+        latest = earliest
+        if work_order.scheduled_end:
+            latest = max(earliest, _minutes(work_order.scheduled_end, day_start) - duration)
+        stops[assignment.technician_id].append(Stop(
+            work_order.pk, work_order.title, position, earliest, latest, duration
+        ))
+    return day_start, stops
+
+
+def start_positions(technician_ids):
+    """Return the technicians' last known positions as a {technician_id: (lat, lon)} dict."""
+    from apps.technicians.models import TechnicianLastLocation
+    
+    return {
+        technician_id: (latitude, longitude)
+        for technician_id, latitude, longitude in TechnicianLastLocation.objects.filter(
+            technician_id__in=technician_ids
+        ).values_list('technician_id', 'latitude', 'longitude')
+    }
+
+
+def plan_day(technician_id, date, travel=None):
+    """Plan one technician's route for a date, starting from their last known position."""
+    day_start, stops = day_stops([technician_id], date)
+    position = start_positions([technician_id]).get(technician_id)
+    return optimize_route(stops[technician_id], day_start, position, travel)
+
+
+def rebalance_team(technician_ids, date, travel=None, max_rounds=50):
+    """
+    Move a team's jobs for a date between its technicians to minimize the
+    total lateness and then travel time.
+    
+    Jobs are only moved to technicians holding the work order's required
+    specialties and valid certifications. Each round tries moving every job
+    to every other technician and keeps the best improving move.
+    
+    Returns {'moves': [...], 'routes': {technician_id: route}}.
+    """
+    from .dispatch import Fleet, job_requirements
+    from apps.technicians.models import Technician
+    from .models import WorkOrder
+    
+    travel = travel or HaversineTravelTime()
+    day_start, stops = day_stops(technician_ids, date)
+    positions = start_positions(technician_ids)
+    
+    # Technicians able to serve each job
+    fleet = Fleet(Technician.objects.filter(pk__in=technician_ids), on_date=date)
+    work_order_ids = [stop.work_order_id for team_stops in stops.values() for stop in team_stops]
+    jobs = job_requirements(WorkOrder.objects.filter(pk__in=work_order_ids))
+    fleet.load_distances(jobs)
+    eligible = {}
+    for job in jobs:
+        eligible[job['work_order'].pk] = {
+            technician['id'] for technician in fleet.technicians.values()
+            if fleet.score(technician, job) is not None
+        }
+    
+    # The same technician and job set is costed many times across rounds
+    cost_cache = {}
+    
+    def route_cost(technician_id, technician_stops):
+        key = (technician_id, frozenset(stop.work_order_id for stop in technician_stops))
+        if key not in cost_cache:
+            route = optimize_route(technician_stops, day_start, positions.get(technician_id), travel)
+            cost_cache[key] = (route['total_lateness_minutes'], route['total_travel_minutes'])
+        return cost_cache[key]
+    
+    costs = {technician_id: route_cost(technician_id, stops[technician_id]) for technician_id in technician_ids}
+    moves = []
+    for _ in range(max_rounds):
+        best_move = None
+        best_gain = (0.0, 0.0)
+        for source in technician_ids:
+            for stop in stops[source]:
+                remaining = [other for other in stops[source] if other is not stop]
+                source_cost = route_cost(source, remaining)
+                for target in eligible.get(stop.work_order_id, ()):
+                    if target == source or target not in stops:
+                        continue
+                    # A crew member already holding a shared work order cannot take it over
+                    if any(other.work_order_id == stop.work_order_id for other in stops[target]):
+                        continue
+                    target_cost = route_cost(target, stops[target] + [stop])
+                    gain = (
+                        costs[source][0] + costs[target][0] - source_cost[0] - target_cost[0],
+                        costs[source][1] + costs[target][1] - source_cost[1] - target_cost[1],
+                    )
+                    if gain > best_gain:
+                        best_gain = gain
+                        best_move = (stop, source, target, remaining, source_cost, target_cost)
+        if best_move is None:
+            break
+        stop, source, target, remaining, source_cost, target_cost = best_move
+        stops[source] = remaining
+        stops[target] = stops[target] + [stop]
+        costs[source], costs[target] = source_cost, target_cost
+        moves.append({'work_order_id': stop.work_order_id, 'from_technician_id': source, 'to_technician_id': target})
+    
+    return {
+        'moves': moves,
+        'routes': {
+            technician_id: optimize_route(stops[technician_id], day_start, positions.get(technician_id), travel)
+            for technician_id in technician_ids
+        },
+    }
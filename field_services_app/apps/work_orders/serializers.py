@@ -0,0 +1,223 @@
+import os
+import re
+
+from rest_framework import serializers
+from .models import (
+    WorkOrder,
+    WorkOrderItem,
+    WorkOrderAssignment,
+    WorkOrderStatus,
+    WorkOrderAttachment,
+    WorkOrderSignature,
+    WorkOrderUpload,
+    WorkOrderCost,
+)
+
+
+class WorkOrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkOrderItem
+        fields = [
+            'id', 'work_order', 'type', 'item', 'description', 'quantity', 'unit_price',
+            'total_price', 'notes', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['total_price']
+
+
+class WorkOrderAssignmentSerializer(serializers.ModelSerializer):
+    """
+    Serializer for work order assignments. Expects the technician, its user
+    and assigned_by to be fetched with the assignment (see
+    WorkOrderAssignmentViewSet and WorkOrderQuerySet.with_crew()).
+    """
+    technician_name = serializers.CharField(source='technician.full_name', read_only=True)
+    technician_email = serializers.SerializerMethodField()
+    assigned_by_name = serializers.SerializerMethodField()
+    allow_conflicts = serializers.BooleanField(write_only=True, required=False, default=False)
+    
+    class Meta:
+        model = WorkOrderAssignment
+        fields = [
+            'id', 'work_order', 'technician', 'technician_name', 'technician_email', 'status',
+            'assigned_by', 'assigned_by_name', 'assigned_at', 'accepted_at', 'started_at',
+            'completed_at', 'notes', 'allow_conflicts'
+        ]
+        read_only_fields = ['assigned_by', 'assigned_at']
+    
+    def validate(self, attrs):
+        """
+        Refuse to double-book the technician: an active assignment may not
+        overlap their other active assignments, unless `allow_conflicts` is
+        set, in which case the overlaps are returned under `conflicts`.
+        """
+        from .conflicts import check_assignment, conflict_messages
+        
+        allow_conflicts = attrs.pop('allow_conflicts', False)
+        instance = self.instance
+        work_order = attrs.get('work_order', instance.work_order if instance else None)
+        technician = attrs.get('technician', instance.technician if instance else None)
+        status = attrs.get('status', instance.status if instance else 'pending')
+        
+        self.conflicts = []
+        changed = instance is None or any(
+            name in attrs and attrs[name] != getattr(instance, name)
+            for name in ['work_order', 'technician', 'status']
+        )
+        if not (changed and work_order and technician):
+            return attrs
+        
+        self.conflicts = check_assignment(technician.pk, work_order, status)
+        if self.conflicts and not allow_conflicts:
+            raise serializers.ValidationError({
+                'technician': conflict_messages(technician.full_name, self.conflicts)
+            })
+        return attrs
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if getattr(self, 'conflicts', None):
+            data['conflicts'] = self.conflicts
+        return data
+    
+    def get_technician_email(self, obj):
+        """Get the technician's email, falling back to their user account's."""
+        technician = obj.technician
+        if technician.email:
+            return technician.email
+        return technician.user.email if technician.user else None
+    
+    def get_assigned_by_name(self, obj):
+        return obj.assigned_by.get_full_name() if obj.assigned_by else None
+
+
+class WorkOrderCostSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkOrderCost
+        fields = ['items_cost', 'stock_cost', 'expenses_cost', 'total_cost', 'updated_at']
+
+
+class WorkOrderSerializer(serializers.ModelSerializer):
+    """
+    Serializer for work orders with their crew. Querysets should come from
+    WorkOrderQuerySet.with_crew() so the assignments are not fetched once
+    per work order.
+    """
+    assignments = WorkOrderAssignmentSerializer(many=True, read_only=True)
+    cost_rollup = WorkOrderCostSerializer(read_only=True)
+    is_overdue = serializers.SerializerMethodField()
+    allow_conflicts = serializers.BooleanField(write_only=True, required=False, default=False)
+    
+    class Meta:
+        model = WorkOrder
+        fields = [
+            'id', 'title', 'description', 'project', 'customer', 'contact', 'status', 'priority',
+            'type', 'location', 'latitude', 'longitude', 'required_specialties',
+            'required_certifications', 'scheduled_start', 'scheduled_end', 'actual_start',
+            'actual_end', 'estimated_duration', 'estimated_cost', 'actual_cost', 'cost_rollup',
+            'is_overdue', 'assignments', 'created_by', 'created_at', 'updated_at', 'allow_conflicts'
+        ]
+        read_only_fields = ['created_by']
+    
+    def validate(self, attrs):
+        """
+        Refuse to reschedule a crewed work order into its technicians' other
+        active assignments, unless `allow_conflicts` is set, in which case
+        the overlaps are returned under `conflicts`.
+        """
+        import copy
+        from .conflicts import check_schedule, conflict_messages
+        
+        allow_conflicts = attrs.pop('allow_conflicts', False)
+        self.conflicts = []
+        schedule_fields = ['scheduled_start', 'scheduled_end', 'estimated_duration']
+        instance = self.instance
+        if instance is None or not any(
+            name in attrs and attrs[name] != getattr(instance, name) for name in schedule_fields
+        ):
+            return attrs
+        
+        rescheduled = copy.copy(instance)
+        for name in schedule_fields:
+            setattr(rescheduled, name, attrs.get(name, getattr(instance, name)))
+        self.conflicts = check_schedule(rescheduled)
+        if self.conflicts and not allow_conflicts:
+            names = dict(instance.assignments.values_list('technician_id', 'technician__full_name'))
+            raise serializers.ValidationError({
+                'scheduled_start': [
+                    message
+                    for booking in self.conflicts
+                    for message in conflict_messages(names[booking['technician_id']], booking['conflicts'])
+                ]
+            })
+        return attrs
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if getattr(self, 'conflicts', None):
+            data['conflicts'] = self.conflicts
+        return data
+    
+    def get_is_overdue(self, obj):
+        return bool(obj.is_overdue)
+
+
+class WorkOrderStatusSerializer(serializers.ModelSerializer):
+    changed_by_name = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = WorkOrderStatus
+        fields = ['id', 'work_order', 'status', 'changed_by', 'changed_by_name', 'changed_at', 'notes']
+    
+    def get_changed_by_name(self, obj):
+        return obj.changed_by.get_full_name() if obj.changed_by else None
+
+
+class WorkOrderUploadSerializer(serializers.ModelSerializer):
+    """
+    Serializer for resumable uploads. `metadata` holds the fields of the
+    attachment (type, name, description) or signature (signer_name,
+    signer_title, signer_type, notes) created when the upload is finalized.
+    """
+    
+    class Meta:
+        model = WorkOrderUpload
+        fields = [
+            'id', 'work_order', 'kind', 'file_name', 'total_size', 'sha256', 'received_size',
+            'status', 'metadata', 'attachment', 'signature', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['received_size', 'status', 'attachment', 'signature']
+    
+    def validate_file_name(self, value):
+        # Only the base name is kept, client paths never reach the storage
+        value = os.path.basename(value.replace('\\', '/'))
+        if not value:
+            raise serializers.ValidationError("A file name is required.")
+        return value
+    
+    def validate_total_size(self, value):
+        if not 0 < value <= WorkOrderUpload.MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Size must be between 1 and {WorkOrderUpload.MAX_SIZE} bytes."
+            )
+        return value
+    
+    def validate_sha256(self, value):
+        if not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError("Must be a hex-encoded SHA-256 digest.")
+        return value.lower()
+    
+    def validate(self, attrs):
+        metadata = attrs.get('metadata') or {}
+        if not isinstance(metadata, dict):
+            raise serializers.ValidationError({'metadata': "Must be an object."})
+        if attrs.get('kind') == 'signature':
+            if not metadata.get('signer_name'):
+                raise serializers.ValidationError({'metadata': "signer_name is required for signatures."})
+            signer_types = [choice for choice, _label in WorkOrderSignature.TYPE_CHOICES]
+            if metadata.get('signer_type', 'customer') not in signer_types:
+                raise serializers.ValidationError({'metadata': f"signer_type must be one of {signer_types}."})
+        else:
+            types = [choice for choice, _label in WorkOrderAttachment.TYPE_CHOICES]
+            if metadata.get('type', 'photo') not in types:
+                raise serializers.ValidationError({'metadata': f"type must be one of {types}."})
+        return attrs
@@ -0,0 +1,114 @@
+"""
+Signal handlers for the work_orders app.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.billing.models import Expense
+from apps.inventory.models import InventoryTransaction
+
+from .costs import refresh_costs
+from .models import WorkOrder, WorkOrderItem
+
+
+def refresh_costs_on_commit(work_order_ids=(), project_ids=()):
+    """
+    Refresh the cost rollups once the current transaction commits, so a
+    rollup never counts rows that are rolled back and work orders deleted
+    in the same transaction are simply skipped.
+    """
+    work_order_ids = {pk for pk in work_order_ids if pk}
+    project_ids = {pk for pk in project_ids if pk}
+    if work_order_ids or project_ids:
+        transaction.on_commit(lambda: refresh_costs(work_order_ids, project_ids))
+
+
+@receiver(pre_save, sender=WorkOrderItem)
+@receiver(pre_save, sender=InventoryTransaction)
+def remember_cost_work_order(sender, instance, **kwargs):
+    """
+    Signal handler to remember which work order a cost row counted on
+    before it is saved, in case it moves to another one.
+    """
+    instance._previous_cost_work_order_id = None
+    if instance.pk:
+        instance._previous_cost_work_order_id = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('work_order_id', flat=True).first()
+
+
+@receiver(post_save, sender=WorkOrderItem)
+@receiver(post_delete, sender=WorkOrderItem)
+@receiver(post_save, sender=InventoryTransaction)
+@receiver(post_delete, sender=InventoryTransaction)
+def update_work_order_costs(sender, instance, **kwargs):
+    """
+    Signal handler to refresh the cost rollups of the work orders an item
+    or inventory transaction counts on.
+    """
+    refresh_costs_on_commit(
+        [instance.work_order_id, getattr(instance, '_previous_cost_work_order_id', None)]
+    )
+
+
+@receiver(pre_save, sender=Expense)
+def remember_expense_cost_keys(sender, instance, **kwargs):
+    """
+    Signal handler to remember the work order and project an expense
+    counted on before it is saved.
+    """
+    instance._previous_cost_keys = None
+    if instance.pk:
+        instance._previous_cost_keys = sender.objects.filter(pk=instance.pk).values_list(
+            'work_order_id', 'project_id'
+        ).first()
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def update_expense_costs(sender, instance, **kwargs):
+    """
+    Signal handler to refresh the cost rollups of an expense's work order,
+    or of its project when it is booked directly to one.
+    """
+    work_order_ids = [instance.work_order_id]
+    project_ids = [instance.project_id]
+    previous = getattr(instance, '_previous_cost_keys', None)
+    if previous:
+        work_order_ids.append(previous[0])
+        project_ids.append(previous[1])
+    refresh_costs_on_commit(work_order_ids, project_ids)
+
+
+@receiver(pre_save, sender=WorkOrder)
+def remember_work_order_project(sender, instance, **kwargs):
+    """
+    Signal handler to remember a work order's stored project, so that
+    moving it updates both projects' rollups.
+    """
+    instance._previous_project_id = None
+    if instance.pk:
+        instance._previous_project_id = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('project_id', flat=True).first()
+
+
+@receiver(post_save, sender=WorkOrder)
+def update_work_order_project_costs(sender, instance, created, **kwargs):
+    """
+    Signal handler to create the rollup of a new work order and to move a
+    work order's costs when its project changes.
+    """
+    previous = getattr(instance, '_previous_project_id', None)
+    if created or (previous and previous != instance.project_id):
+        refresh_costs_on_commit([instance.pk], [previous])
+
+
+@receiver(post_delete, sender=WorkOrder)
+def update_deleted_work_order_project_costs(sender, instance, **kwargs):
+    """
+    Signal handler to take a deleted work order's costs off its project.
+    """
+    refresh_costs_on_commit(project_ids=[instance.project_id])
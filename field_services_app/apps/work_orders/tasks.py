@@ -0,0 +1,13 @@
+"""
+Celery tasks for the work_orders app.
+"""
+
+from celery import shared_task
+
+
+@shared_task
+def reconcile_cost_rollups():
+    """Nightly cost rollup reconciliation, see costs.reconcile_costs."""
+    from .costs import reconcile_costs
+    
+    return reconcile_costs()
@@ -0,0 +1,130 @@
+"""
+Work order status transitions.
+
+Every status change goes through transition() or bulk_transition(), which
+check the move against TRANSITIONS, update the work order and append a
+WorkOrderStatus history row in the same transaction.
+"""
+
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import WorkOrder, WorkOrderStatus
+
+# Allowed moves from each status
+TRANSITIONS = {
+    'draft': ['pending', 'cancelled'],
+    'pending': ['scheduled', 'on_hold', 'cancelled'],
+    'scheduled': ['pending', 'in_progress', 'on_hold', 'cancelled'],
+    'in_progress': ['on_hold', 'completed', 'cancelled'],
+    'on_hold': ['pending', 'scheduled', 'in_progress', 'cancelled'],
+    'completed': ['in_progress', 'invoiced'],
+    'cancelled': ['draft'],
+    'invoiced': ['paid'],
+    'paid': [],
+}
+
+# Timestamps filled in, unless already set, when entering a status
+STATUS_TIMESTAMPS = {
+    'in_progress': 'actual_start',
+    'completed': 'actual_end',
+}
+
+
+class InvalidTransition(ValueError):
+    """Raised when a work order cannot move to the requested status."""
+
+
+def allowed_sources(to_status):
+    """Return the statuses a work order can move to `to_status` from."""
+    return [status for status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def check_transition(from_status, to_status):
+    """Raise InvalidTransition unless moving from `from_status` to `to_status` is allowed."""
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown status: {to_status}")
+    if to_status not in TRANSITIONS.get(from_status, []):
+        raise InvalidTransition(f"Cannot move a work order from {from_status} to {to_status}")
+
+
+def transition(work_order, to_status, user=None, notes=''):
+    """
+    Move one work order to `to_status` and record it in its status history.
+    The work order row is locked while it changes, so concurrent moves are
+    checked against the latest status.
+    """
+    with transaction.atomic():
+        locked = WorkOrder.objects.select_for_update().get(pk=work_order.pk)
+        check_transition(locked.status, to_status)
+        
+        now = timezone.now()
+        locked.status = to_status
+        update_fields = ['status', 'updated_at']
+        timestamp_field = STATUS_TIMESTAMPS.get(to_status)
+        if timestamp_field and getattr(locked, timestamp_field) is None:
+            setattr(locked, timestamp_field, now)
+            update_fields.append(timestamp_field)
+        locked.save(update_fields=update_fields)
+        
+        WorkOrderStatus.objects.create(work_order=locked, status=to_status, changed_by=user, notes=notes)
+    
+    for field in update_fields:
+        setattr(work_order, field, getattr(locked, field))
+    return work_order
+
+
+def bulk_transition(work_order_ids, to_status, user=None, notes=''):
+    """
+    Move many work orders to `to_status` with set-based updates and a single
+    insert of history rows.
+    
+    Work orders that cannot make the move are left untouched and reported.
+    Returns {'transitioned': [ids], 'rejected': [{'id', 'status', 'error'}]}.
+    """
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown status: {to_status}")
+    sources = allowed_sources(to_status)
+    work_order_ids = list(dict.fromkeys(work_order_ids))
+    
+    with transaction.atomic():
+        current = dict(
+            WorkOrder.objects.select_for_update().filter(
+                pk__in=work_order_ids
+            ).values_list('pk', 'status')
+        )
+        
+        transitioned = []
+        rejected = []
+        for work_order_id in work_order_ids:
+            status = current.get(work_order_id)
+            if status is None:
+                rejected.append({'id': work_order_id, 'status': None, 'error': "Work order not found"})
+            elif status not in sources:
+                rejected.append({
+                    'id': work_order_id,
+                    'status': status,
+                    'error': f"Cannot move a work order from {status} to {to_status}",
+                })
+            else:
+                transitioned.append(work_order_id)
+        
+        if transitioned:
+            now = timezone.now()
+            changes = {'status': to_status, 'updated_at': now}
+            timestamp_field = STATUS_TIMESTAMPS.get(to_status)
+            if timestamp_field:
+                changes[timestamp_field] = Coalesce(timestamp_field, Value(now))
+            WorkOrder.objects.filter(pk__in=transitioned).update(**changes)
+            
+            WorkOrderStatus.objects.bulk_create(
+                [
+                    WorkOrderStatus(work_order_id=work_order_id, status=to_status, changed_by=user, notes=notes)
+                    for work_order_id in transitioned
+                ],
+                batch_size=1000
+            )
+    
+    return {'transitioned': transitioned, 'rejected': rejected}
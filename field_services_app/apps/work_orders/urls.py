@@ -5,9 +5,11 @@ from . import views
 app_name = 'work_orders'
 
 router = DefaultRouter()
-router.register('', views.WorkOrderViewSet, basename='order')
+# Prefixed viewsets go first, or the work order detail route would match them
 router.register('items', views.WorkOrderItemViewSet, basename='item')
 router.register('assignments', views.WorkOrderAssignmentViewSet, basename='assignment')
+router.register('uploads', views.WorkOrderUploadViewSet, basename='upload')
+router.register('', views.WorkOrderViewSet, basename='order')
 
 urlpatterns = [
     path('', include(router.urls)),
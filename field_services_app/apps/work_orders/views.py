@@ -1,8 +1,20 @@
-from rest_framework import viewsets
+from django.db import transaction
+import re
+
+from rest_framework import mixins, serializers, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from .models import WorkOrder, WorkOrderItem, WorkOrderAssignment
-# If serializers.py is created, uncomment this line
-# from .serializers import WorkOrderSerializer, WorkOrderItemSerializer, WorkOrderAssignmentSerializer
+from rest_framework.response import Response
+from .dispatch import OPEN_STATUSES, Fleet, dispatch_batch, rank_candidates
+from .models import WorkOrder, WorkOrderItem, WorkOrderAssignment, WorkOrderStatus, WorkOrderUpload
+from .serializers import (
+    WorkOrderSerializer,
+    WorkOrderItemSerializer,
+    WorkOrderAssignmentSerializer,
+    WorkOrderStatusSerializer,
+    WorkOrderUploadSerializer,
+)
+from .transitions import InvalidTransition, bulk_transition, transition
 
 class WorkOrderViewSet(viewsets.ModelViewSet):
     """
@@ -11,9 +23,238 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
     Provides CRUD operations for the WorkOrder model.
     """
     queryset = WorkOrder.objects.all()
-    # When serializer is created, uncomment this line
-    # serializer_class = WorkOrderSerializer
+    serializer_class = WorkOrderSerializer
     permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        
+        # Listings serialize every work order's crew and requirements, so
+        # fetch them up front instead of once per work order
+        if self.action in ['list', 'retrieve']:
+            queryset = queryset.with_crew().select_related('cost_rollup').prefetch_related(
+                'required_specialties', 'required_certifications'
+            )
+        
+        # Filter on overdue status, evaluated in SQL
+        overdue = self.request.query_params.get('overdue', None)
+        if overdue is not None:
+            if overdue.lower() in ['true', '1', 'yes']:
+                queryset = queryset.overdue()
+            elif overdue.lower() in ['false', '0', 'no']:
+                queryset = queryset.exclude(pk__in=WorkOrder.objects.overdue().values('pk'))
+        
+        return queryset
+    
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            work_order = serializer.save(created_by=self.request.user)
+            WorkOrderStatus.objects.create(
+                work_order=work_order,
+                status=work_order.status,
+                changed_by=self.request.user,
+                notes="Created"
+            )
+    
+    def perform_update(self, serializer):
+        # Status changes go through the transition rules and status history
+        to_status = serializer.validated_data.pop('status', None)
+        with transaction.atomic():
+            work_order = serializer.save()
+            if to_status and to_status != work_order.status:
+                try:
+                    transition(work_order, to_status, user=self.request.user)
+                except InvalidTransition as exc:
+                    raise serializers.ValidationError({'status': [str(exc)]})
+    
+    @action(detail=True, methods=['post'], url_path='transition')
+    def change_status(self, request, pk=None):
+        """Move the work order to another status (`status`, optional `notes`)."""
+        work_order = self.get_object()
+        try:
+            transition(
+                work_order,
+                request.data.get('status'),
+                user=request.user,
+                notes=request.data.get('notes', '')
+            )
+        except InvalidTransition as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        work_order = self.get_queryset().get(pk=work_order.pk)
+        return Response(self.get_serializer(work_order).data)
+    
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Get the work order's status history, most recent first."""
+        work_order = self.get_object()
+        history = work_order.status_history.select_related('changed_by')
+        return Response(WorkOrderStatusSerializer(history, many=True).data)
+    
+    @action(detail=False, methods=['post'], url_path='bulk-transition')
+    def bulk_change_status(self, request):
+        """
+        Move many work orders to a status at once (`work_order_ids`,
+        `status`, optional `notes`). Work orders that cannot make the move
+        are left unchanged and listed under `rejected`.
+        """
+        work_order_ids = request.data.get('work_order_ids')
+        if not isinstance(work_order_ids, list) or not work_order_ids:
+            return Response(
+                {"error": "work_order_ids must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            work_order_ids = [int(work_order_id) for work_order_id in work_order_ids]
+        except (ValueError, TypeError):
+            return Response(
+                {"error": "work_order_ids must be a list of integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            result = bulk_transition(
+                work_order_ids,
+                request.data.get('status'),
+                user=request.user,
+                notes=request.data.get('notes', '')
+            )
+        except InvalidTransition as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
+    @action(detail=False, methods=['get'], url_path='overdue-count')
+    def overdue_count(self, request):
+        """
+        Count the overdue work orders, in total and by priority, for the
+        dashboard. Answered with a single aggregate over the (status,
+        scheduled_end) index.
+        """
+        from django.db.models import Count, Q
+        
+        counts = WorkOrder.objects.overdue().aggregate(
+            total=Count('pk'),
+            **{
+                priority: Count('pk', filter=Q(priority=priority))
+                for priority, _label in WorkOrder.PRIORITY_CHOICES
+            }
+        )
+        total = counts.pop('total')
+        return Response({'count': total, 'by_priority': counts})
+    
+    @action(detail=True, methods=['get'])
+    def candidates(self, request, pk=None):
+        """
+        Propose the best technicians for this work order, scored on skills,
+        valid certifications, distance, load, rating and availability.
+        """
+        work_order = self.get_object()
+        try:
+            limit = min(int(request.query_params.get('limit', 5)), 50)
+        except (ValueError, TypeError):
+            limit = 5
+        return Response(rank_candidates(work_order, limit=limit))
+    
+    @action(detail=False, methods=['post'], url_path='dispatch')
+    def batch_dispatch(self, request):
+        """
+        Solve many open work orders against the whole fleet at once.
+        
+        Takes optional `work_order_ids` (all open work orders by default),
+        `capacity` (new work orders per technician, default 1) and `apply`
+        (create pending assignments for the proposals, default false).
+        
+        Proposals that would double-book their technician are reported under
+        `conflicts`, and not applied unless `allow_conflicts` is set.
+        """
+        from apps.technicians.spatial import distance_matrix
+        from .conflicts import check_assignment, check_assignments
+        
+        work_orders = WorkOrder.objects.filter(status__in=OPEN_STATUSES)
+        work_order_ids = request.data.get('work_order_ids')
+        if work_order_ids is not None:
+            if not isinstance(work_order_ids, list):
+                return Response(
+                    {"error": "work_order_ids must be a list"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                work_order_ids = [int(work_order_id) for work_order_id in work_order_ids]
+            except (ValueError, TypeError):
+                return Response(
+                    {"error": "work_order_ids must be a list of integers"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            work_orders = work_orders.filter(pk__in=work_order_ids)
+        
+        try:
+            capacity = int(request.data.get('capacity', 1))
+        except (ValueError, TypeError):
+            capacity = 0
+        if not 1 <= capacity <= 10:
+            return Response(
+                {"error": "capacity must be between 1 and 10"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        proposals = dispatch_batch(work_orders, capacity=capacity, fleet=Fleet())
+        proposed = [proposal for proposal in proposals if proposal['proposal']]
+        
+        applied = 0
+        if request.data.get('apply'):
+            from apps.technicians.models import Technician
+            
+            allow_conflicts = bool(request.data.get('allow_conflicts'))
+            conflicts = []
+            with transaction.atomic():
+                # Work orders crewed since the proposals were made are left
+                # alone, so applying the same dispatch twice adds no one
+                locked = WorkOrder.objects.select_for_update().in_bulk(
+                    [proposal['work_order_id'] for proposal in proposed]
+                )
+                crewed = set(
+                    WorkOrderAssignment.objects.filter(
+                        work_order_id__in=list(locked),
+                        status__in=Technician.ACTIVE_ASSIGNMENT_STATUSES
+                    ).values_list('work_order_id', flat=True)
+                )
+                for proposal in proposed:
+                    # Work orders deleted since the proposals were made are skipped
+                    if proposal['work_order_id'] in crewed or proposal['work_order_id'] not in locked:
+                        continue
+                    technician_id = proposal['proposal']['technician_id']
+                    # Checked one by one, so the assignments created so far count
+                    booked = check_assignment(technician_id, locked[proposal['work_order_id']])
+                    if booked:
+                        conflicts.append({
+                            'technician_id': technician_id,
+                            'work_order_id': proposal['work_order_id'],
+                            'conflicts': booked,
+                        })
+                        if not allow_conflicts:
+                            continue
+                    _assignment, created = WorkOrderAssignment.objects.get_or_create(
+                        work_order_id=proposal['work_order_id'],
+                        technician_id=technician_id,
+                        defaults={'assigned_by': request.user}
+                    )
+                    applied += created
+        else:
+            work_order_map = WorkOrder.objects.in_bulk([proposal['work_order_id'] for proposal in proposed])
+            conflicts = check_assignments([
+                (proposal['proposal']['technician_id'], work_order_map[proposal['work_order_id']])
+                for proposal in proposed
+                if proposal['work_order_id'] in work_order_map
+            ])
+        
+        return Response({
+            'assigned': len(proposed),
+            'unassigned': len(proposals) - len(proposed),
+            'applied': applied,
+            'proposals': proposals,
+            'conflicts': conflicts,
+            'distance_cache': distance_matrix.stats(),
+        })
 
 class WorkOrderItemViewSet(viewsets.ModelViewSet):
     """
@@ -22,8 +263,7 @@ class WorkOrderItemViewSet(viewsets.ModelViewSet):
     Provides CRUD operations for the WorkOrderItem model.
     """
     queryset = WorkOrderItem.objects.all()
-    # When serializer is created, uncomment this line
-    # serializer_class = WorkOrderItemSerializer
+    serializer_class = WorkOrderItemSerializer
     permission_classes = [IsAuthenticated]
 
 class WorkOrderAssignmentViewSet(viewsets.ModelViewSet):
@@ -32,7 +272,129 @@ class WorkOrderAssignmentViewSet(viewsets.ModelViewSet):
     
     Provides CRUD operations for the WorkOrderAssignment model.
     """
-    queryset = WorkOrderAssignment.objects.all()
-    # When serializer is created, uncomment this line
-    # serializer_class = WorkOrderAssignmentSerializer
+    queryset = WorkOrderAssignment.objects.select_related('technician__user', 'assigned_by')
+    serializer_class = WorkOrderAssignmentSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        serializer.save(assigned_by=self.request.user)
+    
+    @action(detail=False, methods=['get'])
+    def conflicts(self, request):
+        """
+        Report the technicians double-booked by overlapping active
+        assignments over the next `days` days (default 30, at most 366) from
+        `start` (an ISO date or datetime, default now).
+        """
+        from datetime import datetime
+        from django.utils import timezone
+        from .conflicts import SCAN_DAYS, scan_conflicts
+        
+        try:
+            days = int(request.query_params.get('days', SCAN_DAYS))
+        except (ValueError, TypeError):
+            days = 0
+        if not 1 <= days <= 366:
+            return Response({"error": "days must be between 1 and 366"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        start = request.query_params.get('start')
+        if start:
+            try:
+                start = datetime.fromisoformat(start)
+            except ValueError:
+                return Response(
+                    {"error": "Invalid start. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM)"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(start):
+                start = timezone.make_aware(start)
+        
+        report = scan_conflicts(start=start, days=days)
+        return Response({'count': len(report), 'conflicts': report})
+
+class WorkOrderUploadViewSet(mixins.CreateModelMixin,
+                             mixins.RetrieveModelMixin,
+                             mixins.DestroyModelMixin,
+                             viewsets.GenericViewSet):
+    """
+    API endpoint for resumable uploads of work order attachments and
+    signatures.
+    
+    POST creates an upload from the file's name, size and SHA-256, PUT sends
+    a byte range (`Content-Range: bytes start-end/total`, raw body), GET
+    reports how many bytes were received so an interrupted upload can carry
+    on from there, `finalize` registers the file and DELETE cancels.
+    """
+    serializer_class = WorkOrderUploadSerializer
     permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        queryset = WorkOrderUpload.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
+    
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+    
+    def perform_destroy(self, instance):
+        instance.cancel()
+    
+    def update(self, request, pk=None):
+        """Write one byte range of the file, streamed from the request body."""
+        upload = self.get_object()
+        if upload.status != 'open':
+            return Response({"error": f"Upload is {upload.status}"}, status=status.HTTP_409_CONFLICT)
+        
+        match = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+)', request.headers.get('Content-Range', ''))
+        if not match:
+            return Response(
+                {"error": "A Content-Range header (bytes start-end/total) is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start, end, total = (int(value) for value in match.groups())
+        if end < start or total != upload.total_size:
+            return Response(
+                {"error": "Invalid Content-Range", "received_size": upload.received_size},
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+        
+        # DRF leaves no stream for an empty body
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = None
+        if request.stream is None or content_length != end - start + 1:
+            return Response(
+                {"error": "The body must hold exactly the bytes of the Content-Range"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # The body is read from the request stream block by block, never
+        # loaded as a whole
+        try:
+            received_size = upload.write_chunk(request.stream, start, end - start + 1)
+        except ValueError as exc:
+            return Response(
+                {"error": str(exc), "received_size": upload.received_size},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({'id': upload.pk, 'received_size': received_size, 'total_size': upload.total_size})
+    
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Check the uploaded file's size and hash and register the attachment or signature."""
+        upload = self.get_object()
+        try:
+            target = upload.finalize(user=request.user, ip_address=request.META.get('REMOTE_ADDR'))
+        except ValueError as exc:
+            upload.refresh_from_db()
+            return Response(
+                {"error": str(exc), "received_size": upload.received_size},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        upload.refresh_from_db()
+        data = self.get_serializer(upload).data
+        data['url'] = (target.file if upload.kind == 'attachment' else target.signature_image).url
+        return Response(data, status=status.HTTP_201_CREATED)
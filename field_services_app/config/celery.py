@@ -0,0 +1,19 @@
+"""
+Celery configuration for field_services_app project.
+
+Workers are started with ``celery -A config worker``.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('field_services_app')
+
+# Read the CELERY_* settings from the Django settings module
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Load tasks.py modules from all installed apps
+app.autodiscover_tasks()
@@ -6,6 +6,8 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -167,6 +169,9 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Partial files of resumable chunked uploads (see work_orders.WorkOrderUpload)
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'uploads'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -212,6 +217,16 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'sweep-certifications': {
+        'task': 'apps.technicians.tasks.sweep_certifications',
+        'schedule': crontab(hour=1, minute=0),
+    },
+    'reconcile-cost-rollups': {
+        'task': 'apps.work_orders.tasks.reconcile_cost_rollups',
+        'schedule': crontab(hour=2, minute=0),
+    },
+}
 
 # Crispy Forms
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
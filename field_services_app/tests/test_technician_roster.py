@@ -0,0 +1,72 @@
+"""
+Query ceiling of the technician roster listing.
+"""
+
+from datetime import date
+
+import pytest
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIClient
+
+from apps.customers.models import Company
+from apps.projects.models import Project
+from apps.technicians.models import Specialty, Technician, TechnicianCheckIn, TechnicianLocation
+from apps.users.models import User
+from apps.work_orders.models import WorkOrder, WorkOrderAssignment
+
+ROSTER_URL = '/api/v1/technicians/technicians/'
+
+# Queries allowed for one page of the roster, whatever its size: the count,
+# the technicians with their active assignment counts, their specialties
+# and today's check-ins with their locations
+ROSTER_QUERY_CEILING = 4
+
+
+@pytest.fixture
+def client():
+    user = User.objects.create_user(email='admin@example.com', password='x', role='admin', is_staff=True)
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def roster():
+    """Sixty technicians with specialties, a check-in today and an active assignment."""
+    company = Company.objects.create(name='Acme')
+    project = Project.objects.create(name='Tower', company=company, start_date=date.today(), end_date=date.today())
+    specialties = [Specialty.objects.create(name=f'Specialty {index}') for index in range(3)]
+    technicians = []
+    for index in range(60):
+        technician = Technician.objects.create(
+            employee_number=f'E{index:03d}',
+            full_name=f'Technician {index}',
+            phone_number='+85291234567'
+        )
+        technician.specialties.set(specialties[:index % 3 + 1])
+        location = TechnicianLocation.objects.create(
+            technician=technician, latitude=22.3, longitude=114.1, timestamp=timezone.now()
+        )
+        TechnicianCheckIn.objects.create(
+            technician=technician, check_in_time=timezone.now(), check_in_location=location
+        )
+        work_order = WorkOrder.objects.create(title=f'Job {index}', project=project, customer=company)
+        WorkOrderAssignment.objects.create(work_order=work_order, technician=technician, status='accepted')
+        technicians.append(technician)
+    return technicians
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page_size', [1, 10, 20, 60])
+def test_roster_query_ceiling(client, roster, page_size, monkeypatch, django_assert_max_num_queries):
+    monkeypatch.setattr(PageNumberPagination, 'page_size', page_size)
+    
+    with django_assert_max_num_queries(ROSTER_QUERY_CEILING):
+        response = client.get(ROSTER_URL)
+    
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert len(results) == page_size
+    assert all(result['today_check_in'] for result in results)
+    assert all(result['active_assignments_count'] == 1 for result in results)